@@ -1,3 +1,7 @@
+import time
+# Startup breakdown: the first create_app() also reports the time spent importing this package
+_import_started = time.perf_counter()
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
@@ -5,6 +9,7 @@ from flask_migrate import Migrate
 from datetime import timedelta
 import os
 from dotenv import load_dotenv
+from .utils.startup import StartupTimer
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +20,11 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 
 def create_app():
+    global _import_started
+    timer = StartupTimer(_import_started)
+    if _import_started is not None:
+        timer.mark('imports')
+        _import_started = None
     app = Flask(__name__)
     
     # Configuration
@@ -32,7 +42,56 @@ def create_app():
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///attendance.db'
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Connection pool profile: dev, small, large, pgbouncer-transaction or sqlite (see app/utils/db_pool.py)
+    app.config['DB_POOL_PROFILE'] = os.getenv('DB_POOL_PROFILE', 'dev').lower()
+    # Gunicorn workers and threads per worker sharing the connection budget
+    app.config['WEB_CONCURRENCY'] = int(os.getenv('WEB_CONCURRENCY', '1'))
+    app.config['WEB_THREADS'] = int(os.getenv('WEB_THREADS', '1'))
+    # Overrides for the profile's connection budget, pool wait and statement timeout (unset uses the profile's)
+    app.config['DB_MAX_CONNECTIONS'] = int(os.getenv('DB_MAX_CONNECTIONS', '0'))
+    app.config['DB_POOL_TIMEOUT'] = float(os.getenv('DB_POOL_TIMEOUT', '0'))
+    app.config['DB_STATEMENT_TIMEOUT_MS'] = os.getenv('DB_STATEMENT_TIMEOUT_MS')
+    app.config['DB_APPLICATION_NAME'] = os.getenv('DB_APPLICATION_NAME', 'attendance')
+    # DB_POOL_PROFILE=sqlite connection pragmas (see app/utils/sqlite_mode.py)
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    app.config['SQLITE_CACHE_MB'] = int(os.getenv('SQLITE_CACHE_MB', '64'))
+    app.config['SQLITE_MMAP_MB'] = int(os.getenv('SQLITE_MMAP_MB', '256'))
+    from .utils import db_pool
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_pool.engine_options(app.config)
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=60)
+    # Single-statement scan path for mark_attendance (validates against the in-process token cache)
+    app.config['ATTENDANCE_FAST_PATH'] = os.getenv('ATTENDANCE_FAST_PATH', 'false').lower() in ('1', 'true', 'yes')
+    # 'sync' commits each scan in the request; 'queue' acknowledges with 202 and writes in batches
+    app.config['ATTENDANCE_INGEST_MODE'] = os.getenv('ATTENDANCE_INGEST_MODE', 'sync').lower()
+    app.config['ATTENDANCE_INGEST_BATCH_SIZE'] = int(os.getenv('ATTENDANCE_INGEST_BATCH_SIZE', '200'))
+    app.config['ATTENDANCE_INGEST_FLUSH_MS'] = int(os.getenv('ATTENDANCE_INGEST_FLUSH_MS', '250'))
+    app.config['ATTENDANCE_INGEST_MAX_QUEUE'] = int(os.getenv('ATTENDANCE_INGEST_MAX_QUEUE', '10000'))
+    app.config['ATTENDANCE_INGEST_SPOOL_DIR'] = os.getenv('ATTENDANCE_INGEST_SPOOL_DIR')
+    # Live roll-call screens poll for scans made by other worker processes this often (0 disables)
+    app.config['ATTENDANCE_LIVE_SYNC_MS'] = int(os.getenv('ATTENDANCE_LIVE_SYNC_MS', '1000'))
+    # 'svg' or 'png' rendering for session QR images
+    app.config['QR_IMAGE_FORMAT'] = os.getenv('QR_IMAGE_FORMAT', 'svg').lower()
+    # Processes rendering a batch of report cards (0 = one per CPU)
+    app.config['REPORT_CARD_WORKERS'] = int(os.getenv('REPORT_CARD_WORKERS', '0'))
+    # Generated PDFs are cached on disk by content fingerprint, up to this size
+    app.config['PDF_CACHE_DIR'] = os.getenv('PDF_CACHE_DIR')
+    app.config['PDF_CACHE_MAX_MB'] = int(os.getenv('PDF_CACHE_MAX_MB', '256'))
+    # Logged-in users are served from a per-process identity cache for this long (0 disables)
+    app.config['USER_CACHE_TTL_SECONDS'] = int(os.getenv('USER_CACHE_TTL_SECONDS', '60'))
+    # Adds per-request query count and DB time headers (always logged at DEBUG level)
+    app.config['QUERY_STATS'] = os.getenv('QUERY_STATS', 'false').lower() in ('1', 'true', 'yes')
+    # Per-endpoint request metrics on /metrics, summed over all worker processes
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    app.config['METRICS_DIR'] = os.getenv('METRICS_DIR')
+    app.config['METRICS_FLUSH_SECONDS'] = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+    # /metrics requires "Authorization: Bearer <token>"; without a token it is not served
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    
+    # Tables come from `flask db upgrade` / setup_postgresql.py; create_all is only a SQLite convenience
+    app.config['DB_CREATE_ALL'] = os.getenv(
+        'DB_CREATE_ALL', 'true' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') else 'false'
+    ).lower() in ('1', 'true', 'yes')
+    timer.mark('config')
     
     # Initialize extensions
     db.init_app(app)
@@ -42,10 +101,26 @@ def create_app():
     # User loader for Flask-Login
     @login_manager.user_loader
     def load_user(user_id):
-        from .models.models import User
-        return User.query.get(int(user_id))
+        from .utils import identity
+        return identity.load(int(user_id))
     
     Migrate(app, db)
+    timer.mark('extensions')
+    
+    from .utils import (counters, identity, ingest, live_feed, metrics, partitions, pdf_cache, query_stats,
+                        report_cards, sqlite_mode)
+    db_pool.init_app(app)
+    sqlite_mode.init_app(app)
+    identity.init_app(app)
+    query_stats.init_app(app)
+    metrics.init_app(app)
+    counters.init_app(app)
+    ingest.init_app(app)
+    live_feed.init_app(app)
+    partitions.init_app(app)
+    pdf_cache.init_app(app)
+    report_cards.init_app(app)
+    timer.mark('services')
     
     # Register blueprints
     from .routes.auth import auth_bp
@@ -57,9 +132,17 @@ def create_app():
     app.register_blueprint(teacher_bp)
     app.register_blueprint(student_bp)
     app.register_blueprint(main_bp)
+    timer.mark('blueprints')
     
     # Create database tables
-    with app.app_context():
-        db.create_all()
+    if app.config['DB_CREATE_ALL']:
+        with app.app_context():
+            db.create_all()
+            if db.engine.dialect.name == 'sqlite':
+                # create_all never alters existing tables; add columns and indexes the models gained
+                from .utils import sqlite_schema
+                sqlite_schema.add_missing(db.engine, db.metadata)
+        timer.mark('create_all')
     
+    app.extensions['startup'] = timer.log()
     return app
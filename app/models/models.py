@@ -13,6 +13,11 @@ class User(UserMixin, db.Model):
     year = db.Column(db.Integer)  # For students
     division = db.Column(db.String(10))  # For students
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Student pickers list every user with role 'student'
+        db.Index('ix_user_role', 'role'),
+    )
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -20,6 +25,9 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# Login matches case-insensitively on email
+db.Index('ix_user_email_lower', db.func.lower(User.email))
+
 class Subject(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -30,6 +38,11 @@ class Subject(db.Model):
     
     # Relationships
     teacher = db.relationship('User', backref='subjects')
+    
+    __table_args__ = (
+        db.Index('ix_subject_teacher_id', 'teacher_id'),
+        db.Index('ix_subject_year_division', 'year', 'division'),
+    )
 
 class Enrollment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -44,6 +57,7 @@ class Enrollment(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('student_id', 'subject_id', name='unique_enrollment'),
+        db.Index('ix_enrollment_subject_roll', 'subject_id', 'roll_number'),
     )
 
 class QRCode(db.Model):
@@ -55,9 +69,14 @@ class QRCode(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     class_start_time = db.Column(db.DateTime, nullable=True)
     class_end_time = db.Column(db.DateTime, nullable=True)
+    rotation_seconds = db.Column(db.Integer, nullable=True)  # Set for rotating sessions
     
     # Relationships
     subject = db.relationship('Subject', backref='qr_codes')
+    
+    __table_args__ = (
+        db.Index('ix_qr_code_subject_start', 'subject_id', 'class_start_time'),
+    )
 
 class Attendance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -75,6 +94,8 @@ class Attendance(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('student_id', 'qr_code_id', name='unique_attendance'),
+        db.Index('ix_attendance_subject_marked', 'subject_id', 'marked_at'),
+        db.Index('ix_attendance_qr_code', 'qr_code_id'),
     )
 
 class LeaveApplication(db.Model):
@@ -93,6 +114,11 @@ class LeaveApplication(db.Model):
     # Relationships
     student = db.relationship('User', backref='leave_applications')
     subject = db.relationship('Subject', backref='leave_applications')
+    
+    __table_args__ = (
+        db.Index('ix_leave_application_subject_submitted', 'subject_id', 'submitted_at'),
+        db.Index('ix_leave_application_student', 'student_id', 'submitted_at'),
+    )
 
 class Result(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -111,4 +137,17 @@ class Result(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('student_id', 'subject_id', 'exam_type', name='unique_result_per_exam'),
-    )
\ No newline at end of file
+        db.Index('ix_result_subject', 'subject_id'),
+    )
+
+class SubjectSessionCount(db.Model):
+    """Materialized number of class sessions (QR codes) held per subject."""
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), primary_key=True)
+    sessions_held = db.Column(db.Integer, nullable=False, default=0)
+
+
+class StudentAttendanceCount(db.Model):
+    """Materialized number of sessions attended per (student, subject)."""
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), primary_key=True)
+    sessions_attended = db.Column(db.Integer, nullable=False, default=0)
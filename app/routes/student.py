@@ -1,11 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from ..models.models import Subject, QRCode, Attendance, Enrollment, LeaveApplication, Result, db
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import FlushError
 from datetime import datetime, date
 from functools import wraps
-import json
-from ..utils.results import calculate_percentage, calculate_grade, generate_report_pdf
+from ..utils.results import generate_report_pdf, summarize_results
+from ..utils import counters, defaulters, pdf_cache, qr_images, qr_tokens, teacher_dashboard
+# Aliased: the chatbot view below takes the module's name
+from ..utils import chatbot as chatbot_replies
+from ..utils.attendance import insert_attendance, is_enrolled, scan_state
+from ..utils.ingest import DUPLICATE
 
 student_bp = Blueprint('student', __name__)
 
@@ -22,7 +28,7 @@ def student_required(f):
 @student_bp.route('/student/dashboard')
 @student_required
 def dashboard():
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
+    enrollments = Enrollment.query.options(joinedload(Enrollment.subject)).filter_by(student_id=current_user.id).all()
     return render_template('student/dashboard.html', enrollments=enrollments)
 
 @student_bp.route('/student/chatbot', methods=['POST'])
@@ -32,132 +38,8 @@ def chatbot():
     data = request.get_json()
     message = data.get('message', '').lower().strip()
     
-    # Get student's enrollment and attendance data
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
-    
-    # Calculate attendance statistics
-    total_sessions = 0
-    attended_sessions = 0
-    attendance_by_subject = {}
-    
-    for enrollment in enrollments:
-        subject = Subject.query.get(enrollment.subject_id)
-        qr_codes = QRCode.query.filter_by(subject_id=enrollment.subject_id).all()
-        attendance_records = Attendance.query.filter_by(
-            student_id=current_user.id,
-            subject_id=enrollment.subject_id
-        ).all()
-        
-        subject_sessions = len(qr_codes)
-        subject_attended = len(attendance_records)
-        
-        total_sessions += subject_sessions
-        attended_sessions += subject_attended
-        
-        if subject_sessions > 0:
-            percentage = (subject_attended / subject_sessions) * 100
-            attendance_by_subject[subject.name] = {
-                'total': subject_sessions,
-                'attended': subject_attended,
-                'percentage': round(percentage, 2)
-            }
-    
-    overall_percentage = (attended_sessions / total_sessions * 100) if total_sessions > 0 else 0
-    
-    # Process different types of queries
-    if any(word in message for word in ['attendance', 'present', 'absent', 'percentage']):
-        if total_sessions == 0:
-            response = "You haven't attended any classes yet. Start by enrolling in subjects and attending classes!"
-        else:
-            response = f"📊 **Your Attendance Summary:**\n\n"
-            response += f"• **Overall Attendance:** {attended_sessions}/{total_sessions} ({round(overall_percentage, 2)}%)\n\n"
-            
-            if attendance_by_subject:
-                response += "**By Subject:**\n"
-                for subject_name, stats in attendance_by_subject.items():
-                    status_emoji = "✅" if stats['percentage'] >= 75 else "⚠️" if stats['percentage'] >= 50 else "❌"
-                    response += f"• {subject_name}: {stats['attended']}/{stats['total']} ({stats['percentage']}%) {status_emoji}\n"
-                
-                if overall_percentage >= 75:
-                    response += "\n🎉 Great job! Your attendance is excellent!"
-                elif overall_percentage >= 50:
-                    response += "\n⚠️ Your attendance needs improvement. Try to attend more classes!"
-                else:
-                    response += "\n❌ Your attendance is low. Please make sure to attend all classes!"
-    
-    elif any(word in message for word in ['fees', 'payment', 'paid', 'due']):
-        response = "💰 **Fee Information:**\n\n"
-        response += "• **Tuition Fee:** ₹50,000 per semester\n"
-        response += "• **Due Date:** 15th of each month\n"
-        response += "• **Payment Status:** Please contact the administration office for current fee status\n"
-        response += "• **Payment Methods:** Online banking, UPI, or cash at the office\n\n"
-        response += "💡 **Need Help?** Contact the accounts department at accounts@college.edu"
-    
-    elif any(word in message for word in ['subject', 'course', 'enrolled']):
-        if enrollments:
-            response = "📚 **Your Enrolled Subjects:**\n\n"
-            for enrollment in enrollments:
-                subject = Subject.query.get(enrollment.subject_id)
-                response += f"• **{subject.name}** (Year {subject.year}, Division {subject.division})\n"
-                response += f"  Roll Number: {enrollment.roll_number}\n"
-                response += f"  Teacher: {subject.teacher.name}\n\n"
-        else:
-            response = "📚 You haven't enrolled in any subjects yet.\n\n"
-            response += "Go to 'Browse Subjects' to enroll in available courses!"
-    
-    elif any(word in message for word in ['schedule', 'timetable', 'class', 'time']):
-        response = "📅 **Class Schedule:**\n\n"
-        response += "**Monday - Friday:**\n"
-        response += "• 9:00 AM - 10:00 AM: Morning Assembly\n"
-        response += "• 10:00 AM - 11:00 AM: Period 1\n"
-        response += "• 11:00 AM - 12:00 PM: Period 2\n"
-        response += "• 12:00 PM - 1:00 PM: Lunch Break\n"
-        response += "• 1:00 PM - 2:00 PM: Period 3\n"
-        response += "• 2:00 PM - 3:00 PM: Period 4\n"
-        response += "• 3:00 PM - 4:00 PM: Period 5\n\n"
-        response += "**Saturday:**\n"
-        response += "• 9:00 AM - 12:00 PM: Practical/Lab Sessions\n\n"
-        response += "💡 Check your specific subject timings in the 'My Subjects' section!"
-    
-    elif any(word in message for word in ['help', 'support', 'assistance']):
-        response = "🤖 **How can I help you?**\n\n"
-        response += "I can provide information about:\n"
-        response += "• 📊 **Attendance** - Check your attendance records\n"
-        response += "• 💰 **Fees** - Fee structure and payment details\n"
-        response += "• 📚 **Subjects** - Your enrolled courses\n"
-        response += "• 📅 **Schedule** - Class timings and schedule\n"
-        response += "• 👤 **Profile** - Your personal information\n\n"
-        response += "Just ask me about any of these topics!"
-    
-    elif any(word in message for word in ['profile', 'personal', 'info', 'details']):
-        response = f"👤 **Your Profile Information:**\n\n"
-        response += f"• **Name:** {current_user.name}\n"
-        response += f"• **Email:** {current_user.email}\n"
-        response += f"• **Registration Number:** {current_user.registration_number}\n"
-        response += f"• **Year:** {current_user.year}\n"
-        response += f"• **Division:** {current_user.division}\n"
-        response += f"• **Member Since:** {current_user.created_at.strftime('%B %Y')}\n\n"
-        response += "💡 To update your information, contact the administration office."
-    
-    elif any(word in message for word in ['hello', 'hi', 'hey', 'greetings']):
-        response = f"👋 **Hello {current_user.name}!**\n\n"
-        response += "Welcome to your student dashboard! I'm your AI assistant.\n\n"
-        response += "I can help you with:\n"
-        response += "• Attendance information\n"
-        response += "• Fee details\n"
-        response += "• Subject information\n"
-        response += "• Class schedule\n"
-        response += "• Profile details\n\n"
-        response += "Just ask me anything!"
-    
-    else:
-        response = "🤔 I'm not sure I understand. Try asking about:\n\n"
-        response += "• Your attendance records\n"
-        response += "• Fee information\n"
-        response += "• Enrolled subjects\n"
-        response += "• Class schedule\n"
-        response += "• Your profile\n\n"
-        response += "Or type 'help' for more options!"
+    # Only the attendance and subject intents read data, from a short-lived per-student snapshot
+    response = chatbot_replies.reply(message, current_user)
     
     return jsonify({
         'response': response,
@@ -215,6 +97,9 @@ def enroll_subject(subject_id):
     )
     db.session.add(enrollment)
     db.session.commit()
+    defaulters.invalidate_subject(subject_id)
+    chatbot_replies.invalidate(current_user.id)
+    teacher_dashboard.invalidate(subject.teacher_id)
     
     flash('Successfully enrolled in the subject!', 'success')
     return redirect(url_for('student.dashboard'))
@@ -225,24 +110,26 @@ def mark_attendance():
     qr_data = request.json.get('qr_data')
     
     try:
-        data = json.loads(qr_data)
-        token = data.get('token')
-        subject_id = data.get('subject_id')
+        # Accepts the compact payload and the JSON one printed by older sessions
+        token, subject_id = qr_images.decode_payload(qr_data)
         
-        # Verify QR code
-        qr_code = QRCode.query.filter_by(
-            token=token,
-            subject_id=subject_id,
-            is_active=True
-        ).first()
+        if current_app.config.get('ATTENDANCE_FAST_PATH'):
+            return _mark_attendance_fast(token, int(subject_id))
+        
+        # Verify QR code against the active token registry
+        qr_code = qr_tokens.lookup(token)
         
-        if not qr_code:
+        if not qr_code or qr_code.subject_id != int(subject_id):
             return jsonify({'error': 'Invalid QR code'}), 400
             
         # Check if QR is expired
         if datetime.utcnow() > qr_code.expires_at:
             return jsonify({'error': 'QR code has expired'}), 400
             
+        queued = _enqueue_attendance(qr_code, int(subject_id))
+        if queued:
+            return queued
+            
         # Check if student is enrolled in the subject
         enrollment = Enrollment.query.filter_by(
             student_id=current_user.id,
@@ -255,7 +142,7 @@ def mark_attendance():
         # Check if attendance already marked
         if Attendance.query.filter_by(
             student_id=current_user.id,
-            qr_code_id=qr_code.id
+            qr_code_id=qr_code.qr_code_id
         ).first():
             return jsonify({'error': 'Attendance already marked'}), 400
             
@@ -263,16 +150,19 @@ def mark_attendance():
         attendance = Attendance(
             student_id=current_user.id,
             subject_id=subject_id,
-            qr_code_id=qr_code.id,
+            qr_code_id=qr_code.qr_code_id,
             ip_address=request.remote_addr,
             device_info=request.headers.get('User-Agent', '')
         )
         db.session.add(attendance)
+        counters.record_attendance([(current_user.id, int(subject_id))])
         try:
             db.session.commit()
-        except IntegrityError:
+        except (IntegrityError, FlushError):
+            # A partitioned attendance table skips the duplicate in a trigger instead of raising
             db.session.rollback()
             return jsonify({'error': 'Attendance already marked'}), 409
+        _publish_scan(qr_code.qr_code_id)
         
         # Return success with class timing information
         return jsonify({
@@ -284,50 +174,140 @@ def mark_attendance():
     except Exception as e:
         return jsonify({'error': 'Invalid QR code format'}), 400
 
+def _mark_attendance_fast(token, subject_id):
+    """Scan path that validates against the token cache and writes with one statement"""
+    entry = qr_tokens.lookup(token)
+    if not entry or entry.subject_id != subject_id:
+        return jsonify({'error': 'Invalid QR code'}), 400
+    
+    if datetime.utcnow() > entry.expires_at:
+        return jsonify({'error': 'QR code has expired'}), 400
+    
+    queued = _enqueue_attendance(entry, subject_id)
+    if queued:
+        return queued
+    
+    inserted = insert_attendance(
+        current_user.id,
+        subject_id,
+        entry.qr_code_id,
+        ip_address=request.remote_addr,
+        device_info=request.headers.get('User-Agent', '')
+    )
+    if not inserted:
+        db.session.rollback()
+        # Only the rejection path pays for telling the two causes apart
+        if not is_enrolled(current_user.id, subject_id):
+            return jsonify({'error': 'You are not enrolled in this subject'}), 400
+        return jsonify({'error': 'Attendance already marked'}), 400
+    counters.record_attendance([(current_user.id, subject_id)])
+    db.session.commit()
+    _publish_scan(entry.qr_code_id)
+    
+    return jsonify({
+        'message': 'Attendance marked successfully',
+        'class_start_time': entry.class_start_time.strftime('%Y-%m-%d %H:%M') if entry.class_start_time else 'N/A',
+        'class_end_time': entry.class_end_time.strftime('%Y-%m-%d %H:%M') if entry.class_end_time else 'N/A'
+    })
+
+def _publish_scan(qr_code_id):
+    """Push a recorded scan to live roll-call screens open in this process"""
+    chatbot_replies.invalidate(current_user.id)
+    live = current_app.extensions.get('attendance_live')
+    if live is not None:
+        live.publish(qr_code_id, current_user)
+
+def _enqueue_attendance(entry, subject_id):
+    """Hand a validated scan to the write-behind queue, if queued ingestion is enabled.
+
+    Scans the student cannot make (not enrolled, already marked or already queued) are
+    refused with a 400 as on the synchronous paths. Returns a 202 response, or None when
+    the queue is disabled or full so the caller falls back to writing synchronously.
+    """
+    ingest = current_app.extensions.get('attendance_ingest')
+    if ingest is None:
+        return None
+    enrolled, marked = scan_state(current_user.id, subject_id, entry.qr_code_id)
+    if not enrolled:
+        return jsonify({'error': 'You are not enrolled in this subject'}), 400
+    if marked:
+        return jsonify({'error': 'Attendance already marked'}), 400
+    outcome = ingest.submit(
+        current_user.id,
+        subject_id,
+        entry.qr_code_id,
+        ip_address=request.remote_addr,
+        device_info=request.headers.get('User-Agent', '')
+    )
+    if outcome is None:
+        return None
+    if outcome == DUPLICATE:
+        return jsonify({'error': 'Attendance already marked'}), 400
+    return jsonify({
+        'message': 'Attendance queued',
+        'status': 'queued',
+        'status_url': url_for('student.attendance_status', qr_code_id=entry.qr_code_id),
+        'class_start_time': entry.class_start_time.strftime('%Y-%m-%d %H:%M') if entry.class_start_time else 'N/A',
+        'class_end_time': entry.class_end_time.strftime('%Y-%m-%d %H:%M') if entry.class_end_time else 'N/A'
+    }), 202
+
+@student_bp.route('/student/mark-attendance/status/<int:qr_code_id>')
+@student_required
+def attendance_status(qr_code_id):
+    """Poll the outcome of a queued scan"""
+    ingest = current_app.extensions.get('attendance_ingest')
+    status = ingest.status(current_user.id, qr_code_id) if ingest is not None else None
+    if status is None:
+        # Not known to this worker: the database is the source of truth
+        marked = Attendance.query.filter_by(student_id=current_user.id, qr_code_id=qr_code_id).first()
+        status = 'recorded' if marked else 'unknown'
+    
+    if status == 'recorded':
+        return jsonify({'status': status, 'message': 'Attendance marked successfully'})
+    if status == 'rejected':
+        return jsonify({'status': status, 'error': 'You are not enrolled in this subject'})
+    return jsonify({'status': status})
+
 @student_bp.route('/student/attendance')
 @student_required
 def view_attendance():
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
-    attendance_data = []
+    subjects = counters.student_subjects(current_user.id)
     
-    for enrollment in enrollments:
-        # Get all QR codes for this subject with class timing
-        qr_codes = QRCode.query.filter_by(
-            subject_id=enrollment.subject_id
-        ).all()
-        
-        # Get attendance records for this student and subject
-        attendance_records = Attendance.query.filter_by(
-            student_id=current_user.id,
-            subject_id=enrollment.subject_id
-        ).all()
-        
-        # Create a list of class sessions with attendance status
-        class_sessions = []
-        for qr_code in qr_codes:
-            attended = any(record.qr_code_id == qr_code.id for record in attendance_records)
-            # Handle null class timing (for old QR codes)
-            start_time = qr_code.class_start_time.strftime('%H:%M') if qr_code.class_start_time else 'N/A'
-            end_time = qr_code.class_end_time.strftime('%H:%M') if qr_code.class_end_time else 'N/A'
-            
-            class_sessions.append({
-                'date': qr_code.created_at.strftime('%Y-%m-%d'),
-                'start_time': start_time,
-                'end_time': end_time,
-                'attended': attended,
-                'status': 'Present' if attended else 'Absent'
-            })
-        
-        total_sessions = len(qr_codes)
-        attended_sessions = len([s for s in class_sessions if s['attended']])
+    # One pass over every session of every enrolled subject, LEFT JOINed to this
+    # student's attendance, ordered so each subject's sessions are contiguous
+    session_rows = db.session.query(
+        QRCode.subject_id,
+        QRCode.created_at,
+        QRCode.class_start_time,
+        QRCode.class_end_time,
+        Attendance.id.isnot(None)
+    ).join(
+        Enrollment, (Enrollment.subject_id == QRCode.subject_id) & (Enrollment.student_id == current_user.id)
+    ).outerjoin(
+        Attendance, (Attendance.qr_code_id == QRCode.id) & (Attendance.student_id == current_user.id)
+    ).order_by(QRCode.subject_id.asc(), QRCode.id.asc()).all()
+    
+    # Per subject: session timings plus a parallel attended bitmap
+    sessions_by_subject = {row.subject.id: ([], []) for row in subjects}
+    for subject_id, created_at, start_time, end_time, attended in session_rows:
+        sessions, bitmap = sessions_by_subject[subject_id]
+        sessions.append((created_at, start_time, end_time))
+        bitmap.append(bool(attended))
+    
+    attendance_data = []
+    for row in subjects:
+        sessions, bitmap = sessions_by_subject[row.subject.id]
+        total_sessions = len(bitmap)
+        attended_sessions = sum(bitmap)
         percentage = (attended_sessions / total_sessions * 100) if total_sessions > 0 else 0
         
         attendance_data.append({
-            'subject': Subject.query.get(enrollment.subject_id),
+            'subject': row.subject,
             'total_sessions': total_sessions,
             'attended_sessions': attended_sessions,
             'percentage': round(percentage, 2),
-            'class_sessions': class_sessions
+            'class_sessions': sessions,
+            'attended': bitmap
         })
     
     return render_template('student/attendance.html', attendance_data=attendance_data)
@@ -386,12 +366,13 @@ def leave_application():
         
         db.session.add(leave_app)
         db.session.commit()
+        teacher_dashboard.invalidate(enrollment.subject.teacher_id)
         
         flash('Leave application submitted successfully!', 'success')
         return redirect(url_for('student.view_leave_applications'))
     
     # GET request - show form
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
+    enrollments = Enrollment.query.options(joinedload(Enrollment.subject)).filter_by(student_id=current_user.id).all()
     subjects = [enrollment.subject for enrollment in enrollments]
     
     return render_template('student/leave_application.html', subjects=subjects)
@@ -407,6 +388,13 @@ def view_leave_applications():
                          leave_applications=leave_applications)
 
 
+def _overall_attendance_pct(student_id):
+    subjects = counters.student_subjects(student_id)
+    total_sessions = sum(row.sessions_held for row in subjects)
+    attended_sessions = sum(row.sessions_attended for row in subjects)
+    return (attended_sessions / total_sessions * 100.0) if total_sessions > 0 else 0.0
+
+
 @student_bp.route('/student/results')
 @student_required
 def view_results():
@@ -414,35 +402,10 @@ def view_results():
         filter(Result.student_id == current_user.id).\
         order_by(Subject.name.asc(), Result.exam_type.asc()).all()
 
-    rows = []
-    total_marks = 0.0
-    total_max = 0.0
-    for res, subj in results:
-        pct = calculate_percentage(res.marks_obtained, res.max_marks)
-        rows.append({
-            'subject_name': subj.name,
-            'exam_type': res.exam_type,
-            'marks_obtained': res.marks_obtained,
-            'max_marks': res.max_marks,
-            'percentage': pct,
-            'remarks': res.remarks
-        })
-        total_marks += (res.marks_obtained or 0)
-        total_max += (res.max_marks or 0)
-
-    overall_percentage = calculate_percentage(total_marks, total_max)
-    overall_grade = calculate_grade(overall_percentage)
+    rows, total_marks, total_max, overall_percentage, overall_grade = summarize_results(results)
 
     # Attendance percentage: sessions attended / sessions total across enrolled subjects
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
-    subject_ids = [e.subject_id for e in enrollments]
-    total_sessions = 0
-    attended_sessions = 0
-    if subject_ids:
-        from ..models.models import QRCode  # local import to avoid cycle
-        total_sessions = QRCode.query.filter(QRCode.subject_id.in_(subject_ids)).count()
-        attended_sessions = Attendance.query.filter(Attendance.student_id == current_user.id, Attendance.subject_id.in_(subject_ids)).count()
-    attendance_pct = (attended_sessions / total_sessions * 100.0) if total_sessions > 0 else 0.0
+    attendance_pct = _overall_attendance_pct(current_user.id)
 
     return render_template('student/results.html', rows=rows, total_marks=total_marks, total_max=total_max,
                            overall_percentage=overall_percentage, overall_grade=overall_grade,
@@ -456,34 +419,15 @@ def download_report_pdf():
         filter(Result.student_id == current_user.id).\
         order_by(Subject.name.asc(), Result.exam_type.asc()).all()
 
-    rows = []
-    total_marks = 0.0
-    total_max = 0.0
-    for res, subj in results:
-        pct = calculate_percentage(res.marks_obtained, res.max_marks)
-        rows.append({
-            'subject_name': subj.name,
-            'exam_type': res.exam_type,
-            'marks_obtained': res.marks_obtained,
-            'max_marks': res.max_marks,
-            'percentage': pct,
-            'remarks': res.remarks
-        })
-        total_marks += (res.marks_obtained or 0)
-        total_max += (res.max_marks or 0)
-
-    overall_percentage = calculate_percentage(total_marks, total_max)
-    overall_grade = calculate_grade(overall_percentage)
+    rows, total_marks, total_max, overall_percentage, overall_grade = summarize_results(results)
 
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
-    subject_ids = [e.subject_id for e in enrollments]
-    total_sessions = 0
-    attended_sessions = 0
-    if subject_ids:
-        from ..models.models import QRCode  # local import to avoid cycle
-        total_sessions = QRCode.query.filter(QRCode.subject_id.in_(subject_ids)).count()
-        attended_sessions = Attendance.query.filter(Attendance.student_id == current_user.id, Attendance.subject_id.in_(subject_ids)).count()
-    attendance_pct = (attended_sessions / total_sessions * 100.0) if total_sessions > 0 else 0.0
+    attendance_pct = _overall_attendance_pct(current_user.id)
 
-    pdf_buffer = generate_report_pdf(current_user, rows, total_marks, total_max, overall_percentage, overall_grade, attendance_pct)
-    return send_file(pdf_buffer, mimetype='application/pdf', as_attachment=True, download_name='report_card.pdf')
+    last_updated = max((res.updated_at or res.created_at for res, _ in results), default=None)
+    key = pdf_cache.fingerprint('report-card', current_user.id, current_user.name, current_user.registration_number,
+                                rows, attendance_pct, last_updated)
+    return pdf_cache.pdf_response(
+        key,
+        lambda: generate_report_pdf(current_user, rows, total_marks, total_max, overall_percentage, overall_grade, attendance_pct),
+        'report_card.pdf'
+    )
@@ -1,16 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file, session, current_app, abort, make_response, Response, send_from_directory
 from flask_login import login_required, current_user
 from ..models.models import Subject, QRCode, Attendance, User, Enrollment, LeaveApplication, Result, db
 from datetime import datetime, timedelta
 from functools import wraps
-import qrcode
+from sqlalchemy.orm import joinedload
 import io
-import base64
+import os
 import secrets
-import json
-import csv
 from collections import defaultdict
 from ..utils.results import calculate_percentage
+from ..utils import (counters, defaulters, exports, pdf_cache, qr_images, qr_rotation, qr_tokens,
+                     results_import, teacher_dashboard, timebuckets)
+from ..utils.defaulters import defaulters_for_teacher
 
 teacher_bp = Blueprint('teacher', __name__)
 
@@ -27,12 +28,9 @@ def teacher_required(f):
 @teacher_bp.route('/teacher/dashboard')
 @teacher_required
 def dashboard():
-    subjects = Subject.query.filter_by(teacher_id=current_user.id).all()
-    # Load enrollments for each subject to avoid lazy loading issues
-    for subject in subjects:
-        _ = subject.enrollments  # This triggers the relationship loading
     current_expiry_seconds = session.get('qr_expiry_seconds', 30)
-    return render_template('teacher/dashboard.html', subjects=subjects, qr_expiry_seconds=current_expiry_seconds)
+    return render_template('teacher/dashboard.html', subject_grid=teacher_dashboard.subject_grid(current_user.id),
+                           qr_expiry_seconds=current_expiry_seconds)
 
 @teacher_bp.route('/teacher/qr-expiry', methods=['POST'])
 @teacher_required
@@ -78,6 +76,8 @@ def create_subject():
         )
         db.session.add(subject)
         db.session.commit()
+        defaulters.invalidate_teacher(current_user.id)
+        teacher_dashboard.invalidate(current_user.id)
         
         flash('Subject created successfully!', 'success')
         return redirect(url_for('teacher.dashboard'))
@@ -134,51 +134,181 @@ def generate_qr(subject_id):
             return render_template('teacher/generate_qr_form.html', subject=subject, qr_expiry_seconds=session.get('qr_expiry_seconds', 30))
         # Cap expiry to max 2 hours
         expiry_seconds = min(expiry_seconds, 2 * 60 * 60)
-        expires_at = datetime.utcnow() + timedelta(seconds=expiry_seconds)
+        now = datetime.utcnow()
+        rotate = request.form.get('rotate') == '1'
+        if rotate:
+            # One session until the class ends (same 2 hour cap); the QR rotates every expiry period
+            expires_at = min(max(end_time, now + timedelta(seconds=expiry_seconds)), now + timedelta(hours=2))
+        else:
+            expires_at = now + timedelta(seconds=expiry_seconds)
         
         qr_code = QRCode(
             subject_id=subject_id,
             token=token,
             expires_at=expires_at,
             class_start_time=start_time,
-            class_end_time=end_time
+            class_end_time=end_time,
+            rotation_seconds=expiry_seconds if rotate else None
         )
         db.session.add(qr_code)
+        counters.record_session(subject_id)
         db.session.commit()
+        teacher_dashboard.invalidate(current_user.id)
+        if not rotate:
+            qr_tokens.remember(qr_code)
         
-        # Generate QR code
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr_data = {
-            'token': token,
-            'subject_id': subject_id,
-            'expires_at': expires_at.isoformat(),
-            'class_start_time': start_time.isoformat(),
-            'class_end_time': end_time.isoformat()
-        }
-        qr.add_data(json.dumps(qr_data))
-        qr.make(fit=True)
-        
-        # Create QR image
-        img = qr.make_image(fill_color="black", back_color="white")
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
-        img_str = base64.b64encode(img_buffer.getvalue()).decode()
+        # Render (or reuse) the QR image; the page loads it from teacher.qr_image
+        fmt = current_app.config['QR_IMAGE_FORMAT']
+        image = _session_image(qr_code, fmt, _session_payloads(qr_code)[0])
         
         return render_template('teacher/show_qr.html', 
-                             qr_image=img_str, 
+                             qr_image_url=url_for('teacher.qr_image', qr_code_id=qr_code.id, digest=image.digest, fmt=fmt), 
                              subject=subject,
                              expires_at=expires_at,
                              class_start_time=start_time,
-                             class_end_time=end_time)
+                             class_end_time=end_time,
+                             rotation_seconds=qr_code.rotation_seconds,
+                             next_qr_url=url_for('teacher.next_qr', qr_code_id=qr_code.id) if rotate else None,
+                             live_url=url_for('teacher.live_attendance', qr_code_id=qr_code.id),
+                             rotates_at=image.expires_at if rotate else None)
     
     return render_template('teacher/generate_qr_form.html', subject=subject, qr_expiry_seconds=session.get('qr_expiry_seconds', 30))
 
+def _session_payloads(qr_code):
+    """Payloads a session's QR may currently show, newest first"""
+    if qr_code.rotation_seconds:
+        window = qr_rotation.current_window(qr_code.rotation_seconds)
+        return [qr_rotation.issue(qr_code, window), qr_rotation.issue(qr_code, window - 1)]
+    return [qr_images.encode_payload(qr_code.subject_id, qr_code.token)]
+
+def _session_image(qr_code, fmt, payload):
+    if qr_code.rotation_seconds:
+        # Cache a rotating image only until its window ends
+        window = int(payload.rsplit('.', 2)[1])
+        expires_at = min(qr_rotation.window_end(qr_code.rotation_seconds, window), qr_code.expires_at)
+    else:
+        expires_at = qr_code.expires_at
+    return qr_images.cached(payload, fmt, current_user.id, expires_at)
+
+def _owned_session(qr_code_id):
+    return QRCode.query.join(Subject, QRCode.subject_id == Subject.id).filter(
+        QRCode.id == qr_code_id,
+        Subject.teacher_id == current_user.id
+    ).first_or_404()
+
+@teacher_bp.route('/teacher/qr/<int:qr_code_id>/next')
+@teacher_required
+def next_qr(qr_code_id):
+    """Current image of a rotating session, polled by the QR page"""
+    qr_code = _owned_session(qr_code_id)
+    if not qr_code.rotation_seconds:
+        abort(404)
+    if datetime.utcnow() >= qr_code.expires_at:
+        return jsonify({'status': 'ended'})
+    
+    fmt = current_app.config['QR_IMAGE_FORMAT']
+    image = _session_image(qr_code, fmt, _session_payloads(qr_code)[0])
+    return jsonify({
+        'status': 'active',
+        'image_url': url_for('teacher.qr_image', qr_code_id=qr_code.id, digest=image.digest, fmt=fmt),
+        'rotates_in': max((image.expires_at - datetime.utcnow()).total_seconds(), 0)
+    })
+
+@teacher_bp.route('/teacher/qr/<int:qr_code_id>/live')
+@teacher_required
+def live_attendance(qr_code_id):
+    """Server-Sent Events feed of scans for one session, sent as deltas"""
+    qr_code = _owned_session(qr_code_id)
+    channel = current_app.extensions['attendance_live'].open(qr_code.id, qr_code.expires_at)
+    after = request.headers.get('Last-Event-ID', 0, type=int)
+    return Response(
+        current_app.extensions['attendance_live'].stream(channel, after=after),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@teacher_bp.route('/teacher/qr/<int:qr_code_id>/<digest>.<fmt>')
+@teacher_required
+def qr_image(qr_code_id, digest, fmt):
+    """Serve a rendered QR image by content digest"""
+    if fmt not in qr_images.FORMATS:
+        abort(404)
+    
+    image = qr_images.lookup(digest)
+    if image is None:
+        # Rendered by another worker or evicted: rebuild it from the session row
+        qr_code = _owned_session(qr_code_id)
+        payload = next((p for p in _session_payloads(qr_code) if qr_images.digest(fmt, p) == digest), None)
+        if payload is None:
+            abort(404)
+        image = _session_image(qr_code, fmt, payload)
+    elif image.owner_id != current_user.id or image.fmt != fmt:
+        abort(404)
+    
+    if digest in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(image.body)
+        response.mimetype = qr_images.FORMATS[fmt]
+    response.set_etag(digest)
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    response.cache_control.max_age = max(int((image.expires_at - datetime.utcnow()).total_seconds()), 0)
+    return response
+
 @teacher_bp.route('/teacher/results', methods=['GET'])
 @teacher_required
 def results_hub():
     subjects = Subject.query.filter_by(teacher_id=current_user.id).all()
     students = User.query.filter_by(role='student').all()
-    return render_template('teacher/results_manage.html', subjects=subjects, students=students)
+    divisions = sorted({(s.year, s.division) for s in subjects})
+    return render_template('teacher/results_manage.html', subjects=subjects, students=students, divisions=divisions)
+
+@teacher_bp.route('/teacher/report-cards', methods=['POST'])
+@teacher_required
+def start_report_cards():
+    """Render report cards for a year/division the teacher teaches, or all their students"""
+    cohort = request.form.get('cohort', 'enrolled')
+    year = division = None
+    if cohort != 'enrolled':
+        year, _, division = cohort.partition('-')
+        try:
+            year = int(year)
+        except ValueError:
+            abort(400)
+        if not Subject.query.filter_by(teacher_id=current_user.id, year=year, division=division).first():
+            flash('You do not teach this division.', 'error')
+            return redirect(url_for('teacher.results_hub'))
+
+    job_id = current_app.extensions['report_cards'].start(current_user.id, year, division)
+    return redirect(url_for('teacher.report_cards_job', job_id=job_id))
+
+
+@teacher_bp.route('/teacher/report-cards/<job_id>')
+@teacher_required
+def report_cards_job(job_id):
+    state = current_app.extensions['report_cards'].status(current_user.id, job_id)
+    if state is None:
+        abort(404)
+    if request.args.get('format') == 'json':
+        return jsonify(state)
+    return render_template('teacher/report_cards.html', job_id=job_id, state=state)
+
+
+@teacher_bp.route('/teacher/report-cards/<job_id>/download')
+@teacher_required
+def report_cards_download(job_id):
+    path = current_app.extensions['report_cards'].archive_path(current_user.id, job_id)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/zip', as_attachment=True, download_name='report_cards.zip')
+
+def _parse_day(value):
+    """Parse a YYYY-MM-DD query argument, defaulting to today (UTC)"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return datetime.utcnow().date()
 
 @teacher_bp.route('/teacher/subject/<int:subject_id>/attendance')
 @teacher_required
@@ -192,7 +322,8 @@ def view_attendance(subject_id):
     # Load enrollments to avoid lazy loading issues
     _ = subject.enrollments
     
-    date = request.args.get('date', datetime.utcnow().date().isoformat())
+    day = _parse_day(request.args.get('date'))
+    date = day.isoformat()
     
     # Build a subquery of unique attendees for the selected date (one row per student)
     present_subq = db.session.query(
@@ -202,7 +333,7 @@ def view_attendance(subject_id):
         db.func.min(Attendance.ip_address).label('ip_address')
     ).filter(
         Attendance.subject_id == subject_id,
-        db.func.date(Attendance.marked_at) == date
+        timebuckets.in_range(Attendance.marked_at, *timebuckets.day_range(day))
     ).group_by(Attendance.student_id).subquery()
 
     # Join unique attendees with User, Enrollment and QRCode for display
@@ -233,6 +364,19 @@ def view_attendance(subject_id):
                          present_count=present_count,
                          attendance_rate=attendance_rate)
 
+def _attendance_export_row(record, day_format='%H:%M:%S'):
+    # Handle null class timing (for old QR codes)
+    start_time = record.class_start_time.strftime('%H:%M') if record.class_start_time else 'N/A'
+    end_time = record.class_end_time.strftime('%H:%M') if record.class_end_time else 'N/A'
+    return [
+        record.roll_number,
+        record.name,
+        record.registration_number,
+        f"{start_time} - {end_time}",
+        record.marked_at.strftime(day_format) if record.marked_at else '',
+        record.ip_address
+    ]
+
 @teacher_bp.route('/teacher/subject/<int:subject_id>/export')
 @teacher_required
 def export_attendance(subject_id):
@@ -242,19 +386,18 @@ def export_attendance(subject_id):
         flash('Access denied.', 'error')
         return redirect(url_for('teacher.dashboard'))
     
-    # Load enrollments to avoid lazy loading issues
-    _ = subject.enrollments
-    
-    date = request.args.get('date', datetime.utcnow().date().isoformat())
+    day = _parse_day(request.args.get('date'))
+    date = day.isoformat()
     
     # De-duplicate attendees for CSV export (one row per student)
     present_subq = db.session.query(
         Attendance.student_id.label('student_id'),
         db.func.min(Attendance.marked_at).label('marked_at'),
-        db.func.min(Attendance.qr_code_id).label('qr_code_id')
+        db.func.min(Attendance.qr_code_id).label('qr_code_id'),
+        db.func.min(Attendance.ip_address).label('ip_address')
     ).filter(
         Attendance.subject_id == subject_id,
-        db.func.date(Attendance.marked_at) == date
+        timebuckets.in_range(Attendance.marked_at, *timebuckets.day_range(day))
     ).group_by(Attendance.student_id).subquery()
 
     attendance_records = db.session.query(
@@ -262,6 +405,7 @@ def export_attendance(subject_id):
         User.registration_number,
         Enrollment.roll_number,
         present_subq.c.marked_at,
+        present_subq.c.ip_address,
         QRCode.class_start_time,
         QRCode.class_end_time
     ).join(
@@ -270,36 +414,54 @@ def export_attendance(subject_id):
         Enrollment, (User.id == Enrollment.student_id) & (Enrollment.subject_id == subject_id)
     ).join(
         QRCode, present_subq.c.qr_code_id == QRCode.id, isouter=True
-    ).order_by(Enrollment.roll_number.asc()).all()
+    ).order_by(Enrollment.roll_number.asc())
     
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Roll Number', 'Name', 'Registration Number', 'Class Time', 'Marked At', 'IP Address'])
+    return exports.csv_response(
+        f"attendance_{subject.name}_{date}.csv",
+        ['Roll Number', 'Name', 'Registration Number', 'Class Time', 'Marked At', 'IP Address'],
+        (_attendance_export_row(record) for record in exports.stream_rows(attendance_records))
+    )
+
+@teacher_bp.route('/teacher/subject/<int:subject_id>/export-range')
+@teacher_required
+def export_attendance_range(subject_id):
+    """Every attendance record of a subject between two dates (inclusive), streamed"""
+    subject = Subject.query.get_or_404(subject_id)
     
-    for record in attendance_records:
-        # Handle null class timing (for old QR codes)
-        start_time = record.class_start_time.strftime('%H:%M') if record.class_start_time else 'N/A'
-        end_time = record.class_end_time.strftime('%H:%M') if record.class_end_time else 'N/A'
-        
-        writer.writerow([
-            record.roll_number,
-            record.name,
-            record.registration_number,
-            f"{start_time} - {end_time}",
-            record.marked_at.strftime('%H:%M:%S'),
-            record.ip_address
-        ])
+    if subject.teacher_id != current_user.id:
+        flash('Access denied.', 'error')
+        return redirect(url_for('teacher.dashboard'))
     
-    output.seek(0)
+    first = _parse_day(request.args.get('from'))
+    last = _parse_day(request.args.get('to'))
+    if first > last:
+        first, last = last, first
+    start, _ = timebuckets.day_range(first)
+    _, end = timebuckets.day_range(last)
     
-    filename = f"attendance_{subject.name}_{date}.csv"
+    attendance_records = db.session.query(
+        User.name,
+        User.registration_number,
+        Enrollment.roll_number,
+        Attendance.marked_at,
+        Attendance.ip_address,
+        QRCode.class_start_time,
+        QRCode.class_end_time
+    ).join(
+        User, User.id == Attendance.student_id
+    ).outerjoin(
+        Enrollment, (Enrollment.student_id == Attendance.student_id) & (Enrollment.subject_id == subject_id)
+    ).outerjoin(
+        QRCode, QRCode.id == Attendance.qr_code_id
+    ).filter(
+        Attendance.subject_id == subject_id,
+        timebuckets.in_range(Attendance.marked_at, start, end)
+    ).order_by(Attendance.marked_at.asc(), Attendance.id.asc())
     
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
+    return exports.csv_response(
+        f"attendance_{subject.name}_{first.isoformat()}_to_{last.isoformat()}.csv",
+        ['Roll Number', 'Name', 'Registration Number', 'Class Time', 'Marked At', 'IP Address'],
+        (_attendance_export_row(record, '%Y-%m-%d %H:%M:%S') for record in exports.stream_rows(attendance_records))
     )
 
 @teacher_bp.route('/teacher/leave-applications')
@@ -311,7 +473,7 @@ def leave_applications():
     subject_ids = [subject.id for subject in teacher_subjects]
     
     # Get all leave applications for these subjects
-    leave_applications = LeaveApplication.query.filter(
+    leave_applications = LeaveApplication.query.options(joinedload(LeaveApplication.student)).filter(
         LeaveApplication.subject_id.in_(subject_ids)
     ).order_by(LeaveApplication.submitted_at.desc()).all()
     
@@ -330,7 +492,7 @@ def subject_leave_applications(subject_id):
         flash('Access denied.', 'error')
         return redirect(url_for('teacher.leave_applications'))
     
-    leave_applications = LeaveApplication.query.filter_by(
+    leave_applications = LeaveApplication.query.options(joinedload(LeaveApplication.student)).filter_by(
         subject_id=subject_id
     ).order_by(LeaveApplication.submitted_at.desc()).all()
     
@@ -376,6 +538,7 @@ def review_leave_application(app_id):
         leave_app.reviewed_at = datetime.utcnow()
         
         db.session.commit()
+        teacher_dashboard.invalidate(current_user.id)
         print(f"DEBUG: Database updated successfully")
         
         status_text = 'approved' if action == 'approve' else 'rejected'
@@ -389,10 +552,34 @@ def review_leave_application(app_id):
         flash('An error occurred while processing the request.', 'error')
         return redirect(url_for('teacher.leave_applications'))
 
+def _attendance_series(buckets, subject_ids, enrollment_counts):
+    """Attendance percentage per time bucket for a teacher's subjects.
+
+    For each bucket: attendance marked in the bucket over the enrollments of the
+    subjects that held a session in it, times the sessions each held. Returns labels, values and the per-bucket
+    {subject_id: count} maps for sessions and attendance.
+    """
+    rows = db.session.execute(timebuckets.bucket_counts(
+        buckets,
+        sessions=(QRCode.class_start_time, QRCode.subject_id, QRCode.id, QRCode.subject_id.in_(subject_ids)),
+        attendance=(Attendance.marked_at, Attendance.subject_id, Attendance.id, Attendance.subject_id.in_(subject_ids)),
+    )).all()
+    sessions = defaultdict(dict)
+    attended = defaultdict(dict)
+    for kind, bucket, sid, cnt in rows:
+        (sessions if kind == 's' else attended)[bucket][sid] = cnt
+    values = []
+    for i in range(len(buckets)):
+        denom = sum(cnt * enrollment_counts.get(sid, 0) for sid, cnt in sessions.get(i, {}).items())
+        numer = sum(attended.get(i, {}).values())
+        values.append(round((numer / denom) * 100, 2) if denom > 0 else 0)
+    return [b.label for b in buckets], values, sessions, attended
+
 @teacher_bp.route('/teacher/analytics')
 @teacher_required
 def analytics():
-    subject_ids = [s.id for s in Subject.query.filter_by(teacher_id=current_user.id).all()]
+    subjects = Subject.query.filter_by(teacher_id=current_user.id).all()
+    subject_ids = [s.id for s in subjects]
     if not subject_ids:
         return render_template('teacher/analytics.html',
                                daily_labels=[], daily_values=[],
@@ -407,95 +594,26 @@ def analytics():
         filter(Enrollment.subject_id.in_(subject_ids)).group_by(Enrollment.subject_id).all()
     enrollment_counts = {sid: cnt for sid, cnt in enrollment_counts_rows}
 
-    # Daily trends (last 30 days)
+    # Daily (last 30 days), weekly (last 8 weeks) and monthly (last 12 months) trends
     today = datetime.utcnow().date()
-    last_30 = [today - timedelta(days=i) for i in range(29, -1, -1)]
-    qr_rows = db.session.query(QRCode.subject_id, db.func.date(QRCode.class_start_time)).\
-        filter(QRCode.subject_id.in_(subject_ids)).\
-        filter(QRCode.class_start_time.isnot(None)).all()
-    sessions_by_day = defaultdict(set)
-    for sid, day in qr_rows:
-        if day is not None:
-            sessions_by_day[day].add(sid)
-    att_rows = db.session.query(db.func.date(Attendance.marked_at), db.func.count(Attendance.id)).\
-        filter(Attendance.subject_id.in_(subject_ids)).\
-        group_by(db.func.date(Attendance.marked_at)).all()
-    attendance_by_day = {day: cnt for day, cnt in att_rows}
-    daily_labels = [d.strftime('%Y-%m-%d') for d in last_30]
-    daily_values = []
-    for d in last_30:
-        sid_set = sessions_by_day.get(d, set())
-        denom = sum(enrollment_counts.get(s, 0) for s in sid_set)
-        numer = attendance_by_day.get(d, 0)
-        pct = round((numer / denom) * 100, 2) if denom > 0 else 0
-        daily_values.append(pct)
-
-    # Weekly trends (last 8 weeks)
-    def week_start(date_obj):
-        return date_obj - timedelta(days=date_obj.weekday())
-    daily_pct_map = {last_30[i]: daily_values[i] for i in range(len(last_30))}
-    for i in range(1, 8 * 7 + 1):
-        d = today - timedelta(days=i)
-        if d not in daily_pct_map:
-            daily_pct_map[d] = 0
-    by_week = defaultdict(list)
-    for d, pct in daily_pct_map.items():
-        by_week[week_start(d)].append(pct)
-    week_keys_sorted = sorted(list(by_week.keys()))[-8:]
-    weekly_labels = [wk.strftime('%Y-%m-%d') for wk in week_keys_sorted]
-    weekly_values = [round(sum(vals) / len(vals), 2) if vals else 0 for wk, vals in [(wk, by_week[wk]) for wk in week_keys_sorted]]
-
-    # Monthly trends (last 12 months)
-    qr_month_rows = db.session.query(QRCode.subject_id, db.func.date_trunc('month', QRCode.class_start_time)).\
-        filter(QRCode.subject_id.in_(subject_ids)).\
-        filter(QRCode.class_start_time.isnot(None)).all()
-    sessions_by_month = defaultdict(set)
-    for sid, month_dt in qr_month_rows:
-        if month_dt is not None:
-            sessions_by_month[month_dt.date()].add(sid)
-    att_month_rows = db.session.query(db.func.date_trunc('month', Attendance.marked_at), db.func.count(Attendance.id)).\
-        filter(Attendance.subject_id.in_(subject_ids)).\
-        group_by(db.func.date_trunc('month', Attendance.marked_at)).all()
-    attendance_by_month = {month_dt.date(): cnt for month_dt, cnt in att_month_rows}
-    monthly_labels = []
-    monthly_values = []
-    first_of_month = datetime.utcnow().date().replace(day=1)
-    months = []
-    for i in range(11, -1, -1):
-        y = first_of_month.year
-        m = first_of_month.month - i
-        while m <= 0:
-            y -= 1
-            m += 12
-        months.append(datetime(y, m, 1).date())
-    for mkey in months:
-        sid_set = sessions_by_month.get(mkey, set())
-        denom = sum(enrollment_counts.get(s, 0) for s in sid_set)
-        numer = attendance_by_month.get(mkey, 0)
-        pct = round((numer / denom) * 100, 2) if denom > 0 else 0
-        monthly_labels.append(mkey.strftime('%Y-%m'))
-        monthly_values.append(pct)
-
-    # Heatmap over last 30 days per subject
-    start_day = last_30[0]
-    end_day = last_30[-1]
-    subject_sessions_rows = db.session.query(QRCode.subject_id, db.func.count(QRCode.id)).\
-        filter(QRCode.subject_id.in_(subject_ids)).\
-        filter(QRCode.class_start_time.isnot(None)).\
-        filter(db.func.date(QRCode.class_start_time) >= start_day).\
-        filter(db.func.date(QRCode.class_start_time) <= end_day).\
-        group_by(QRCode.subject_id).all()
-    sessions_per_subject = {sid: cnt for sid, cnt in subject_sessions_rows}
-    att_per_subject_rows = db.session.query(Attendance.subject_id, db.func.count(Attendance.id)).\
-        filter(Attendance.subject_id.in_(subject_ids)).\
-        filter(db.func.date(Attendance.marked_at) >= start_day).\
-        filter(db.func.date(Attendance.marked_at) <= end_day).\
-        group_by(Attendance.subject_id).all()
-    att_per_subject = {sid: cnt for sid, cnt in att_per_subject_rows}
+    daily_buckets = timebuckets.day_buckets(today, 30)
+    daily_labels, daily_values, daily_sessions, daily_attended = _attendance_series(daily_buckets, subject_ids, enrollment_counts)
+    weekly_labels, weekly_values, _, _ = _attendance_series(timebuckets.week_buckets(today, 8), subject_ids, enrollment_counts)
+    monthly_labels, monthly_values, _, _ = _attendance_series(timebuckets.month_buckets(today, 12), subject_ids, enrollment_counts)
+
+    # Heatmap over last 30 days per subject, folded from the daily buckets
+    sessions_per_subject = defaultdict(int)
+    att_per_subject = defaultdict(int)
+    for per_subject in daily_sessions.values():
+        for sid, cnt in per_subject.items():
+            sessions_per_subject[sid] += cnt
+    for per_subject in daily_attended.values():
+        for sid, cnt in per_subject.items():
+            att_per_subject[sid] += cnt
     heatmap = []
     subjects_meta = []
-    for sid in subject_ids:
-        subj = Subject.query.get(sid)
+    for subj in subjects:
+        sid = subj.id
         subjects_meta.append({'id': sid, 'name': subj.name, 'division': subj.division})
         total_sessions = sessions_per_subject.get(sid, 0)
         denom = total_sessions * enrollment_counts.get(sid, 0)
@@ -503,30 +621,7 @@ def analytics():
         pct = round((numer / denom) * 100, 2) if denom > 0 else 0
         heatmap.append({'subject_id': sid, 'pct': pct})
 
-    # Defaulters (< 75%)
-    enrollments = Enrollment.query.filter(Enrollment.subject_id.in_(subject_ids)).all()
-    student_subjects = defaultdict(set)
-    for enr in enrollments:
-        student_subjects[enr.student_id].add(enr.subject_id)
-    att_student_rows = db.session.query(Attendance.student_id, db.func.count(db.func.distinct(Attendance.qr_code_id))).\
-        filter(Attendance.subject_id.in_(subject_ids)).\
-        group_by(Attendance.student_id).all()
-    attended_by_student = {sid: cnt for sid, cnt in att_student_rows}
-    defaulters = []
-    for student_id, subs in student_subjects.items():
-        total_sess = sum(sessions_per_subject.get(s, 0) for s in subs)
-        attended = attended_by_student.get(student_id, 0)
-        pct = round((attended / total_sess) * 100, 2) if total_sess > 0 else 0
-        if pct < 75:
-            user = User.query.get(student_id)
-            defaulters.append({
-                'student_id': student_id,
-                'name': user.name if user else 'Unknown',
-                'registration_number': user.registration_number if user else '',
-                'attended': attended,
-                'total': total_sess,
-                'percentage': pct,
-            })
+    defaulters = defaulters_for_teacher(current_user.id)
 
     return render_template('teacher/analytics.html',
                            daily_labels=daily_labels, daily_values=daily_values,
@@ -539,86 +634,41 @@ def analytics():
 @teacher_bp.route('/teacher/analytics/defaulters.csv')
 @teacher_required
 def export_defaulters_csv():
-    subject_ids = [s.id for s in Subject.query.filter_by(teacher_id=current_user.id).all()]
-    subject_sessions_rows = db.session.query(QRCode.subject_id, db.func.count(QRCode.id)).\
-        filter(QRCode.subject_id.in_(subject_ids)).\
-        filter(QRCode.class_start_time.isnot(None)).\
-        group_by(QRCode.subject_id).all()
-    sessions_per_subject = {sid: cnt for sid, cnt in subject_sessions_rows}
-    enrollments = Enrollment.query.filter(Enrollment.subject_id.in_(subject_ids)).all()
-    student_subjects = defaultdict(set)
-    for enr in enrollments:
-        student_subjects[enr.student_id].add(enr.subject_id)
-    att_student_rows = db.session.query(Attendance.student_id, db.func.count(db.func.distinct(Attendance.qr_code_id))).\
-        filter(Attendance.subject_id.in_(subject_ids)).\
-        group_by(Attendance.student_id).all()
-    attended_by_student = {sid: cnt for sid, cnt in att_student_rows}
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Registration Number', 'Name', 'Attended', 'Total Sessions', 'Percentage'])
-    for student_id, subs in student_subjects.items():
-        total_sess = sum(sessions_per_subject.get(s, 0) for s in subs)
-        attended = attended_by_student.get(student_id, 0)
-        pct = round((attended / total_sess) * 100, 2) if total_sess > 0 else 0
-        if pct < 75:
-            user = User.query.get(student_id)
-            writer.writerow([
-                user.registration_number if user else '',
-                user.name if user else 'Unknown',
-                attended,
-                total_sess,
-                pct
-            ])
-    output.seek(0)
-    return send_file(io.BytesIO(output.getvalue().encode('utf-8')),
-                     mimetype='text/csv',
-                     as_attachment=True,
-                     download_name='defaulters.csv')
+    return exports.csv_response(
+        'defaulters.csv',
+        ['Registration Number', 'Name', 'Attended', 'Total Sessions', 'Percentage'],
+        ([d.registration_number, d.name, d.attended, d.total, d.percentage]
+         for d in defaulters_for_teacher(current_user.id))
+    )
 
 @teacher_bp.route('/teacher/analytics/defaulters.pdf')
 @teacher_required
 def export_defaulters_pdf():
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.units import inch
-    subject_ids = [s.id for s in Subject.query.filter_by(teacher_id=current_user.id).all()]
-    subject_sessions_rows = db.session.query(QRCode.subject_id, db.func.count(QRCode.id)).\
-        filter(QRCode.subject_id.in_(subject_ids)).\
-        filter(QRCode.class_start_time.isnot(None)).\
-        group_by(QRCode.subject_id).all()
-    sessions_per_subject = {sid: cnt for sid, cnt in subject_sessions_rows}
-    enrollments = Enrollment.query.filter(Enrollment.subject_id.in_(subject_ids)).all()
-    student_subjects = defaultdict(set)
-    for enr in enrollments:
-        student_subjects[enr.student_id].add(enr.subject_id)
-    att_student_rows = db.session.query(Attendance.student_id, db.func.count(db.func.distinct(Attendance.qr_code_id))).\
-        filter(Attendance.subject_id.in_(subject_ids)).\
-        group_by(Attendance.student_id).all()
-    attended_by_student = {sid: cnt for sid, cnt in att_student_rows}
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    y = height - inch
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(inch, y, "Defaulters Report (Below 75%)")
-    y -= 0.3 * inch
-    c.setFont("Helvetica", 10)
-    c.drawString(inch, y, f"Generated at: {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}")
-    y -= 0.4 * inch
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(inch, y, "Reg. No")
-    c.drawString(inch + 1.5 * inch, y, "Name")
-    c.drawString(inch + 4.0 * inch, y, "Attended")
-    c.drawString(inch + 5.0 * inch, y, "Total")
-    c.drawString(inch + 5.8 * inch, y, "%")
-    y -= 0.2 * inch
-    c.setFont("Helvetica", 10)
-    for student_id, subs in student_subjects.items():
-        total_sess = sum(sessions_per_subject.get(s, 0) for s in subs)
-        attended = attended_by_student.get(student_id, 0)
-        pct = round((attended / total_sess) * 100, 2) if total_sess > 0 else 0
-        if pct < 75:
-            user = User.query.get(student_id)
+    defaulters = defaulters_for_teacher(current_user.id)
+
+    def render():
+        from reportlab.lib.pagesizes import letter
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.units import inch
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=letter)
+        width, height = letter
+        y = height - inch
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(inch, y, "Defaulters Report (Below 75%, Last 30 Days)")
+        y -= 0.3 * inch
+        c.setFont("Helvetica", 10)
+        c.drawString(inch, y, f"Generated at: {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}")
+        y -= 0.4 * inch
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(inch, y, "Reg. No")
+        c.drawString(inch + 1.5 * inch, y, "Name")
+        c.drawString(inch + 4.0 * inch, y, "Attended")
+        c.drawString(inch + 5.0 * inch, y, "Total")
+        c.drawString(inch + 5.8 * inch, y, "%")
+        y -= 0.2 * inch
+        c.setFont("Helvetica", 10)
+        for d in defaulters:
             if y < inch:
                 c.showPage()
                 y = height - inch
@@ -630,16 +680,20 @@ def export_defaulters_pdf():
                 c.drawString(inch + 5.8 * inch, y, "%")
                 y -= 0.2 * inch
                 c.setFont("Helvetica", 10)
-            c.drawString(inch, y, (user.registration_number if user else '')[:12])
-            c.drawString(inch + 1.5 * inch, y, (user.name if user else 'Unknown')[:28])
-            c.drawRightString(inch + 4.7 * inch, y, str(attended))
-            c.drawRightString(inch + 5.6 * inch, y, str(total_sess))
-            c.drawRightString(inch + 6.4 * inch, y, f"{pct}")
+            c.drawString(inch, y, d.registration_number[:12])
+            c.drawString(inch + 1.5 * inch, y, d.name[:28])
+            c.drawRightString(inch + 4.7 * inch, y, str(d.attended))
+            c.drawRightString(inch + 5.6 * inch, y, str(d.total))
+            c.drawRightString(inch + 6.4 * inch, y, f"{d.percentage}")
             y -= 0.18 * inch
-    c.showPage()
-    c.save()
-    buffer.seek(0)
-    return send_file(buffer, mimetype='application/pdf', as_attachment=True, download_name='defaulters.pdf')
+        c.showPage()
+        c.save()
+        buffer.seek(0)
+        return buffer
+
+    # The list only changes with the counters behind it; a cached copy keeps its original timestamp
+    key = pdf_cache.fingerprint('defaulters', current_user.id, defaulters)
+    return pdf_cache.pdf_response(key, render, 'defaulters.pdf')
 
 
 # ------------------------- RESULTS MANAGEMENT -------------------------
@@ -695,60 +749,30 @@ def upload_results_csv():
             return render_template('teacher/results_upload.html')
 
         try:
-            decoded = file.stream.read().decode('utf-8')
-            reader = csv.DictReader(io.StringIO(decoded))
-        except Exception:
-            flash('Invalid file format. Please upload a UTF-8 CSV.', 'error')
+            summary = results_import.import_results(file.stream, current_user.id, _results_report_dir())
+        except results_import.ImportFileError as e:
+            flash(str(e), 'error')
             return render_template('teacher/results_upload.html')
 
-        required_cols = {'student_id', 'subject', 'exam_type', 'marks_obtained', 'max_marks', 'remarks'}
-        # Allow subject to be subject_id or subject name
-        rows_processed = 0
-        rows_upserted = 0
-        errors = []
-        for idx, row in enumerate(reader, start=2):
-            rows_processed += 1
-            if not required_cols.issubset(set([*row.keys(), 'subject_id'])):
-                errors.append(f"Row {idx}: Missing required columns.")
-                continue
-            try:
-                student_id = int(row.get('student_id'))
-                subject_name = row.get('subject')
-                subject_id = row.get('subject_id')
-                if subject_id:
-                    subject_id = int(subject_id)
-                    subject = Subject.query.get(subject_id)
-                else:
-                    subject = Subject.query.filter_by(name=subject_name, teacher_id=current_user.id).first()
-                if not subject:
-                    errors.append(f"Row {idx}: Subject not found.")
-                    continue
-
-                if subject.teacher_id != current_user.id:
-                    errors.append(f"Row {idx}: You do not teach this subject.")
-                    continue
-
-                exam_type = (row.get('exam_type') or '').strip()
-                marks_obtained = float(row.get('marks_obtained'))
-                max_marks = float(row.get('max_marks'))
-                remarks = row.get('remarks')
-
-                existing = Result.query.filter_by(student_id=student_id, subject_id=subject.id, exam_type=exam_type).first()
-                if existing:
-                    existing.marks_obtained = marks_obtained
-                    existing.max_marks = max_marks
-                    existing.remarks = remarks
-                else:
-                    db.session.add(Result(student_id=student_id, subject_id=subject.id, exam_type=exam_type,
-                                          marks_obtained=marks_obtained, max_marks=max_marks, remarks=remarks))
-                    rows_upserted += 1
-            except Exception as e:
-                errors.append(f"Row {idx}: {str(e)}")
-
-        db.session.commit()
-        flash(f'Processed {rows_processed} rows. Upserted {rows_upserted}. Errors: {len(errors)}', 'success' if not errors else 'warning')
-        for err in errors[:10]:
-            flash(err, 'error')
+        flash(f'Processed {summary.processed} rows. Inserted {summary.inserted}, updated {summary.updated}. '
+              f'Errors: {summary.errors}', 'success' if not summary.errors else 'warning')
+        if summary.report_id:
+            return redirect(url_for('teacher.upload_results_csv', report=summary.report_id))
         return redirect(url_for('teacher.upload_results_csv'))
 
-    return render_template('teacher/results_upload.html')
+    report_id = request.args.get('report')
+    if report_id and not results_import.has_report(_results_report_dir(), report_id):
+        report_id = None
+    return render_template('teacher/results_upload.html', report_id=report_id)
+
+
+@teacher_bp.route('/teacher/results/upload/errors/<report_id>.csv')
+@teacher_required
+def results_error_report(report_id):
+    # Reports live in a per-teacher folder, so another teacher's id simply 404s
+    return send_from_directory(_results_report_dir(), f'{report_id}.csv', mimetype='text/csv',
+                               as_attachment=True, download_name='results-import-errors.csv')
+
+
+def _results_report_dir():
+    return os.path.join(current_app.instance_path, 'results-import-errors', str(current_user.id))
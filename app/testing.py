@@ -0,0 +1,64 @@
+"""pytest fixtures for query-count budgets.
+
+Load with `pytest -p app.testing`, or `pytest_plugins = ['app.testing']` in a
+conftest, then guard a route against N+1 regressions:
+
+    def test_dashboard_queries(client, login, max_queries):
+        login(teacher_id)
+        with max_queries(10):
+            client.get('/teacher/dashboard')
+
+A block that runs more statements than its budget fails with the count of each
+statement shape, so the repeated one is easy to spot. Every `app` has a fresh
+database, and the module caches (dashboard grids, chatbot snapshots, defaulters,
+QR tokens and images) live on the application, so nothing carries between tests.
+"""
+import os
+
+import pytest
+
+from .utils import query_stats
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An application on a scratch SQLite database with the schema created."""
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path / 'test.db'))
+    monkeypatch.setenv('ATTENDANCE_INGEST_SPOOL_DIR', os.path.join(str(tmp_path), 'spool'))
+    from . import create_app, db
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Log the test client in as the given user id."""
+    def login_as(user_id: int):
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+    return login_as
+
+
+@pytest.fixture
+def max_queries():
+    """Context manager factory: `with max_queries(n):` fails if the block runs more than n statements."""
+    return query_stats.assert_max_queries
+
+
+@pytest.fixture
+def query_counter():
+    """Collect every statement run during the test into a QueryStats."""
+    with query_stats.capture() as stats:
+        yield stats
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from sqlalchemy import literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .. import db
+from ..models.models import Attendance, Enrollment
+
+
+def dialect_insert(table):
+    """Return an INSERT construct that supports ON CONFLICT for the active database."""
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def insert_attendance(student_id: int, subject_id: int, qr_code_id: int, ip_address=None, device_info=None) -> bool:
+    """Record attendance in a single INSERT ... SELECT ... ON CONFLICT DO NOTHING statement.
+
+    The SELECT only yields a row when the student is enrolled in the subject, and the
+    conflict clause swallows duplicate scans. It names no conflict target so it also
+    works when partitioning moves `unique_attendance` into a trigger. Returns True when
+    a row was inserted; the caller owns the commit.
+    """
+    table = Attendance.__table__
+    enrolled = select(
+        literal(student_id, table.c.student_id.type),
+        literal(subject_id, table.c.subject_id.type),
+        literal(qr_code_id, table.c.qr_code_id.type),
+        literal(datetime.utcnow(), table.c.marked_at.type),
+        literal(ip_address, table.c.ip_address.type),
+        literal((device_info or '')[:200], table.c.device_info.type),
+    ).where(
+        Enrollment.student_id == student_id,
+        Enrollment.subject_id == subject_id,
+    )
+    stmt = dialect_insert(table).from_select(
+        ['student_id', 'subject_id', 'qr_code_id', 'marked_at', 'ip_address', 'device_info'],
+        enrolled,
+    ).on_conflict_do_nothing()
+    return db.session.execute(stmt).rowcount == 1
+
+
+def is_enrolled(student_id: int, subject_id: int) -> bool:
+    return db.session.query(Enrollment.id).filter_by(student_id=student_id, subject_id=subject_id).first() is not None
+
+
+def scan_state(student_id: int, subject_id: int, qr_code_id: int):
+    """Return (enrolled, already_marked) for a scan with one query."""
+    marked = db.session.query(Attendance.id).filter_by(student_id=student_id, qr_code_id=qr_code_id).exists()
+    row = db.session.query(
+        db.session.query(Enrollment.id).filter_by(student_id=student_id, subject_id=subject_id).exists(),
+        marked,
+    ).one()
+    return bool(row[0]), bool(row[1])
+
+
+def enrolled_pairs(pairs) -> set:
+    """Return the subset of (student_id, subject_id) pairs that have an enrollment."""
+    pairs = set(pairs)
+    if not pairs:
+        return set()
+    rows = db.session.query(Enrollment.student_id, Enrollment.subject_id).filter(
+        Enrollment.student_id.in_({p[0] for p in pairs}),
+        Enrollment.subject_id.in_({p[1] for p in pairs}),
+    ).all()
+    return {tuple(row) for row in rows} & pairs
+
+
+def insert_attendance_batch(rows) -> list:
+    """Insert many attendance rows with one multi-row INSERT ... ON CONFLICT DO NOTHING.
+
+    `rows` are dicts keyed by Attendance column names; duplicates of already marked
+    scans are skipped. Returns the (student_id, subject_id, qr_code_id) of the rows that
+    were actually inserted. The caller owns the commit.
+    """
+    if not rows:
+        return []
+    table = Attendance.__table__
+    stmt = dialect_insert(table).values(rows).on_conflict_do_nothing().returning(
+        table.c.student_id, table.c.subject_id, table.c.qr_code_id)
+    return [tuple(row) for row in db.session.execute(stmt)]
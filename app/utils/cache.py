@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import time
+from threading import Lock
+
+from flask import current_app
+
+
+class TTLCache:
+    """Thread-safe in-process mapping whose entries expire after a per-entry deadline.
+
+    Expired entries are evicted on the next access of any key (not just the expired
+    one), so memory never holds stale entries for long. When the cache is full, the
+    entry closest to expiry is evicted first.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024, on_expire=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.on_expire = on_expire
+        self._clock = clock
+        self._data = {}
+        self._deadlines = []
+        self._seq = itertools.count()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            expired = self._purge()
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                value = default
+            else:
+                self.hits += 1
+                value = item[1]
+        self._notify(expired)
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        deadline = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            expired = self._purge()
+            if key not in self._data and len(self._data) >= self.maxsize:
+                self._evict_one()
+            self._data[key] = (deadline, value)
+            heapq.heappush(self._deadlines, (deadline, next(self._seq), key))
+        self._notify(expired)
+
+    def expire_within(self, key, seconds: float) -> None:
+        """Shorten the entry's remaining life to at most `seconds`; a no-op if it expires sooner."""
+        deadline = self._clock() + seconds
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > deadline:
+                self._data[key] = (deadline, item[1])
+                heapq.heappush(self._deadlines, (deadline, next(self._seq), key))
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._deadlines = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def _purge(self):
+        now = self._clock()
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._deadlines)
+            item = self._data.get(key)
+            # Skip heap entries left behind by overwritten or popped keys
+            if item is not None and item[0] == deadline:
+                del self._data[key]
+                self.evictions += 1
+                expired.append((key, item[1]))
+        return expired
+
+    def _evict_one(self):
+        while self._deadlines:
+            deadline, _, key = heapq.heappop(self._deadlines)
+            item = self._data.get(key)
+            if item is not None and item[0] == deadline:
+                del self._data[key]
+                self.evictions += 1
+                return
+
+    def _notify(self, expired):
+        if self.on_expire:
+            for key, value in expired:
+                self.on_expire(key, value)
+
+
+_app_caches_lock = Lock()
+
+
+def app_cache(name: str, factory, app=None):
+    """Return the cache registered as `name` on `app` (the current app by default).
+
+    The cache is built with `factory()` on first use and kept in
+    `app.extensions['caches']` rather than at module level, so two applications in
+    one process, such as consecutive tests on fresh databases, never share entries.
+    """
+    caches = (app or current_app).extensions.setdefault('caches', {})
+    cache = caches.get(name)
+    if cache is None:
+        with _app_caches_lock:
+            cache = caches.setdefault(name, factory())
+    return cache
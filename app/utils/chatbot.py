@@ -0,0 +1,220 @@
+"""Intent matching and replies for the student chatbot widget.
+
+A message is matched against every intent's keywords with one precompiled
+pattern; when several intents match, the one listed first in `INTENTS` wins, as
+keywords are matched anywhere in the message. Only the attendance and subject
+intents touch the database, and both read a per-student snapshot of enrollments
+and attendance counters that is built with one query and kept for
+`SNAPSHOT_TTL_SECONDS`. Enrolling and marking attendance drop the snapshot in
+the process that handled them; elsewhere it is at most that many seconds old.
+"""
+import re
+from collections import namedtuple
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import aliased
+
+from .. import db
+from ..models.models import Enrollment, StudentAttendanceCount, Subject, SubjectSessionCount, User
+from .cache import TTLCache, app_cache
+
+
+SNAPSHOT_TTL_SECONDS = 30
+
+# In priority order
+INTENTS = (
+    ('attendance', ('attendance', 'present', 'absent', 'percentage')),
+    ('fees', ('fees', 'payment', 'paid', 'due')),
+    ('subjects', ('subject', 'course', 'enrolled')),
+    ('schedule', ('schedule', 'timetable', 'class', 'time')),
+    ('help', ('help', 'support', 'assistance')),
+    ('profile', ('profile', 'personal', 'info', 'details')),
+    ('greeting', ('hello', 'hi', 'hey', 'greetings')),
+)
+_PRIORITY = {name: i for i, (name, _) in enumerate(INTENTS)}
+# A zero-width match at every position, so overlapping keywords of different intents all count
+_MATCHER = re.compile('(?=' + '|'.join(
+    f'(?P<{name}>' + '|'.join(re.escape(k) for k in keywords) + ')' for name, keywords in INTENTS) + ')')
+
+EnrolledSubject = namedtuple('EnrolledSubject', ['name', 'year', 'division', 'teacher', 'roll_number',
+                                                 'sessions_held', 'sessions_attended'])
+
+
+def _snapshots(app=None) -> TTLCache:
+    return app_cache('chatbot', lambda: TTLCache(ttl=SNAPSHOT_TTL_SECONDS, maxsize=10000), app)
+
+
+def match(message: str):
+    """Return the name of the highest-priority intent in `message`, or None."""
+    found = {m.lastgroup for m in _MATCHER.finditer(message)}
+    return min(found, key=_PRIORITY.__getitem__) if found else None
+
+
+def snapshot(student_id: int):
+    """The student's enrollments with teacher names and attendance counts, in enrollment order."""
+    snapshots = _snapshots()
+    cached = snapshots.get(student_id)
+    if cached is not None:
+        return cached
+    teacher = aliased(User)
+    rows = db.session.query(
+        Subject.name, Subject.year, Subject.division, teacher.name, Enrollment.roll_number,
+        func.coalesce(SubjectSessionCount.sessions_held, 0),
+        func.coalesce(StudentAttendanceCount.sessions_attended, 0),
+    ).join(
+        Subject, Subject.id == Enrollment.subject_id
+    ).join(
+        teacher, teacher.id == Subject.teacher_id
+    ).outerjoin(
+        SubjectSessionCount, SubjectSessionCount.subject_id == Subject.id
+    ).outerjoin(
+        StudentAttendanceCount, and_(StudentAttendanceCount.subject_id == Subject.id,
+                                     StudentAttendanceCount.student_id == student_id)
+    ).filter(
+        Enrollment.student_id == student_id
+    ).order_by(Enrollment.id.asc()).all()
+    result = tuple(EnrolledSubject(*row) for row in rows)
+    snapshots.set(student_id, result)
+    return result
+
+
+def invalidate(student_id: int) -> None:
+    _snapshots().pop(student_id)
+
+
+def reply(message: str, student) -> str:
+    handler = _HANDLERS.get(match(message), _fallback)
+    return handler(student)
+
+
+def _attendance(student):
+    subjects = snapshot(student.id)
+    total_sessions = sum(s.sessions_held for s in subjects)
+    attended_sessions = sum(s.sessions_attended for s in subjects)
+    if total_sessions == 0:
+        return "You haven't attended any classes yet. Start by enrolling in subjects and attending classes!"
+
+    overall_percentage = attended_sessions / total_sessions * 100
+    response = f"📊 **Your Attendance Summary:**\n\n"
+    response += f"• **Overall Attendance:** {attended_sessions}/{total_sessions} ({round(overall_percentage, 2)}%)\n\n"
+
+    attendance_by_subject = {}
+    for s in subjects:
+        if s.sessions_held > 0:
+            attendance_by_subject[s.name] = {
+                'total': s.sessions_held,
+                'attended': s.sessions_attended,
+                'percentage': round(s.sessions_attended / s.sessions_held * 100, 2)
+            }
+    if attendance_by_subject:
+        response += "**By Subject:**\n"
+        for subject_name, stats in attendance_by_subject.items():
+            status_emoji = "✅" if stats['percentage'] >= 75 else "⚠️" if stats['percentage'] >= 50 else "❌"
+            response += f"• {subject_name}: {stats['attended']}/{stats['total']} ({stats['percentage']}%) {status_emoji}\n"
+
+        if overall_percentage >= 75:
+            response += "\n🎉 Great job! Your attendance is excellent!"
+        elif overall_percentage >= 50:
+            response += "\n⚠️ Your attendance needs improvement. Try to attend more classes!"
+        else:
+            response += "\n❌ Your attendance is low. Please make sure to attend all classes!"
+    return response
+
+
+def _fees(student):
+    response = "💰 **Fee Information:**\n\n"
+    response += "• **Tuition Fee:** ₹50,000 per semester\n"
+    response += "• **Due Date:** 15th of each month\n"
+    response += "• **Payment Status:** Please contact the administration office for current fee status\n"
+    response += "• **Payment Methods:** Online banking, UPI, or cash at the office\n\n"
+    response += "💡 **Need Help?** Contact the accounts department at accounts@college.edu"
+    return response
+
+
+def _subjects(student):
+    subjects = snapshot(student.id)
+    if not subjects:
+        response = "📚 You haven't enrolled in any subjects yet.\n\n"
+        response += "Go to 'Browse Subjects' to enroll in available courses!"
+        return response
+    response = "📚 **Your Enrolled Subjects:**\n\n"
+    for s in subjects:
+        response += f"• **{s.name}** (Year {s.year}, Division {s.division})\n"
+        response += f"  Roll Number: {s.roll_number}\n"
+        response += f"  Teacher: {s.teacher}\n\n"
+    return response
+
+
+def _schedule(student):
+    response = "📅 **Class Schedule:**\n\n"
+    response += "**Monday - Friday:**\n"
+    response += "• 9:00 AM - 10:00 AM: Morning Assembly\n"
+    response += "• 10:00 AM - 11:00 AM: Period 1\n"
+    response += "• 11:00 AM - 12:00 PM: Period 2\n"
+    response += "• 12:00 PM - 1:00 PM: Lunch Break\n"
+    response += "• 1:00 PM - 2:00 PM: Period 3\n"
+    response += "• 2:00 PM - 3:00 PM: Period 4\n"
+    response += "• 3:00 PM - 4:00 PM: Period 5\n\n"
+    response += "**Saturday:**\n"
+    response += "• 9:00 AM - 12:00 PM: Practical/Lab Sessions\n\n"
+    response += "💡 Check your specific subject timings in the 'My Subjects' section!"
+    return response
+
+
+def _help(student):
+    response = "🤖 **How can I help you?**\n\n"
+    response += "I can provide information about:\n"
+    response += "• 📊 **Attendance** - Check your attendance records\n"
+    response += "• 💰 **Fees** - Fee structure and payment details\n"
+    response += "• 📚 **Subjects** - Your enrolled courses\n"
+    response += "• 📅 **Schedule** - Class timings and schedule\n"
+    response += "• 👤 **Profile** - Your personal information\n\n"
+    response += "Just ask me about any of these topics!"
+    return response
+
+
+def _profile(student):
+    response = f"👤 **Your Profile Information:**\n\n"
+    response += f"• **Name:** {student.name}\n"
+    response += f"• **Email:** {student.email}\n"
+    response += f"• **Registration Number:** {student.registration_number}\n"
+    response += f"• **Year:** {student.year}\n"
+    response += f"• **Division:** {student.division}\n"
+    response += f"• **Member Since:** {student.created_at.strftime('%B %Y')}\n\n"
+    response += "💡 To update your information, contact the administration office."
+    return response
+
+
+def _greeting(student):
+    response = f"👋 **Hello {student.name}!**\n\n"
+    response += "Welcome to your student dashboard! I'm your AI assistant.\n\n"
+    response += "I can help you with:\n"
+    response += "• Attendance information\n"
+    response += "• Fee details\n"
+    response += "• Subject information\n"
+    response += "• Class schedule\n"
+    response += "• Profile details\n\n"
+    response += "Just ask me anything!"
+    return response
+
+
+def _fallback(student):
+    response = "🤔 I'm not sure I understand. Try asking about:\n\n"
+    response += "• Your attendance records\n"
+    response += "• Fee information\n"
+    response += "• Enrolled subjects\n"
+    response += "• Class schedule\n"
+    response += "• Your profile\n\n"
+    response += "Or type 'help' for more options!"
+    return response
+
+
+_HANDLERS = {
+    'attendance': _attendance,
+    'fees': _fees,
+    'subjects': _subjects,
+    'schedule': _schedule,
+    'help': _help,
+    'profile': _profile,
+    'greeting': _greeting,
+}
@@ -0,0 +1,118 @@
+"""Incrementally maintained attendance counters.
+
+`subject_session_count` holds the number of sessions held per subject and
+`student_attendance_count` the number of sessions attended per (student, subject).
+They are bumped in the same transaction that creates a QR code session or inserts
+an attendance row, so percentage lookups never have to count history rows.
+Recording a session drops cached defaulter lists for the subject; attendance
+only shortens their life (see `defaulters.attendance_recorded`).
+`flask rebuild-attendance-counters` recomputes both tables from scratch.
+"""
+from collections import Counter, namedtuple
+
+import click
+from sqlalchemy import and_, func, select
+
+from .. import db
+from . import defaulters
+from ..models.models import (Attendance, Enrollment, QRCode, StudentAttendanceCount, Subject,
+                             SubjectSessionCount)
+from .attendance import dialect_insert
+
+
+SubjectAttendance = namedtuple('SubjectAttendance', ['subject', 'roll_number', 'sessions_held', 'sessions_attended'])
+
+
+def record_session(subject_id: int, count: int = 1) -> None:
+    """Count `count` new sessions for a subject. The caller owns the commit."""
+    table = SubjectSessionCount.__table__
+    stmt = dialect_insert(table).values(subject_id=subject_id, sessions_held=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['subject_id'],
+        set_={'sessions_held': table.c.sessions_held + stmt.excluded.sessions_held},
+    )
+    db.session.execute(stmt)
+    defaulters.invalidate_subject(subject_id)
+
+
+def record_attendance(pairs) -> None:
+    """Count newly inserted attendance rows given as (student_id, subject_id) pairs.
+
+    The caller owns the commit and must only pass rows that were actually inserted.
+    """
+    increments = Counter(pairs)
+    if not increments:
+        return
+    table = StudentAttendanceCount.__table__
+    stmt = dialect_insert(table).values([
+        {'student_id': student_id, 'subject_id': subject_id, 'sessions_attended': n}
+        for (student_id, subject_id), n in increments.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['student_id', 'subject_id'],
+        set_={'sessions_attended': table.c.sessions_attended + stmt.excluded.sessions_attended},
+    )
+    db.session.execute(stmt)
+    defaulters.attendance_recorded({subject_id for _, subject_id in increments})
+
+
+def student_subjects(student_id: int):
+    """Return a SubjectAttendance per enrollment of the student, in enrollment order."""
+    rows = db.session.query(
+        Subject,
+        Enrollment.roll_number,
+        func.coalesce(SubjectSessionCount.sessions_held, 0),
+        func.coalesce(StudentAttendanceCount.sessions_attended, 0),
+    ).join(
+        Enrollment, Enrollment.subject_id == Subject.id
+    ).outerjoin(
+        SubjectSessionCount, SubjectSessionCount.subject_id == Subject.id
+    ).outerjoin(
+        StudentAttendanceCount, and_(StudentAttendanceCount.subject_id == Subject.id,
+                                     StudentAttendanceCount.student_id == student_id)
+    ).filter(
+        Enrollment.student_id == student_id
+    ).order_by(Enrollment.id.asc()).all()
+    return [SubjectAttendance(*row) for row in rows]
+
+
+def overall_attendance(student_ids) -> dict:
+    """Return {student_id: (sessions_held, sessions_attended)} summed over each student's enrollments."""
+    rows = db.session.query(
+        Enrollment.student_id,
+        func.coalesce(func.sum(SubjectSessionCount.sessions_held), 0),
+        func.coalesce(func.sum(StudentAttendanceCount.sessions_attended), 0),
+    ).outerjoin(
+        SubjectSessionCount, SubjectSessionCount.subject_id == Enrollment.subject_id
+    ).outerjoin(
+        StudentAttendanceCount, and_(StudentAttendanceCount.subject_id == Enrollment.subject_id,
+                                     StudentAttendanceCount.student_id == Enrollment.student_id)
+    ).filter(
+        Enrollment.student_id.in_(student_ids)
+    ).group_by(Enrollment.student_id).all()
+    return {student_id: (held, attended) for student_id, held, attended in rows}
+
+
+def rebuild() -> None:
+    """Recompute both counter tables from the qr_code and attendance tables."""
+    db.session.query(StudentAttendanceCount).delete()
+    db.session.query(SubjectSessionCount).delete()
+    db.session.execute(SubjectSessionCount.__table__.insert().from_select(
+        ['subject_id', 'sessions_held'],
+        select(QRCode.subject_id, func.count(QRCode.id)).group_by(QRCode.subject_id),
+    ))
+    db.session.execute(StudentAttendanceCount.__table__.insert().from_select(
+        ['student_id', 'subject_id', 'sessions_attended'],
+        select(Attendance.student_id, Attendance.subject_id, func.count(Attendance.id)).
+        group_by(Attendance.student_id, Attendance.subject_id),
+    ))
+    db.session.commit()
+    defaulters.invalidate_all()
+
+
+def init_app(app):
+    @app.cli.command('rebuild-attendance-counters')
+    def rebuild_attendance_counters():
+        """Recompute materialized attendance counters from scratch."""
+        rebuild()
+        click.echo('Attendance counters rebuilt.')
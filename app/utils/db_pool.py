@@ -0,0 +1,176 @@
+"""Connection pool sizing for the SQLAlchemy engine, and pool statistics.
+
+Every gunicorn worker process has its own pool, so the database sees up to
+`workers × (pool_size + max_overflow)` connections from the app. `plan` splits a
+connection budget (`DB_MAX_CONNECTIONS`, defaulting to the profile's) across
+`WEB_CONCURRENCY` workers and caps each worker at what its `WEB_THREADS` request
+threads and background threads can use:
+
+- `dev`: SQLAlchemy's default pool (5 + 10 overflow) and no timeouts.
+- `small` / `large`: managed PostgreSQL plans with about 25 / 100 connections;
+  the default budgets leave a few for migrations, psql and the provider.
+- `pgbouncer-transaction`: PgBouncer in transaction pooling mode, where client
+  connections are cheap and PgBouncer bounds the server side. PgBouncer rejects
+  the `options` startup parameter, so set `statement_timeout` on the database
+  role instead (`ALTER ROLE ... SET statement_timeout = '30s'`).
+- `sqlite`: the SQLite file fallback with WAL and a single writer lane across
+  workers (see `sqlite_mode`); the pool is the library default.
+
+When a worker has more busy threads than connections, requests wait for one (up
+to `pool_timeout`) instead of the database refusing it. `TimedQueuePool` records
+those waits, which are exported on `/metrics` and `/metrics/db-pool`; both need
+METRICS_TOKEN.
+"""
+import os
+import threading
+import time
+
+from flask import current_app, jsonify
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from .. import db
+from .metrics import authorize
+
+
+# Connections a worker uses outside requests: the ingest writer, live roll-call sync and a report card job
+BACKGROUND_CONNECTIONS = 3
+
+PROFILES = {
+    'dev': {'max_connections': None, 'pool_timeout': 30, 'pool_recycle': -1, 'pool_pre_ping': False,
+            'statement_timeout_ms': 0},
+    'small': {'max_connections': 20, 'pool_timeout': 10, 'pool_recycle': 1800, 'pool_pre_ping': True,
+              'statement_timeout_ms': 30000},
+    'large': {'max_connections': 90, 'pool_timeout': 10, 'pool_recycle': 1800, 'pool_pre_ping': True,
+              'statement_timeout_ms': 30000},
+    'pgbouncer-transaction': {'max_connections': 100, 'pool_timeout': 10, 'pool_recycle': 300,
+                              'pool_pre_ping': True, 'statement_timeout_ms': 0},
+    'sqlite': {'max_connections': None, 'pool_timeout': 30, 'pool_recycle': -1, 'pool_pre_ping': False,
+               'statement_timeout_ms': 0},
+}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that counts checkouts, the time spent waiting for them and pool timeouts."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+
+    def _do_get(self):
+        # Includes opening a new connection when the pool has room to grow
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return connection
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                'size': self.size(),
+                'checked_out': self.checkedout(),
+                'overflow': max(0, self.overflow()),
+                'peak_checked_out': self.peak_checked_out,
+                'checkouts': self.checkouts,
+                'wait_seconds': self.wait_seconds,
+                'max_wait_seconds': self.max_wait_seconds,
+                'timeouts': self.timeouts,
+            }
+
+
+def plan(config) -> dict:
+    """The pool each worker gets under the configured profile, budget and concurrency."""
+    name = config['DB_POOL_PROFILE']
+    if name not in PROFILES:
+        raise ValueError(f"DB_POOL_PROFILE must be one of {', '.join(PROFILES)}, not {name!r}")
+    profile = PROFILES[name]
+    workers = max(1, config['WEB_CONCURRENCY'])
+    threads = max(1, config['WEB_THREADS'])
+    budget = config['DB_MAX_CONNECTIONS'] or profile['max_connections']
+    if budget is None:
+        pool_size, max_overflow = 5, 10
+    else:
+        per_worker = budget // workers
+        if per_worker < 1:
+            raise ValueError(f'DB_MAX_CONNECTIONS={budget} leaves no connection for each of {workers} workers')
+        cap = min(per_worker, threads + BACKGROUND_CONNECTIONS)
+        pool_size = min(threads, cap)
+        max_overflow = cap - pool_size
+    return {
+        'profile': name,
+        'workers': workers,
+        'threads': threads,
+        'max_connections': budget,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': config['DB_POOL_TIMEOUT'] or profile['pool_timeout'],
+    }
+
+
+def engine_options(config) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database and pool profile."""
+    url = config['SQLALCHEMY_DATABASE_URI']
+    if url in ('sqlite://', 'sqlite:///:memory:'):
+        # In-memory databases live in a single connection per thread
+        return {}
+    pool = plan(config)
+    profile = PROFILES[pool['profile']]
+    if pool['profile'] == 'sqlite' and not url.startswith('sqlite'):
+        raise ValueError('DB_POOL_PROFILE=sqlite needs a sqlite:/// DATABASE_URL')
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool['pool_size'],
+        'max_overflow': pool['max_overflow'],
+        'pool_timeout': pool['pool_timeout'],
+        'pool_recycle': profile['pool_recycle'],
+        'pool_pre_ping': profile['pool_pre_ping'],
+    }
+    if url.startswith('postgresql'):
+        timeout = config['DB_STATEMENT_TIMEOUT_MS']
+        timeout = profile['statement_timeout_ms'] if timeout is None else int(timeout)
+        connect_args = {'application_name': config['DB_APPLICATION_NAME']}
+        if timeout:
+            connect_args['options'] = f'-c statement_timeout={timeout}'
+        options['connect_args'] = connect_args
+    return options
+
+
+class DbPool:
+    def __init__(self, app):
+        self.plan = plan(app.config)
+        with app.app_context():
+            self.engine = db.engine
+
+    def stats(self) -> dict:
+        # engine.dispose() replaces the pool, so look it up every time
+        pool = self.engine.pool
+        return pool.stats() if isinstance(pool, TimedQueuePool) else {}
+
+
+def pool_view():
+    """This worker's pool plan and stats; closed like /metrics unless METRICS_TOKEN is sent."""
+    authorize()
+    db_pool = current_app.extensions['db_pool']
+    return jsonify(plan=db_pool.plan, worker=dict(pid=os.getpid(), **db_pool.stats()))
+
+
+def init_app(app):
+    db_pool = DbPool(app)
+    app.extensions['db_pool'] = db_pool
+    app.add_url_rule('/metrics/db-pool', 'db_pool', pool_view)
+    return db_pool
@@ -0,0 +1,160 @@
+"""Defaulter computation shared by the analytics page and the defaulter exports.
+
+A defaulter is a student whose attendance across a teacher's subjects, over the
+sessions held in the last `WINDOW_DAYS` days, is below `DEFAULTER_THRESHOLD`
+percent. The list is computed with one grouped query, joining the enrollments to
+the window's sessions per subject and attendance per student, plus one bulk user
+fetch. It is cached per application and teacher so that the analytics page and
+the CSV/PDF downloads that follow it share one computation. Writes that change
+sessions or enrollments call `invalidate_subject`, and creating a subject calls
+`invalidate_teacher`. Scans arrive in bursts, so recording attendance only caps
+the affected lists at `SCAN_STALENESS_SECONDS` more life: a burst recomputes each
+list at most once per that interval instead of once per scan. Other worker
+processes pick changes up within `CACHE_TTL_SECONDS`.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from threading import Lock
+
+from sqlalchemy import and_, distinct, func, select
+
+from .. import db
+from ..models.models import Attendance, Enrollment, QRCode, Subject, User
+from .cache import TTLCache, app_cache
+from .timebuckets import day_range, in_range
+
+
+DEFAULTER_THRESHOLD = 75
+WINDOW_DAYS = 30
+CACHE_TTL_SECONDS = 60
+SCAN_STALENESS_SECONDS = 5
+
+Defaulter = namedtuple('Defaulter', ['student_id', 'name', 'registration_number', 'attended', 'total', 'percentage'])
+
+
+class _DefaulterCache:
+    """One application's cached defaulter lists and the subjects each one covers."""
+
+    def __init__(self):
+        self.results = TTLCache(ttl=CACHE_TTL_SECONDS, maxsize=512)
+        # teacher_id -> subject ids covered by that teacher's cached result
+        self.teacher_subjects = {}
+        self.lock = Lock()
+
+
+def _cache(app=None) -> _DefaulterCache:
+    return app_cache('defaulters', _DefaulterCache, app)
+
+
+def defaulters_for_teacher(teacher_id: int) -> list:
+    """Return the teacher's defaulters as a list of Defaulter tuples, ordered by student id."""
+    cache = _cache()
+    cached = cache.results.get(teacher_id)
+    if cached is not None:
+        return cached
+    subject_ids, result = compute_defaulters(teacher_id)
+    with cache.lock:
+        cache.teacher_subjects[teacher_id] = subject_ids
+    cache.results.set(teacher_id, result)
+    return result
+
+
+def window(today=None):
+    """Return the half-open [start, end) range of the last WINDOW_DAYS days, today included."""
+    today = today or datetime.utcnow().date()
+    return day_range(today - timedelta(days=WINDOW_DAYS - 1))[0], day_range(today)[1]
+
+
+def compute_defaulters(teacher_id: int):
+    """Compute (subject_ids, defaulters) for a teacher without touching the cache."""
+    subject_ids = {sid for (sid,) in db.session.query(Subject.id).filter(Subject.teacher_id == teacher_id)}
+    if not subject_ids:
+        return subject_ids, []
+
+    # Sessions without a class_start_time fall outside any window, as on the analytics charts
+    start, end = window()
+    held = select(QRCode.subject_id, func.count(QRCode.id).label('sessions')).where(
+        QRCode.subject_id.in_(subject_ids), in_range(QRCode.class_start_time, start, end)
+    ).group_by(QRCode.subject_id).subquery()
+    attended = select(
+        Attendance.student_id, Attendance.subject_id, func.count(distinct(Attendance.qr_code_id)).label('sessions')
+    ).join(QRCode, QRCode.id == Attendance.qr_code_id).where(
+        Attendance.subject_id.in_(subject_ids), in_range(QRCode.class_start_time, start, end)
+    ).group_by(Attendance.student_id, Attendance.subject_id).subquery()
+
+    rows = db.session.query(
+        Enrollment.student_id,
+        func.sum(func.coalesce(attended.c.sessions, 0)),
+        func.sum(func.coalesce(held.c.sessions, 0)),
+    ).outerjoin(
+        held, held.c.subject_id == Enrollment.subject_id
+    ).outerjoin(
+        attended, and_(attended.c.student_id == Enrollment.student_id,
+                       attended.c.subject_id == Enrollment.subject_id)
+    ).filter(
+        Enrollment.subject_id.in_(subject_ids)
+    ).group_by(Enrollment.student_id).order_by(Enrollment.student_id.asc()).all()
+
+    below = []
+    for student_id, attended, total in rows:
+        attended, total = int(attended or 0), int(total or 0)
+        pct = round((attended / total) * 100, 2) if total > 0 else 0
+        if pct < DEFAULTER_THRESHOLD:
+            below.append((student_id, attended, total, pct))
+
+    users = {}
+    if below:
+        users = {u.id: u for u in User.query.filter(User.id.in_([b[0] for b in below])).all()}
+
+    result = []
+    for student_id, attended, total, pct in below:
+        user = users.get(student_id)
+        result.append(Defaulter(
+            student_id,
+            user.name if user else 'Unknown',
+            (user.registration_number or '') if user else '',
+            attended,
+            total,
+            pct,
+        ))
+    return subject_ids, result
+
+
+def invalidate_subject(subject_id: int) -> None:
+    """Drop cached results of any teacher whose subjects include `subject_id`."""
+    cache = _cache()
+    with cache.lock:
+        stale = [tid for tid, sids in cache.teacher_subjects.items() if subject_id in sids]
+        for tid in stale:
+            del cache.teacher_subjects[tid]
+    for tid in stale:
+        cache.results.pop(tid)
+
+
+def attendance_recorded(subject_ids) -> None:
+    """Let cached results covering any of `subject_ids` live at most SCAN_STALENESS_SECONDS more."""
+    subject_ids = set(subject_ids)
+    cache = _cache()
+    with cache.lock:
+        affected = [tid for tid, sids in cache.teacher_subjects.items() if not sids.isdisjoint(subject_ids)]
+    for tid in affected:
+        cache.results.expire_within(tid, SCAN_STALENESS_SECONDS)
+
+
+def invalidate_teacher(teacher_id: int) -> None:
+    """Drop the teacher's cached result, e.g. when they create a subject it does not cover yet."""
+    cache = _cache()
+    with cache.lock:
+        cache.teacher_subjects.pop(teacher_id, None)
+    cache.results.pop(teacher_id)
+
+
+def invalidate_all() -> None:
+    cache = _cache()
+    with cache.lock:
+        cache.teacher_subjects.clear()
+    cache.results.clear()
+
+
+def stats(app=None) -> dict:
+    return _cache(app).results.stats()
@@ -0,0 +1,86 @@
+"""Per-process cache of logged-in user identities for Flask-Login's user loader.
+
+Authenticated requests only read a handful of user columns (id, role, name,
+year, division, ...), so instead of loading the `User` row on every request the
+loader returns a `CachedUser` built from those columns and kept for
+`ttl` seconds. Updating or deleting a User through the ORM drops its entry in
+the process that made the change; other worker processes see the change once
+their entry expires, so the TTL bounds how long a role change or a deleted
+account can lag behind. The cache belongs to the application, so two apps in one
+process never serve each other's users.
+"""
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+
+from .. import db
+from ..models.models import User
+from .cache import TTLCache, app_cache
+
+
+MAX_ENTRIES = 10000
+FIELDS = ('id', 'email', 'registration_number', 'name', 'role', 'year', 'division', 'created_at')
+
+
+class CachedUser(UserMixin):
+    """Read-only stand-in for `User` carrying the columns routes and templates use."""
+    __slots__ = FIELDS
+
+    def __init__(self, *values):
+        for field, value in zip(FIELDS, values):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CachedUser is read-only; load the User row to change it')
+
+    def __repr__(self):
+        return f'<CachedUser {self.id} {self.role}>'
+
+
+def _users(app=None):
+    """The app's identity cache, or None when USER_CACHE_TTL_SECONDS disables it."""
+    app = app or current_app
+    ttl = app.config['USER_CACHE_TTL_SECONDS']
+    if ttl <= 0:
+        return None
+    return app_cache('identity', lambda: TTLCache(ttl=ttl, maxsize=MAX_ENTRIES), app)
+
+
+def load(user_id: int):
+    """Return the CachedUser for `user_id`, querying only on a cache miss."""
+    cache = _users()
+    if cache is not None:
+        cached = cache.get(user_id)
+        if cached is not None:
+            return cached
+    row = db.session.query(*(getattr(User, field) for field in FIELDS)).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    user = CachedUser(*row)
+    if cache is not None:
+        cache.set(user_id, user)
+    return user
+
+
+def invalidate(user_id: int, app=None) -> None:
+    cache = _users(app)
+    if cache is not None:
+        cache.pop(user_id)
+
+
+def stats(app=None) -> dict:
+    cache = _users(app)
+    return cache.stats() if cache is not None else {}
+
+
+def _on_change(mapper, connection, target):
+    # ORM writes outside an app context have no cache to drop
+    if has_app_context():
+        invalidate(target.id)
+
+
+def init_app(app):
+    _users(app)
+    if not event.contains(User, 'after_update', _on_change):
+        event.listen(User, 'after_update', _on_change)
+        event.listen(User, 'after_delete', _on_change)
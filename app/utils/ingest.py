@@ -0,0 +1,319 @@
+"""Write-behind ingestion of attendance scans.
+
+Validated scans are appended to a local spool file and a bounded in-process queue,
+and acknowledged immediately. A background worker flushes them to the database in
+batched multi-row INSERTs every `flush_ms` milliseconds or `batch_size` rows,
+whichever comes first. Each worker process spools to a file of its own, named
+uniquely and held under an exclusive lock while the process lives, so a file whose
+lock can be taken belongs to a dead process whatever its pid. Such files are
+replayed when the queue starts; replays are safe because inserts skip duplicate
+scans.
+
+The spool is append-only: after each batch a `{"committed": n}` line records that
+the first n scans in the file are done, and the file is only rewritten once the
+queue drains or `max_queue` scans have been committed since the last rewrite. A
+batch that still fails after MAX_FLUSH_ATTEMPTS is retried scan by scan, and the
+scans that fail on their own are logged and moved to `dead-letter.jsonl` in the
+spool directory, so one bad row cannot hold up the scans behind it.
+"""
+import atexit
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from .. import db
+from . import counters
+from .attendance import enrolled_pairs, insert_attendance_batch
+from .cache import TTLCache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development servers run a single process
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RECORDED = 'recorded'
+REJECTED = 'rejected'
+DUPLICATE = 'duplicate'
+
+OUTCOME_TTL_SECONDS = 10 * 60
+MAX_FLUSH_ATTEMPTS = 5
+DEAD_LETTER = 'dead-letter.jsonl'
+
+
+class AttendanceIngestQueue:
+    def __init__(self, app, spool_dir: str, batch_size: int = 200, flush_ms: int = 250, max_queue: int = 10000):
+        self.app = app
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.max_queue = max_queue
+        self._pid = None
+        self._outcomes = TTLCache(ttl=OUTCOME_TTL_SECONDS, maxsize=max_queue * 2)
+
+    # ------------------------------------------------------------------ public
+
+    def start(self):
+        """Start this process's worker, replaying spool files of dead processes."""
+        self._ensure_started()
+
+    def submit(self, student_id: int, subject_id: int, qr_code_id: int, ip_address=None, device_info=None):
+        """Spool and enqueue a validated scan.
+
+        Returns QUEUED, DUPLICATE when the same scan is already waiting, or None when
+        the queue is full.
+        """
+        self._ensure_started()
+        key = (student_id, qr_code_id)
+        scan = {
+            'student_id': student_id,
+            'subject_id': subject_id,
+            'qr_code_id': qr_code_id,
+            'marked_at': datetime.utcnow().isoformat(),
+            'ip_address': ip_address,
+            'device_info': (device_info or '')[:200],
+        }
+        with self._cond:
+            if key in self._pending:
+                return DUPLICATE
+            if len(self._queue) >= self.max_queue:
+                return None
+            self._spool.write(json.dumps(scan) + '\n')
+            self._spool.flush()
+            os.fsync(self._spool.fileno())
+            self._queue.append(scan)
+            self._pending.add(key)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        return QUEUED
+
+    def status(self, student_id: int, qr_code_id: int):
+        """Return QUEUED, RECORDED or REJECTED if this process knows the scan, else None."""
+        key = (student_id, qr_code_id)
+        if self._pid == os.getpid():
+            with self._cond:
+                if key in self._pending:
+                    return QUEUED
+        return self._outcomes.get(key)
+
+    def stop(self, timeout: float = 5.0):
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    # ---------------------------------------------------------------- internal
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._pending = set()
+        self._stopping = False
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._spool_path = os.path.join(self.spool_dir, f'spool-{self._pid}-{uuid.uuid4().hex}.jsonl')
+        self._spool = _open_locked(self._spool_path, 'a')
+        # Scans at the head of the spool file that are done
+        self._committed = 0
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name='attendance-ingest', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _recover(self):
+        """Claim spool files of dead worker processes and re-enqueue their scans."""
+        for path in glob.glob(os.path.join(self.spool_dir, 'spool-*')):
+            if path == self._spool_path or path.endswith('.tmp'):
+                continue
+            try:
+                fh = _open_locked(path, 'r')
+            except (BlockingIOError, FileNotFoundError):
+                # Its process is alive, or another worker claimed it first
+                continue
+            with fh:
+                if not os.path.exists(path):
+                    continue
+                claimed = path if '.claimed-' in path else f'{path}.claimed-{self._pid}'
+                os.rename(path, claimed)
+                for scan in _unfinished(fh):
+                    key = (scan['student_id'], scan['qr_code_id'])
+                    if key not in self._pending:
+                        self._spool.write(json.dumps(scan) + '\n')
+                        self._queue.append(scan)
+                        self._pending.add(key)
+                self._spool.flush()
+                os.fsync(self._spool.fileno())
+                os.remove(claimed)
+            logger.info('Recovered spooled attendance scans from %s', path)
+
+    def _run(self):
+        attempts = 0
+        while True:
+            with self._cond:
+                if len(self._queue) < self.batch_size and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                batch = list(itertools.islice(self._queue, self.batch_size))
+                stopping = self._stopping
+            if batch:
+                try:
+                    self._done(batch, self._write(batch))
+                    attempts = 0
+                except Exception:
+                    attempts += 1
+                    if attempts < MAX_FLUSH_ATTEMPTS or stopping:
+                        logger.exception('Attendance ingest flush failed (attempt %d); %d scans stay spooled',
+                                         attempts, len(batch))
+                        if stopping:
+                            break
+                        time.sleep(self.flush_interval * 2 ** (attempts - 1))
+                        continue
+                    logger.exception('Attendance ingest flush failed %d times; retrying scan by scan', attempts)
+                    self._done(batch, self._write_each(batch))
+                    attempts = 0
+            if stopping and not batch:
+                break
+        self._spool.close()
+
+    def _write_each(self, batch) -> dict:
+        """Write the scans of a failing batch one at a time, dead-lettering those that fail."""
+        outcomes, dead = {}, []
+        for scan in batch:
+            try:
+                outcomes.update(self._write([scan]))
+            except Exception:
+                dead.append(scan)
+                outcomes[(scan['student_id'], scan['qr_code_id'])] = REJECTED
+        if dead:
+            path = os.path.join(self.spool_dir, DEAD_LETTER)
+            with open(path, 'a', encoding='utf-8') as fh:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+                for scan in dead:
+                    fh.write(json.dumps(scan) + '\n')
+                fh.flush()
+                os.fsync(fh.fileno())
+            logger.error('Moved %d attendance scans that cannot be written to %s: %s',
+                         len(dead), path, json.dumps(dead))
+        return outcomes
+
+    def _write(self, batch) -> dict:
+        """Insert a batch in one transaction and return the outcome of each scan."""
+        with self.app.app_context():
+            try:
+                enrolled = enrolled_pairs((s['student_id'], s['subject_id']) for s in batch)
+                rows = []
+                for scan in batch:
+                    if (scan['student_id'], scan['subject_id']) in enrolled:
+                        row = dict(scan)
+                        row['marked_at'] = datetime.fromisoformat(scan['marked_at'])
+                        rows.append(row)
+                inserted = set(insert_attendance_batch(rows))
+                counters.record_attendance(
+                    (student_id, subject_id) for student_id, subject_id, _ in inserted)
+                db.session.commit()
+                live = self.app.extensions.get('attendance_live')
+                if live is not None:
+                    # Rows the conflict clause skipped were published when first recorded
+                    live.publish_scans([row for row in rows if (
+                        row['student_id'], row['subject_id'], row['qr_code_id']) in inserted])
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+        return {(scan['student_id'], scan['qr_code_id']):
+                RECORDED if (scan['student_id'], scan['subject_id']) in enrolled else REJECTED
+                for scan in batch}
+
+    def _done(self, batch, outcomes):
+        """Drop a finished batch from the head of the queue and mark it committed in the spool."""
+        with self._cond:
+            for _ in batch:
+                self._queue.popleft()
+            for scan in batch:
+                key = (scan['student_id'], scan['qr_code_id'])
+                self._pending.discard(key)
+                self._outcomes.set(key, outcomes[key])
+            self._committed += len(batch)
+            if not self._queue or self._committed >= self.max_queue:
+                self._rewrite_spool()
+            else:
+                # Not synced: losing the marker only replays scans the inserts skip
+                self._spool.write(json.dumps({'committed': self._committed}) + '\n')
+                self._spool.flush()
+
+    def _rewrite_spool(self):
+        """Replace the spool file with the scans still waiting in the queue."""
+        tmp_path = self._spool_path + '.tmp'
+        # Locked before it replaces the spool, so the path is never claimable
+        fh = _open_locked(tmp_path, 'w')
+        for scan in self._queue:
+            fh.write(json.dumps(scan) + '\n')
+        fh.flush()
+        os.fsync(fh.fileno())
+        os.replace(tmp_path, self._spool_path)
+        self._spool.close()
+        self._spool = fh
+        self._committed = 0
+
+
+def _unfinished(lines) -> list:
+    """The scans of a spool file after its last committed marker."""
+    scans, committed = [], 0
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # A line torn by a crash mid-write
+            continue
+        if 'committed' in entry:
+            committed = entry['committed']
+        else:
+            scans.append(entry)
+    return scans[committed:]
+
+
+def _open_locked(path: str, mode: str):
+    """Open `path` holding an exclusive lock for as long as the file stays open.
+
+    Raises BlockingIOError when another open file, in this or another process, holds it.
+    """
+    fh = open(path, mode, encoding='utf-8')
+    if fcntl is not None:
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            raise BlockingIOError(path)
+    return fh
+
+
+def init_app(app):
+    """Attach an AttendanceIngestQueue to `app` when queued ingestion is enabled."""
+    if app.config.get('ATTENDANCE_INGEST_MODE') != 'queue':
+        return None
+    queue = AttendanceIngestQueue(
+        app,
+        spool_dir=app.config.get('ATTENDANCE_INGEST_SPOOL_DIR') or os.path.join(app.instance_path, 'attendance-spool'),
+        batch_size=app.config['ATTENDANCE_INGEST_BATCH_SIZE'],
+        flush_ms=app.config['ATTENDANCE_INGEST_FLUSH_MS'],
+        max_queue=app.config['ATTENDANCE_INGEST_MAX_QUEUE'],
+    )
+    app.extensions['attendance_ingest'] = queue
+    queue.start()
+    return queue
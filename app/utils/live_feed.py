@@ -0,0 +1,207 @@
+"""In-process pub/sub of newly marked attendance for live roll-call screens.
+
+Each QR session that has an open teacher screen in this process gets a channel: an
+append-only list of scans, one per student, plus a condition variable that the
+streaming responses wait on. `mark_attendance` and the ingest queue publish into
+the channel, and every open screen receives only the scans it has not seen yet.
+
+A channel is seeded from the database once, when its first screen opens. Scans
+written by other worker processes are picked up by one background sync thread
+per process. Each tick it runs a single query covering every watched session, so
+database load grows with the number of live sessions, not with open screens.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from .. import db
+from ..models.models import Attendance, User
+
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15
+# Screens stay open this long after a session expires, for late-arriving queued scans
+END_GRACE_SECONDS = 60
+# Rows whose transaction commits after a later id has been seen are still picked up
+COMMIT_LAG_SECONDS = 10
+
+
+class _Channel:
+    def __init__(self, qr_code_id: int, expires_at: datetime):
+        self.qr_code_id = qr_code_id
+        self.expires_at = expires_at
+        self.events = []
+        self.students = set()
+        self.cursor = 0
+        self.subscribers = 0
+        self.seeded = False
+        self.cond = threading.Condition()
+
+    def add(self, events) -> int:
+        added = 0
+        with self.cond:
+            for event in events:
+                if event['student_id'] in self.students:
+                    continue
+                self.students.add(event['student_id'])
+                event['seq'] = len(self.events) + 1
+                self.events.append(event)
+                added += 1
+            if added:
+                self.cond.notify_all()
+        return added
+
+    def wait(self, after: int, timeout: float) -> list:
+        with self.cond:
+            if len(self.events) <= after:
+                self.cond.wait(timeout)
+            return self.events[after:]
+
+
+def _event(student_id, name, registration_number, marked_at) -> dict:
+    return {
+        'student_id': student_id,
+        'name': name,
+        'registration_number': registration_number,
+        'marked_at': marked_at.isoformat() if marked_at else None,
+    }
+
+
+class AttendanceLiveFeed:
+    def __init__(self, app, sync_ms: int = 1000):
+        self.app = app
+        self.sync_interval = sync_ms / 1000.0
+        self._pid = None
+
+    # ------------------------------------------------------------------ public
+
+    def publish(self, qr_code_id: int, student, marked_at: datetime = None) -> None:
+        """Push one scan recorded in this process. A no-op unless a screen is watching."""
+        channel = self._channel(qr_code_id)
+        if channel is not None:
+            channel.add([_event(student.id, student.name, student.registration_number,
+                                marked_at or datetime.utcnow())])
+
+    def publish_scans(self, scans) -> None:
+        """Push scans recorded by the ingest queue (dicts keyed by Attendance columns)."""
+        watched = [s for s in scans if self._channel(s['qr_code_id']) is not None]
+        if not watched:
+            return
+        users = {u.id: u for u in db.session.query(User.id, User.name, User.registration_number).filter(
+            User.id.in_({s['student_id'] for s in watched}))}
+        for scan in watched:
+            user = users.get(scan['student_id'])
+            channel = self._channel(scan['qr_code_id'])
+            if user is not None and channel is not None:
+                channel.add([_event(user.id, user.name, user.registration_number, scan['marked_at'])])
+
+    def open(self, qr_code_id: int, expires_at: datetime) -> _Channel:
+        """Subscribe to a session, seeding its channel from the database if it is new."""
+        self._ensure_started()
+        with self._lock:
+            channel = self._channels.get(qr_code_id)
+            if channel is None:
+                channel = self._channels[qr_code_id] = _Channel(qr_code_id, expires_at)
+            channel.subscribers += 1
+        if not channel.seeded:
+            rows = self._rows(Attendance.qr_code_id == qr_code_id)
+            channel.cursor = max([row.id for row in rows], default=0)
+            channel.add([_event(r.student_id, r.name, r.registration_number, r.marked_at) for r in rows])
+            channel.seeded = True
+        return channel
+
+    def close(self, channel: _Channel) -> None:
+        with self._lock:
+            channel.subscribers -= 1
+            if channel.subscribers <= 0:
+                self._channels.pop(channel.qr_code_id, None)
+
+    def stream(self, channel: _Channel, after: int = 0):
+        """Yield Server-Sent Events for scans after sequence number `after`."""
+        try:
+            yield 'retry: 2000\n\n'
+            ends_at = channel.expires_at + timedelta(seconds=END_GRACE_SECONDS)
+            while datetime.utcnow() < ends_at:
+                events = channel.wait(after, KEEPALIVE_SECONDS)
+                if not events:
+                    yield ': keepalive\n\n'
+                    continue
+                for event in events:
+                    yield f"id: {event['seq']}\nevent: attendance\ndata: {json.dumps(event)}\n\n"
+                after = events[-1]['seq']
+            yield 'event: end\ndata: {}\n\n'
+        finally:
+            self.close(channel)
+
+    def watched(self) -> int:
+        if self._pid != os.getpid():
+            return 0
+        with self._lock:
+            return len(self._channels)
+
+    # ---------------------------------------------------------------- internal
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._channels = {}
+        if self.sync_interval > 0:
+            self._thread = threading.Thread(target=self._run, name='attendance-live-sync', daemon=True)
+            self._thread.start()
+
+    def _channel(self, qr_code_id: int):
+        if self._pid != os.getpid():
+            return None
+        with self._lock:
+            return self._channels.get(qr_code_id)
+
+    def _rows(self, *criteria):
+        try:
+            return db.session.query(
+                Attendance.id, Attendance.qr_code_id, Attendance.student_id, Attendance.marked_at,
+                User.name, User.registration_number
+            ).join(User, User.id == Attendance.student_id).filter(*criteria).order_by(Attendance.id).all()
+        finally:
+            # Streams must not pin a pooled connection
+            db.session.close()
+
+    def _run(self):
+        while True:
+            time.sleep(self.sync_interval)
+            with self._lock:
+                channels = {c.qr_code_id: c for c in self._channels.values() if c.seeded}
+            if not channels:
+                continue
+            try:
+                self._sync(channels)
+            except Exception:
+                logger.exception('Live attendance sync failed')
+
+    def _sync(self, channels):
+        """Fetch scans written by other processes for every watched session in one query."""
+        cursor = min(c.cursor for c in channels.values())
+        since = datetime.utcnow() - timedelta(seconds=COMMIT_LAG_SECONDS)
+        with self.app.app_context():
+            rows = self._rows(
+                Attendance.qr_code_id.in_(list(channels)),
+                or_(Attendance.id > cursor, Attendance.marked_at >= since),
+            )
+        for row in rows:
+            channel = channels[row.qr_code_id]
+            channel.cursor = max(channel.cursor, row.id)
+            channel.add([_event(row.student_id, row.name, row.registration_number, row.marked_at)])
+
+
+def init_app(app):
+    feed = AttendanceLiveFeed(app, sync_ms=app.config['ATTENDANCE_LIVE_SYNC_MS'])
+    app.extensions['attendance_live'] = feed
+    return feed
@@ -0,0 +1,375 @@
+"""Request metrics in the Prometheus text format, aggregated across worker processes.
+
+Requests to the teacher, student and auth blueprints are recorded per endpoint:
+a request counter by method and status, a latency histogram, the time spent in
+SQL (from `query_stats`) and the number of requests in flight. Recording only
+touches in-process dicts under a lock.
+
+Each worker process writes a snapshot of its metrics to a uniquely named
+`worker-<pid>-<uuid>.json` in the metrics directory every `flush_seconds`, and
+holds an flock on the matching `.lock` file for as long as it lives. The worker
+answering `/metrics` sums all snapshots. Snapshots whose lock can be taken
+belong to workers that have exited and are folded into `archive.json`, so
+counters never go backwards when gunicorn recycles a worker, even when the OS
+hands its pid to the next one; their in-flight gauges are dropped.
+"""
+import bisect
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, abort, current_app, g, request
+
+from . import identity, query_stats, teacher_dashboard
+
+
+logger = logging.getLogger(__name__)
+
+BLUEPRINTS = {'teacher', 'student', 'auth'}
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ARCHIVE = 'archive.json'
+# Connection pool fields from db_pool: gauges are dropped with a worker, counters are archived
+POOL_GAUGES = ('size', 'checked_out', 'overflow')
+POOL_COUNTERS = ('checkouts', 'wait_seconds', 'timeouts')
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development servers run a single process
+    fcntl = None
+
+
+_start_lock = threading.Lock()
+
+
+def _empty():
+    return {'requests': {}, 'duration': {}, 'db_seconds': {}, 'in_flight': {}, 'caches': {}, 'db_pool': {}}
+
+
+class RequestMetrics:
+    def __init__(self, app, directory: str, flush_seconds: float = 5.0):
+        self.app = app
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._pid = None
+
+    # ------------------------------------------------------------------ recording
+
+    def start(self, blueprint: str) -> None:
+        self._ensure_started()
+        with self._lock:
+            self._in_flight[blueprint] += 1
+
+    def finish(self, blueprint: str, endpoint: str, method: str, status: int, seconds: float,
+               db_seconds: float) -> None:
+        with self._lock:
+            self._requests[(endpoint, method, str(status))] += 1
+            histogram = self._duration.get(endpoint)
+            if histogram is None:
+                # Per-bucket counts, then sum and count
+                histogram = self._duration[endpoint] = [0] * len(BUCKETS) + [0.0, 0]
+            index = bisect.bisect_left(BUCKETS, seconds)
+            if index < len(BUCKETS):
+                histogram[index] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            self._db_seconds[endpoint] += db_seconds
+
+    def done(self, blueprint: str) -> None:
+        with self._lock:
+            self._in_flight[blueprint] -= 1
+
+    # ------------------------------------------------------------------ exposition
+
+    def render(self) -> str:
+        """Sum every worker's snapshot and return the Prometheus text exposition."""
+        self._ensure_started()
+        self._flush()
+        self._archive_dead()
+        total = _empty()
+        # Shared lock: never read a snapshot that is half-way into the archive
+        with self._locked(shared=True):
+            paths = glob.glob(os.path.join(self.directory, 'worker-*.json')) + [os.path.join(self.directory, ARCHIVE)]
+            for path in paths:
+                snapshot = _read(path)
+                if snapshot is not None:
+                    _merge(total, snapshot, gauges=os.path.basename(path) != ARCHIVE)
+        return _exposition(total)
+
+    # ------------------------------------------------------------------ internal
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with _start_lock:
+            if self._pid != os.getpid():
+                self._start()
+
+    def _start(self):
+        pid = os.getpid()
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._duration = {}
+        self._db_seconds = defaultdict(float)
+        self._in_flight = defaultdict(int)
+        os.makedirs(self.directory, exist_ok=True)
+        name = os.path.join(self.directory, f'worker-{pid}-{uuid.uuid4().hex}')
+        self._lock_file = _open_locked(f'{name}.lock')
+        self._path = f'{name}.json'
+        self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+        self._thread.start()
+        self._pid = pid
+
+    @contextmanager
+    def _locked(self, shared: bool = False):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, 'archive.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self._flush()
+            except Exception:
+                logger.exception('Writing the metrics snapshot failed')
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {
+                'requests': {'\x1f'.join(key): n for key, n in self._requests.items()},
+                'duration': {endpoint: list(h) for endpoint, h in self._duration.items()},
+                'db_seconds': dict(self._db_seconds),
+                'in_flight': dict(self._in_flight),
+            }
+        snapshot['caches'] = {'user': identity.stats(self.app), 'teacher_dashboard': teacher_dashboard.stats(self.app)}
+        pdf_cache = self.app.extensions.get('pdf_cache')
+        if pdf_cache is not None:
+            snapshot['caches']['pdf'] = pdf_cache.stats()
+        db_pool = self.app.extensions.get('db_pool')
+        if db_pool is not None:
+            snapshot['db_pool'] = db_pool.stats()
+        return snapshot
+
+    def _flush(self):
+        # The flush thread and a /metrics request may write at the same time
+        tmp_path = f'{self._path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(self._snapshot(), fh)
+        os.replace(tmp_path, self._path)
+
+    def _archive_dead(self):
+        """Fold snapshots of exited workers into the archive, under an exclusive lock."""
+        if fcntl is None:
+            return
+        with self._locked():
+            archive_path = os.path.join(self.directory, ARCHIVE)
+            archive = None
+            for lock_path in glob.glob(os.path.join(self.directory, 'worker-*.lock')):
+                try:
+                    lock = _open_locked(lock_path)
+                except (BlockingIOError, FileNotFoundError):
+                    # Its worker is alive
+                    continue
+                with lock:
+                    path = lock_path[:-len('.lock')] + '.json'
+                    snapshot = _read(path)
+                    if snapshot is not None:
+                        if archive is None:
+                            archive = _read(archive_path) or _empty()
+                        _merge(archive, snapshot, gauges=False)
+                        tmp_path = archive_path + '.tmp'
+                        with open(tmp_path, 'w', encoding='utf-8') as fh:
+                            json.dump(archive, fh)
+                        os.replace(tmp_path, archive_path)
+                        os.remove(path)
+                    os.remove(lock_path)
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(total: dict, snapshot: dict, gauges: bool) -> None:
+    for key, n in snapshot.get('requests', {}).items():
+        total['requests'][key] = total['requests'].get(key, 0) + n
+    for endpoint, histogram in snapshot.get('duration', {}).items():
+        current = total['duration'].get(endpoint)
+        total['duration'][endpoint] = histogram if current is None else [a + b for a, b in zip(current, histogram)]
+    for endpoint, seconds in snapshot.get('db_seconds', {}).items():
+        total['db_seconds'][endpoint] = total['db_seconds'].get(endpoint, 0.0) + seconds
+    for name, stats in snapshot.get('caches', {}).items():
+        current = total['caches'].setdefault(name, {})
+        for field in ('hits', 'misses', 'revalidated', 'evictions'):
+            current[field] = current.get(field, 0) + stats.get(field, 0)
+    pool = snapshot.get('db_pool', {})
+    for field in POOL_COUNTERS:
+        total['db_pool'][field] = total['db_pool'].get(field, 0) + pool.get(field, 0)
+    if gauges:
+        for blueprint, n in snapshot.get('in_flight', {}).items():
+            total['in_flight'][blueprint] = total['in_flight'].get(blueprint, 0) + n
+        for field in POOL_GAUGES:
+            total['db_pool'][field] = total['db_pool'].get(field, 0) + pool.get(field, 0)
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _exposition(total: dict) -> str:
+    lines = [
+        '# HELP http_requests_total Requests handled, by endpoint, method and status.',
+        '# TYPE http_requests_total counter',
+    ]
+    for key, n in sorted(total['requests'].items()):
+        endpoint, method, status = key.split('\x1f')
+        lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {n}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Time to produce a response, by endpoint.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for endpoint, histogram in sorted(total['duration'].items()):
+        name = _label(endpoint)
+        cumulative = 0
+        for bound, n in zip(BUCKETS, histogram):
+            cumulative += n
+            lines.append(f'http_request_duration_seconds_bucket{{endpoint="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_bucket{{endpoint="{name}",le="+Inf"}} {histogram[-1]}')
+        lines.append(f'http_request_duration_seconds_sum{{endpoint="{name}"}} {histogram[-2]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{{endpoint="{name}"}} {histogram[-1]}')
+
+    lines += [
+        '# HELP http_request_db_seconds_total Time spent running SQL, by endpoint. '
+        'Divide by http_request_duration_seconds_sum for the DB share.',
+        '# TYPE http_request_db_seconds_total counter',
+    ]
+    for endpoint, seconds in sorted(total['db_seconds'].items()):
+        lines.append(f'http_request_db_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds:.6f}')
+
+    lines += [
+        '# HELP http_requests_in_flight Requests being handled right now, by blueprint.',
+        '# TYPE http_requests_in_flight gauge',
+    ]
+    for blueprint, n in sorted(total['in_flight'].items()):
+        lines.append(f'http_requests_in_flight{{blueprint="{_label(blueprint)}"}} {n}')
+
+    if total['caches']:
+        lines += [
+            '# HELP cache_lookups_total Cache lookups, by cache and outcome.',
+            '# TYPE cache_lookups_total counter',
+        ]
+        for name, stats in sorted(total['caches'].items()):
+            for outcome in ('hits', 'misses', 'revalidated'):
+                lines.append(f'cache_lookups_total{{cache="{name}",outcome="{outcome}"}} {stats.get(outcome, 0)}')
+        lines += ['# TYPE cache_evictions_total counter']
+        for name, stats in sorted(total['caches'].items()):
+            lines.append(f'cache_evictions_total{{cache="{name}"}} {stats.get("evictions", 0)}')
+
+    pool = total['db_pool']
+    if pool.get('checkouts'):
+        lines += [
+            '# HELP db_pool_connections Database connections in the worker pools: steady pool size, '
+            'checked out, and opened beyond the pool size.',
+            '# TYPE db_pool_connections gauge',
+        ]
+        for field in POOL_GAUGES:
+            lines.append(f'db_pool_connections{{state="{field}"}} {pool.get(field, 0)}')
+        lines += [
+            '# HELP db_pool_checkouts_total Connections handed out by the worker pools.',
+            '# TYPE db_pool_checkouts_total counter',
+            f'db_pool_checkouts_total {pool["checkouts"]}',
+            '# HELP db_pool_wait_seconds_total Time spent waiting for a pooled connection.',
+            '# TYPE db_pool_wait_seconds_total counter',
+            f'db_pool_wait_seconds_total {pool["wait_seconds"]:.6f}',
+            '# HELP db_pool_timeouts_total Checkouts that gave up after pool_timeout.',
+            '# TYPE db_pool_timeouts_total counter',
+            f'db_pool_timeouts_total {pool["timeouts"]}',
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def _open_locked(path: str):
+    """Open `path` holding an exclusive lock for as long as the file stays open.
+
+    Raises BlockingIOError when another open file, in this or another process, holds it.
+    """
+    fh = open(path, 'a', encoding='utf-8')
+    if fcntl is not None:
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            raise BlockingIOError(path)
+    return fh
+
+
+def _before_request():
+    if request.blueprint in BLUEPRINTS:
+        g._metrics_started = time.perf_counter()
+        current_app.extensions['metrics'].start(request.blueprint)
+
+
+def _after_request(response):
+    started = g.get('_metrics_started')
+    if started is not None:
+        stats = query_stats.current()
+        current_app.extensions['metrics'].finish(
+            request.blueprint, request.endpoint, request.method, response.status_code,
+            time.perf_counter() - started, stats.seconds if stats is not None else 0.0,
+        )
+    return response
+
+
+def _teardown_request(exc):
+    if g.pop('_metrics_started', None) is not None:
+        current_app.extensions['metrics'].done(request.blueprint)
+
+
+def authorize():
+    """Abort unless the request carries METRICS_TOKEN as a bearer token.
+
+    Without a configured token the metrics endpoints are closed (404): they show
+    per-endpoint traffic and pool internals, so they are never open by default.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+
+
+def metrics_view():
+    authorize()
+    body = current_app.extensions['metrics'].render()
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    if not app.config['METRICS_ENABLED']:
+        return None
+    metrics = RequestMetrics(
+        app,
+        directory=app.config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics'),
+        flush_seconds=app.config['METRICS_FLUSH_SECONDS'],
+    )
+    app.extensions['metrics'] = metrics
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    return metrics
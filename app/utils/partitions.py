@@ -0,0 +1,277 @@
+"""Opt-in monthly range partitioning of the PostgreSQL `attendance` table.
+
+With `ATTENDANCE_PARTITIONING` enabled, the partitioning migration turns
+`attendance` into a table partitioned by month on `marked_at`, so reads for the
+current term only touch recent partitions and old months can be detached instead
+of deleted. The ORM model and the routes are unchanged.
+
+A partitioned table can only enforce unique constraints that include the
+partition key, so `unique_attendance` (student_id, qr_code_id) moves to the
+small `attendance_mark` table. A trigger claims the key before each insert and
+silently skips the row when the scan was already recorded, which is what the
+ON CONFLICT DO NOTHING inserts expect.
+
+`flask attendance-partitions create` adds partitions ahead of time and
+`flask attendance-partitions detach` detaches (or drops) old months. Detached
+history stays in the materialized counters; `flask rebuild-attendance-counters`
+after a detach counts only the attached months. Requires PostgreSQL 13 or later.
+"""
+import os
+from datetime import date, datetime
+
+import click
+from sqlalchemy import text
+
+from .. import db
+
+
+DEFAULT_PARTITION = 'attendance_default'
+
+_COLUMNS = 'id, student_id, subject_id, qr_code_id, marked_at, ip_address, device_info'
+
+# Named as create_all names them; foreign keys only need to be unique per table
+_FOREIGN_KEYS = (
+    'CONSTRAINT attendance_student_id_fkey FOREIGN KEY (student_id) REFERENCES "user" (id), '
+    'CONSTRAINT attendance_subject_id_fkey FOREIGN KEY (subject_id) REFERENCES subject (id), '
+    'CONSTRAINT attendance_qr_code_id_fkey FOREIGN KEY (qr_code_id) REFERENCES qr_code (id)'
+)
+
+_DEDUPE_FUNCTION = """
+CREATE OR REPLACE FUNCTION attendance_dedupe() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM attendance_mark
+        WHERE student_id = OLD.student_id AND qr_code_id = OLD.qr_code_id;
+        RETURN OLD;
+    END IF;
+    INSERT INTO attendance_mark (student_id, qr_code_id)
+    VALUES (NEW.student_id, NEW.qr_code_id)
+    ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    RETURN NEW;
+END
+$$
+"""
+
+
+def requested() -> bool:
+    """Whether ATTENDANCE_PARTITIONING asks the partitioning migration to convert the table.
+
+    Read from the environment, not the app config, so the migration does not depend
+    on how the application was configured.
+    """
+    return os.getenv('ATTENDANCE_PARTITIONING', 'false').lower() in ('1', 'true', 'yes')
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'attendance_y{month.year:04d}m{month.month:02d}'
+
+
+def is_partitioned(connection) -> bool:
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass('attendance'))"
+    )).scalar()
+
+
+def list_partitions(connection) -> list:
+    """Return (name, month) for each monthly partition, oldest first."""
+    rows = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('attendance')"
+    )).scalars()
+    partitions = []
+    for name in rows:
+        if name == DEFAULT_PARTITION:
+            continue
+        partitions.append((name, date(int(name[12:16]), int(name[17:19]), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_partitions(connection, first: date, last: date) -> list:
+    """Create the monthly partitions from `first` through `last` that do not exist yet.
+
+    Rows for a month without a partition land in the default partition, and a
+    partition cannot be created over rows already sitting there, so create
+    months before they start.
+    """
+    existing = {name for name, _ in list_partitions(connection)}
+    created = []
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            connection.execute(text(
+                f"CREATE TABLE {name} PARTITION OF attendance "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def detach_partitions(connection, before: date, drop: bool = False) -> list:
+    """Detach every monthly partition older than the month of `before`.
+
+    Detached partitions stay behind as plain tables for archiving unless `drop`
+    is set. Their duplicate-scan keys are released from `attendance_mark`.
+    """
+    cutoff = month_start(before)
+    detached = []
+    for name, month in list_partitions(connection):
+        if month >= cutoff:
+            break
+        connection.execute(text(
+            f"DELETE FROM attendance_mark m USING {name} a "
+            f"WHERE m.student_id = a.student_id AND m.qr_code_id = a.qr_code_id"
+        ))
+        connection.execute(text(f"ALTER TABLE attendance DETACH PARTITION {name}"))
+        if drop:
+            connection.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+    return detached
+
+
+def _serial_sequence(connection) -> str:
+    return connection.execute(text("SELECT pg_get_serial_sequence('attendance', 'id')")).scalar()
+
+
+def _create_indexes(connection) -> None:
+    connection.execute(text('CREATE INDEX ix_attendance_subject_marked ON attendance (subject_id, marked_at)'))
+    connection.execute(text('CREATE INDEX ix_attendance_qr_code ON attendance (qr_code_id)'))
+
+
+def partition_attendance(connection, months_ahead: int = 3) -> None:
+    """Rebuild `attendance` as a table range-partitioned by month on `marked_at`."""
+    sequence = _serial_sequence(connection)
+    connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY NONE'))
+    connection.execute(text(f"""
+        CREATE TABLE attendance_partitioned (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            student_id INTEGER NOT NULL,
+            subject_id INTEGER NOT NULL,
+            qr_code_id INTEGER NOT NULL,
+            marked_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            ip_address VARCHAR(45),
+            device_info VARCHAR(200),
+            CONSTRAINT attendance_pkey_partitioned PRIMARY KEY (id, marked_at),
+            {_FOREIGN_KEYS}
+        ) PARTITION BY RANGE (marked_at)
+    """))
+    connection.execute(text(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF attendance_partitioned DEFAULT'))
+
+    oldest = connection.execute(text('SELECT min(marked_at) FROM attendance')).scalar()
+    this_month = month_start(datetime.utcnow())
+    month, last = month_start(oldest or this_month), add_months(this_month, months_ahead)
+    while month <= last:
+        connection.execute(text(
+            f"CREATE TABLE {partition_name(month)} PARTITION OF attendance_partitioned "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+        month = add_months(month, 1)
+
+    connection.execute(text(
+        f"INSERT INTO attendance_partitioned ({_COLUMNS}) "
+        f"SELECT id, student_id, subject_id, qr_code_id, COALESCE(marked_at, now() AT TIME ZONE 'utc'), "
+        f"ip_address, device_info FROM attendance"
+    ))
+    connection.execute(text(
+        'CREATE TABLE attendance_mark ('
+        'student_id INTEGER NOT NULL, qr_code_id INTEGER NOT NULL, '
+        'PRIMARY KEY (student_id, qr_code_id))'
+    ))
+    connection.execute(text(
+        'INSERT INTO attendance_mark (student_id, qr_code_id) SELECT student_id, qr_code_id FROM attendance'
+    ))
+
+    connection.execute(text('DROP TABLE attendance'))
+    connection.execute(text('ALTER TABLE attendance_partitioned RENAME TO attendance'))
+    connection.execute(text('ALTER TABLE attendance RENAME CONSTRAINT attendance_pkey_partitioned TO attendance_pkey'))
+    connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY attendance.id'))
+    _create_indexes(connection)
+    connection.execute(text('CREATE INDEX ix_attendance_student_qr_code ON attendance (student_id, qr_code_id)'))
+
+    connection.execute(text(_DEDUPE_FUNCTION))
+    connection.execute(text(
+        'CREATE TRIGGER attendance_dedupe BEFORE INSERT OR DELETE ON attendance '
+        'FOR EACH ROW EXECUTE FUNCTION attendance_dedupe()'
+    ))
+
+
+def unpartition_attendance(connection) -> None:
+    """Rebuild `attendance` as a plain table from the attached partitions."""
+    sequence = _serial_sequence(connection)
+    connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY NONE'))
+    connection.execute(text(f"""
+        CREATE TABLE attendance_plain (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            student_id INTEGER NOT NULL,
+            subject_id INTEGER NOT NULL,
+            qr_code_id INTEGER NOT NULL,
+            marked_at TIMESTAMP WITHOUT TIME ZONE,
+            ip_address VARCHAR(45),
+            device_info VARCHAR(200),
+            CONSTRAINT attendance_pkey_plain PRIMARY KEY (id),
+            CONSTRAINT unique_attendance_plain UNIQUE (student_id, qr_code_id),
+            {_FOREIGN_KEYS}
+        )
+    """))
+    connection.execute(text(
+        f'INSERT INTO attendance_plain ({_COLUMNS}) SELECT {_COLUMNS} FROM attendance ORDER BY id '
+        f'ON CONFLICT DO NOTHING'
+    ))
+    connection.execute(text('DROP TABLE attendance'))
+    connection.execute(text('DROP TABLE attendance_mark'))
+    connection.execute(text('DROP FUNCTION attendance_dedupe()'))
+    connection.execute(text('ALTER TABLE attendance_plain RENAME TO attendance'))
+    connection.execute(text('ALTER TABLE attendance RENAME CONSTRAINT attendance_pkey_plain TO attendance_pkey'))
+    connection.execute(text('ALTER TABLE attendance RENAME CONSTRAINT unique_attendance_plain TO unique_attendance'))
+    connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY attendance.id'))
+    _create_indexes(connection)
+
+
+def init_app(app):
+    @app.cli.group('attendance-partitions')
+    def attendance_partitions():
+        """Manage monthly partitions of the attendance table."""
+
+    def _partitioned_connection():
+        connection = db.engine.connect()
+        if not is_partitioned(connection):
+            connection.close()
+            raise click.ClickException('The attendance table is not partitioned.')
+        return connection
+
+    @attendance_partitions.command('create')
+    @click.option('--months-ahead', default=3, show_default=True, help='Months past the current one to create.')
+    def create(months_ahead):
+        """Create monthly partitions up to MONTHS_AHEAD months from now."""
+        this_month = month_start(datetime.utcnow())
+        with _partitioned_connection() as connection:
+            created = create_partitions(connection, this_month, add_months(this_month, months_ahead))
+            connection.commit()
+        click.echo(f"Created {len(created)} partitions{': ' + ', '.join(created) if created else '.'}")
+
+    @attendance_partitions.command('detach')
+    @click.option('--keep-months', default=24, show_default=True, help='Months of history to keep attached.')
+    @click.option('--drop', is_flag=True, help='Drop detached partitions instead of keeping them as tables.')
+    def detach(keep_months, drop):
+        """Detach monthly partitions older than KEEP_MONTHS months."""
+        cutoff = add_months(month_start(datetime.utcnow()), -keep_months)
+        with _partitioned_connection() as connection:
+            detached = detach_partitions(connection, cutoff, drop=drop)
+            connection.commit()
+        click.echo(f"Detached {len(detached)} partitions{': ' + ', '.join(detached) if detached else '.'}")
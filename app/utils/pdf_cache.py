@@ -0,0 +1,191 @@
+"""Content-addressed on-disk cache for generated PDFs.
+
+A PDF is stored under the SHA-256 fingerprint of everything that goes into it
+(`fingerprint`), so an unchanged report is served from disk and a changed one
+simply gets a new key; nothing ever needs invalidating. The fingerprint doubles
+as the ETag, letting a browser that already has the file revalidate with a 304
+without the PDF being read at all.
+
+The directory is shared by all worker processes and bounded by `max_bytes`:
+reading an entry refreshes its mtime, and writes that push the total past the
+limit evict the least recently used files. The total lives in `SIZE_FILE` in the
+directory, and every write updates it under an exclusive flock on that file, so
+the bound holds across workers rather than per process. Eviction rescans the
+directory and stores the size it finds, which also corrects any drift.
+"""
+import hashlib
+import json
+import os
+import secrets
+from contextlib import contextmanager
+from threading import Lock
+
+from flask import current_app, request, send_file
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development servers run a single process
+    fcntl = None
+
+
+SIZE_FILE = '.size'
+
+
+class PdfCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Return the path of the cached PDF for `key`, or None."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def revalidate(self) -> None:
+        """Count a conditional request answered with 304 from the key alone."""
+        with self._lock:
+            self.revalidated += 1
+
+    def put(self, key: str, body: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{secrets.token_hex(4)}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            fh.write(body)
+        with self._size_file() as fh:
+            try:
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            size = _read_size(fh)
+            size = self._scan_size() if size is None else size + len(body) - replaced
+            if size > self.max_bytes:
+                size = self._evict(keep=path)
+            _write_size(fh, size)
+        return path
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.revalidated
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.revalidated) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    @contextmanager
+    def _size_file(self):
+        """Open SIZE_FILE holding the lock that every worker's writes take."""
+        with self._write_lock, open(os.path.join(self.directory, SIZE_FILE), 'a+', encoding='ascii') as fh:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            yield fh
+
+    def _entries(self):
+        try:
+            with os.scandir(self.directory) as it:
+                return [(e.stat().st_mtime, e.stat().st_size, e.path) for e in it if e.name.endswith('.pdf')]
+        except OSError:
+            return []
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self, keep: str) -> int:
+        """Remove least recently used files until the cache is back to 90% of its limit; return its size."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self.evictions += evicted
+        return total
+
+
+def _read_size(fh):
+    fh.seek(0)
+    try:
+        return int(fh.read())
+    except ValueError:
+        return None
+
+
+def _write_size(fh, size: int) -> None:
+    fh.seek(0)
+    fh.truncate()
+    fh.write(str(size))
+    fh.flush()
+
+
+def fingerprint(kind: str, *parts) -> str:
+    """SHA-256 over a PDF kind and every input that is rendered into it."""
+    data = json.dumps([kind, *parts], sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def pdf_response(key: str, render, download_name: str):
+    """Serve the PDF for `key`, calling `render()` (returning a BytesIO) only on a miss."""
+    cache = current_app.extensions['pdf_cache']
+    if key in request.if_none_match:
+        cache.revalidate()
+        path, state = None, 'REVALIDATED'
+    else:
+        path, state = cache.get(key), 'HIT'
+        if path is None:
+            path, state = cache.put(key, render().getvalue()), 'MISS'
+
+    if path is None:
+        response = current_app.response_class(status=304)
+        response.set_etag(key)
+    else:
+        response = send_file(path, mimetype='application/pdf', as_attachment=True, download_name=download_name,
+                             etag=key, conditional=False)
+    # Always revalidate: the key changes whenever the underlying data does
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.headers['X-Cache'] = state
+    return response
+
+
+def stats() -> dict:
+    return current_app.extensions['pdf_cache'].stats()
+
+
+def init_app(app):
+    cache = PdfCache(
+        app.config.get('PDF_CACHE_DIR') or os.path.join(app.instance_path, 'pdf-cache'),
+        max_bytes=app.config['PDF_CACHE_MAX_MB'] * 1024 * 1024,
+    )
+    app.extensions['pdf_cache'] = cache
+    return cache
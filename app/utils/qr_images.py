@@ -0,0 +1,87 @@
+"""QR payload encoding and rendering for attendance sessions.
+
+The QR carries a compact `a1.<subject_id>.<token>` string instead of the old JSON
+document, which keeps the code at a low QR version. Rendered images are kept in a
+process-local cache keyed by the SHA-256 of format and payload and served from
+`teacher.qr_image` with cache headers instead of being inlined as base64.
+`QR_IMAGE_FORMAT` selects the 'svg' or 'png' backend. The image cache belongs to
+the application, so apps sharing a process never serve each other's images.
+"""
+import hashlib
+import io
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from .cache import TTLCache, app_cache
+from .qr_rotation import PAYLOAD_PREFIX as ROTATING_PREFIX
+from .qr_tokens import MAX_TOKEN_SECONDS
+
+
+PAYLOAD_PREFIX = 'a1'
+FORMATS = {'svg': 'image/svg+xml', 'png': 'image/png'}
+
+RenderedQR = namedtuple('RenderedQR', ['digest', 'fmt', 'body', 'owner_id', 'expires_at'])
+
+
+def _images(app=None) -> TTLCache:
+    return app_cache('qr_images', lambda: TTLCache(ttl=MAX_TOKEN_SECONDS, maxsize=1024), app)
+
+
+def encode_payload(subject_id: int, token: str) -> str:
+    # token_urlsafe never contains '.', so the fields split unambiguously
+    return f'{PAYLOAD_PREFIX}.{subject_id}.{token}'
+
+
+def decode_payload(data: str):
+    """Return (token, subject_id) from a compact, rotating or legacy JSON payload.
+
+    Raises ValueError when the payload is in neither format.
+    """
+    data = (data or '').strip()
+    if data.startswith('{'):
+        legacy = json.loads(data)
+        return legacy.get('token'), int(legacy.get('subject_id'))
+    prefix, subject_id, token = data.split('.', 2)
+    if prefix == ROTATING_PREFIX:
+        # The whole payload is the token; qr_tokens.lookup verifies it
+        return data, int(subject_id)
+    if prefix != PAYLOAD_PREFIX or not token:
+        raise ValueError('Unknown QR payload version')
+    return token, int(subject_id)
+
+
+def digest(fmt: str, payload: str) -> str:
+    return hashlib.sha256(f'{fmt}:{payload}'.encode()).hexdigest()
+
+
+def render(payload: str, fmt: str) -> bytes:
+    # Imported on first use, with PIL behind it for PNG, to keep worker boot light
+    import qrcode
+    from qrcode.image.svg import SvgPathImage
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def cached(payload: str, fmt: str, owner_id: int, expires_at: datetime) -> RenderedQR:
+    """Render `payload` once and keep the image until the token expires."""
+    key = digest(fmt, payload)
+    images = _images()
+    image = images.get(key)
+    if image is None:
+        image = RenderedQR(key, fmt, render(payload, fmt), owner_id, expires_at)
+        remaining = (expires_at - datetime.utcnow()).total_seconds()
+        images.set(key, image, ttl=min(max(remaining, 1), MAX_TOKEN_SECONDS))
+    return image
+
+
+def lookup(key: str):
+    return _images().get(key)
@@ -0,0 +1,97 @@
+"""Stateless rotating tokens for one QR class session.
+
+A rotating session is a single QRCode row with `rotation_seconds` set. The QR
+shows `r1.<subject_id>.<qr_code_id>.<period>.<window>.<mac>`, where `window` is
+the number of whole periods since the epoch and `mac` is an HMAC over the other
+fields keyed with SECRET_KEY. A rotation writes no row. A token is accepted
+during its own window and the following one, to allow for scanning delay, and
+only while its session is active and unexpired (a rotating session expires when
+its class ends). The session row is read once and cached for up to
+`SESSION_TTL_SECONDS` per application, so most scans read nothing.
+"""
+import base64
+import hashlib
+import hmac
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from .. import db
+from ..models.models import QRCode
+from .cache import TTLCache, app_cache
+from .qr_tokens import ActiveToken
+
+
+PAYLOAD_PREFIX = 'r1'
+GRACE_WINDOWS = 1
+SESSION_TTL_SECONDS = 60
+
+_UNKNOWN = object()
+
+
+def _sessions(app=None) -> TTLCache:
+    return app_cache('qr_rotation', lambda: TTLCache(ttl=SESSION_TTL_SECONDS, maxsize=1024), app)
+
+
+def _session(qr_code_id: int):
+    """ActiveToken of an active rotating session, or None if it is gone or deactivated."""
+    sessions = _sessions()
+    entry = sessions.get(qr_code_id)
+    if entry is None:
+        row = db.session.query(
+            QRCode.id, QRCode.subject_id, QRCode.expires_at, QRCode.class_start_time, QRCode.class_end_time
+        ).filter(QRCode.id == qr_code_id, QRCode.is_active.is_(True), QRCode.rotation_seconds.isnot(None)).first()
+        entry = ActiveToken(*row) if row is not None else _UNKNOWN
+        sessions.set(qr_code_id, entry)
+    return None if entry is _UNKNOWN else entry
+
+
+def current_window(period: int, now: float = None) -> int:
+    return int((time.time() if now is None else now) // period)
+
+
+def _mac(subject_id: int, qr_code_id: int, period: int, window: int) -> str:
+    message = f'{subject_id}.{qr_code_id}.{period}.{window}'.encode()
+    digest = hmac.new(current_app.config['SECRET_KEY'].encode(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).rstrip(b'=').decode()
+
+
+def issue(qr_code, window: int = None) -> str:
+    """Return the payload for `qr_code` in `window` (the current one by default)."""
+    period = qr_code.rotation_seconds
+    if window is None:
+        window = current_window(period)
+    mac = _mac(qr_code.subject_id, qr_code.id, period, window)
+    return f'{PAYLOAD_PREFIX}.{qr_code.subject_id}.{qr_code.id}.{period}.{window}.{mac}'
+
+
+def window_end(period: int, window: int) -> datetime:
+    return datetime.utcfromtimestamp((window + 1) * period)
+
+
+def is_rotating(token: str) -> bool:
+    return token.startswith(PAYLOAD_PREFIX + '.')
+
+
+def verify(token: str):
+    """Return an ActiveToken for a genuine rotating token of an active session, or None.
+
+    A token past its grace window, or of a session that has ended, comes back with
+    a past `expires_at` so callers report it as expired. Class timings come from
+    the session.
+    """
+    try:
+        prefix, subject_id, qr_code_id, period, window, mac = token.split('.')
+        subject_id, qr_code_id, period, window = int(subject_id), int(qr_code_id), int(period), int(window)
+    except ValueError:
+        return None
+    if period <= 0 or not hmac.compare_digest(mac, _mac(subject_id, qr_code_id, period, window)):
+        return None
+    if window > current_window(period):
+        return None
+    session = _session(qr_code_id)
+    if session is None or session.subject_id != subject_id:
+        return None
+    expires_at = min(window_end(period, window + GRACE_WINDOWS), session.expires_at)
+    return session._replace(expires_at=expires_at)
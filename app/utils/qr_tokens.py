@@ -0,0 +1,92 @@
+"""Process-local registry of active QR tokens for the attendance scan path.
+
+Tokens are registered when generate_qr commits and evicted as soon as they expire.
+Expired and unknown tokens are remembered for a while so that repeated scans of a
+stale or forged QR are rejected without touching the database. Each application
+keeps its own registry, so apps on different databases never share tokens.
+"""
+from collections import namedtuple
+from datetime import datetime
+from threading import Lock
+
+from .. import db
+from ..models.models import QRCode
+from .cache import TTLCache, app_cache
+
+
+ActiveToken = namedtuple('ActiveToken', ['qr_code_id', 'subject_id', 'expires_at', 'class_start_time', 'class_end_time'])
+
+# generate_qr caps token lifetime at 2 hours
+MAX_TOKEN_SECONDS = 2 * 60 * 60
+REJECTED_TTL_SECONDS = 10 * 60
+MAX_ENTRIES = 10000
+
+_UNKNOWN = object()
+
+
+class _Registry:
+    """One application's active and rejected tokens, with lookup counters."""
+
+    def __init__(self):
+        self.rejected = TTLCache(ttl=REJECTED_TTL_SECONDS, maxsize=MAX_ENTRIES)
+        self.active = TTLCache(ttl=MAX_TOKEN_SECONDS, maxsize=MAX_ENTRIES, on_expire=self.rejected.set)
+        self.lock = Lock()
+        self.counts = {'hits': 0, 'misses': 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+
+def _registry(app=None) -> _Registry:
+    return app_cache('qr_tokens', _Registry, app)
+
+
+def remember(qr_code) -> ActiveToken:
+    """Register a freshly committed (or freshly loaded) QR code."""
+    entry = ActiveToken(qr_code.id, qr_code.subject_id, qr_code.expires_at,
+                        qr_code.class_start_time, qr_code.class_end_time)
+    registry = _registry()
+    remaining = (entry.expires_at - datetime.utcnow()).total_seconds()
+    if remaining > 0:
+        registry.active.set(qr_code.token, entry, ttl=min(remaining, MAX_TOKEN_SECONDS))
+    else:
+        registry.rejected.set(qr_code.token, entry)
+    return entry
+
+
+def lookup(token):
+    """Return the ActiveToken for `token`, falling back to the database on a miss.
+
+    Expired tokens are returned with their past `expires_at` so callers can report
+    them as expired; unknown tokens return None. Rotating session tokens are verified
+    from the token itself.
+    """
+    from . import qr_rotation
+    if qr_rotation.is_rotating(token):
+        return qr_rotation.verify(token)
+    
+    registry = _registry()
+    entry = registry.active.get(token)
+    if entry is None:
+        entry = registry.rejected.get(token)
+    if entry is not None:
+        registry.count('hits')
+        return None if entry is _UNKNOWN else entry
+
+    registry.count('misses')
+    qr_code = db.session.query(QRCode).filter_by(token=token, is_active=True).first()
+    if qr_code is None:
+        registry.rejected.set(token, _UNKNOWN)
+        return None
+    return remember(qr_code)
+
+
+def stats(app=None) -> dict:
+    registry = _registry(app)
+    with registry.lock:
+        counters = dict(registry.counts)
+    counters['evictions'] = registry.active.evictions
+    counters['active'] = len(registry.active)
+    counters['rejected'] = len(registry.rejected)
+    return counters
@@ -0,0 +1,147 @@
+"""Per-request SQL statement counting and N+1 detection.
+
+Engine events time every statement and record it, together with its shape (the
+SQL text with whitespace folded and IN lists of any length collapsed), into each
+collector active in the current context. A collector is opened for every
+request, and `capture` opens one around any block of code, which is what the
+pytest fixtures in `app.testing` use.
+
+Statements whose shape runs `REPEAT_THRESHOLD` times or more within one request
+are reported as likely N+1 patterns. With `QUERY_STATS` enabled each response
+carries the counts as headers; a summary is always logged at DEBUG level.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+REPEAT_THRESHOLD = 5
+
+_active = ContextVar('query_stats_collectors', default=())
+_placeholder = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+_in_list = re.compile(r'\(\s*' + _placeholder + r'(?:\s*,\s*' + _placeholder + r')*\s*\)')
+_spaces = re.compile(r'\s+')
+
+
+class QueryStats:
+    def __init__(self, keep_statements: bool = False):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        # (statement, parameters) as sent to the driver, when asked for
+        self.statements = [] if keep_statements else None
+
+    def record(self, statement: str, seconds: float, parameters=None) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[shape(statement)] += 1
+        if self.statements is not None:
+            self.statements.append((statement, parameters))
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD):
+        """(shape, count) for statements run at least `threshold` times, most frequent first."""
+        return [(s, n) for s, n in self.shapes.most_common() if n >= threshold]
+
+    def report(self) -> str:
+        lines = [f'{self.count} queries in {self.seconds * 1000:.1f} ms']
+        for statement, n in self.shapes.most_common():
+            lines.append(f'  {n:>4} x {statement[:200]}')
+        return '\n'.join(lines)
+
+
+def shape(statement: str) -> str:
+    return _in_list.sub('(?)', _spaces.sub(' ', statement).strip())
+
+
+@contextmanager
+def capture(keep_statements: bool = False):
+    """Collect the statements run inside the block into a QueryStats.
+
+    With `keep_statements` the QueryStats also lists every statement with its
+    driver parameters, ready to be run again, under EXPLAIN for instance.
+    """
+    stats = QueryStats(keep_statements)
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Fail with a per-shape report if the block runs more than `limit` statements."""
+    with capture() as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError(f'Expected at most {limit} queries, got {stats.report()}')
+
+
+def current():
+    """The QueryStats of the current request, or None outside one."""
+    return g.get('_query_stats')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get():
+        context._query_stats_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _active.get()
+    if not collectors:
+        return
+    started = getattr(context, '_query_stats_start', None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    for stats in collectors:
+        stats.record(statement, elapsed, parameters)
+
+
+def _start_request():
+    stats = QueryStats()
+    g._query_stats = stats
+    _active.set(_active.get() + (stats,))
+
+
+def _finish_request(response):
+    stats = g.get('_query_stats')
+    if stats is None:
+        return response
+
+    if logger.isEnabledFor(logging.DEBUG):
+        repeated = stats.repeated()
+        logger.debug('%s %s: %d queries, %.1f ms%s', request.method, request.path, stats.count,
+                     stats.seconds * 1000, f', {len(repeated)} repeated shapes (possible N+1)' if repeated else '')
+        for statement, n in repeated:
+            logger.debug('  %d x %s', n, statement[:200])
+    if current_app.config['QUERY_STATS']:
+        response.headers['X-DB-Query-Count'] = str(stats.count)
+        response.headers['X-DB-Query-Time-Ms'] = f'{stats.seconds * 1000:.1f}'
+        response.headers['X-DB-Repeated-Queries'] = str(sum(n for _, n in stats.repeated()))
+    return response
+
+
+def _end_request(exc):
+    # Runs even when the view raised, so a reused worker thread never keeps a stale collector.
+    # Streamed responses tear down after the view returned, so drop by identity, not by token.
+    stats = g.get('_query_stats')
+    if stats is not None:
+        _active.set(tuple(c for c in _active.get() if c is not stats))
+
+
+def init_app(app):
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
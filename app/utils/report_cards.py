@@ -0,0 +1,196 @@
+"""Batch report-card generation.
+
+A job renders the report card of every student in a cohort (a year/division, or
+everyone enrolled in a teacher's subjects) into one ZIP of PDFs. The cohort's
+students, results and attendance are loaded with a few bulk queries, then the
+cards are rendered in chunks across a process pool, since ReportLab rendering is
+CPU-bound and holds the GIL.
+
+Jobs run on a background thread of the worker process that accepted them, one at
+a time per process. Their state is kept in a small JSON file next to the ZIP, so
+any worker can answer the status endpoint.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+import zipfile
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .. import db
+from ..models.models import Enrollment, Result, Subject, User
+from . import counters
+from .results import generate_report_pdf, summarize_results
+
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Students per bulk query and per pool task
+QUERY_CHUNK = 500
+RENDER_CHUNK = 25
+JOB_TTL_SECONDS = 24 * 60 * 60
+
+CardStudent = namedtuple('CardStudent', ['id', 'name', 'registration_number'])
+Card = namedtuple('Card', ['filename', 'student', 'rows', 'total_marks', 'total_max_marks', 'overall_percentage',
+                           'overall_grade', 'attendance_percentage'])
+
+# One job at a time per process, so concurrent requests do not oversubscribe the cores
+_slots = threading.Semaphore(1)
+
+
+def cohort_students(teacher_id: int, year: int = None, division: str = None):
+    """Students in `year`/`division`, or enrolled in any of the teacher's subjects when not given."""
+    query = db.session.query(User.id, User.name, User.registration_number).filter(User.role == 'student')
+    if year is not None:
+        query = query.filter(User.year == year, User.division == division)
+    else:
+        enrolled = db.session.query(Enrollment.student_id).join(Subject, Subject.id == Enrollment.subject_id).\
+            filter(Subject.teacher_id == teacher_id)
+        query = query.filter(User.id.in_(enrolled))
+    return [CardStudent(*row) for row in query.order_by(User.registration_number, User.name, User.id)]
+
+
+def build_cards(students):
+    """Load results and attendance for `students` in bulk and return one Card each."""
+    results = defaultdict(list)
+    attendance = {}
+    for start in range(0, len(students), QUERY_CHUNK):
+        ids = [s.id for s in students[start:start + QUERY_CHUNK]]
+        for res, subj in db.session.query(Result, Subject).join(Subject, Result.subject_id == Subject.id).\
+                filter(Result.student_id.in_(ids)).order_by(Subject.name.asc(), Result.exam_type.asc()):
+            results[res.student_id].append((res, subj))
+        attendance.update(counters.overall_attendance(ids))
+
+    cards = []
+    for student in students:
+        held, attended = attendance.get(student.id, (0, 0))
+        cards.append(Card(
+            f"{student.registration_number or student.id}.pdf",
+            student,
+            *summarize_results(results[student.id]),
+            (attended / held * 100.0) if held > 0 else 0.0,
+        ))
+    return cards
+
+
+def _render_chunk(cards):
+    return [(card.filename, generate_report_pdf(*card[1:]).getvalue()) for card in cards]
+
+
+def render(cards, workers: int):
+    """Yield (filename, pdf bytes) for every card, rendering chunks on `workers` processes."""
+    chunks = [cards[i:i + RENDER_CHUNK] for i in range(0, len(cards), RENDER_CHUNK)]
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _render_chunk(chunk)
+        return
+    # Spawned, not forked: the web worker has threads and open database connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for future in as_completed([pool.submit(_render_chunk, chunk) for chunk in chunks]):
+            yield from future.result()
+
+
+class ReportCardJobs:
+    def __init__(self, app, job_dir: str, workers: int):
+        self.app = app
+        self.job_dir = job_dir
+        self.workers = workers or os.cpu_count() or 1
+
+    def start(self, teacher_id: int, year: int = None, division: str = None) -> str:
+        job_id = secrets.token_urlsafe(12)
+        folder = self._folder(teacher_id)
+        os.makedirs(folder, exist_ok=True)
+        _prune(folder)
+        self._write_state(teacher_id, job_id, state=QUEUED, total=0, done=0)
+        thread = threading.Thread(target=self._run, args=(teacher_id, job_id, year, division),
+                                  name=f'report-cards-{job_id}', daemon=True)
+        thread.start()
+        return job_id
+
+    def status(self, teacher_id: int, job_id: str):
+        """Return the job's state dict, or None if this teacher has no such job."""
+        if not _valid_id(job_id):
+            return None
+        try:
+            with open(self._path(teacher_id, job_id, 'json'), encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def archive_path(self, teacher_id: int, job_id: str):
+        state = self.status(teacher_id, job_id)
+        if state is None or state['state'] != DONE:
+            return None
+        return self._path(teacher_id, job_id, 'zip')
+
+    # ---------------------------------------------------------------- internal
+
+    def _run(self, teacher_id, job_id, year, division):
+        with _slots:
+            started = time.perf_counter()
+            try:
+                with self.app.app_context():
+                    try:
+                        cards = build_cards(cohort_students(teacher_id, year, division))
+                    finally:
+                        db.session.remove()
+                self._write_state(teacher_id, job_id, state=RUNNING, total=len(cards), done=0)
+
+                tmp_path = self._path(teacher_id, job_id, 'zip.tmp')
+                with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                    for done, (filename, pdf) in enumerate(render(cards, self.workers), 1):
+                        archive.writestr(filename, pdf)
+                        if done % RENDER_CHUNK == 0:
+                            self._write_state(teacher_id, job_id, state=RUNNING, total=len(cards), done=done)
+                os.replace(tmp_path, self._path(teacher_id, job_id, 'zip'))
+                self._write_state(teacher_id, job_id, state=DONE, total=len(cards), done=len(cards),
+                                  seconds=round(time.perf_counter() - started, 2))
+            except Exception:
+                logger.exception('Report card job %s failed', job_id)
+                self._write_state(teacher_id, job_id, state=FAILED, total=0, done=0)
+
+    def _folder(self, teacher_id):
+        return os.path.join(self.job_dir, str(teacher_id))
+
+    def _path(self, teacher_id, job_id, ext):
+        return os.path.join(self._folder(teacher_id), f'{job_id}.{ext}')
+
+    def _write_state(self, teacher_id, job_id, **state):
+        path = self._path(teacher_id, job_id, 'json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as fh:
+            json.dump(state, fh)
+        os.replace(path + '.tmp', path)
+
+
+def _valid_id(job_id: str) -> bool:
+    return 0 < len(job_id) <= 64 and all(c.isalnum() or c in '-_' for c in job_id)
+
+
+def _prune(folder: str) -> None:
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def init_app(app):
+    jobs = ReportCardJobs(
+        app,
+        job_dir=os.path.join(app.instance_path, 'report-cards'),
+        workers=app.config['REPORT_CARD_WORKERS'],
+    )
+    app.extensions['report_cards'] = jobs
+    return jobs
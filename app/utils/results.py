@@ -1,7 +1,3 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-from reportlab.lib import colors
 from io import BytesIO
 
 
@@ -23,7 +19,38 @@ def calculate_grade(percentage: float) -> str:
     return 'F'
 
 
+def summarize_results(results):
+    """Build report-card rows and totals from (Result, Subject) pairs.
+
+    Returns (rows, total_marks, total_max_marks, overall_percentage, overall_grade).
+    """
+    rows = []
+    total_marks = 0.0
+    total_max = 0.0
+    for res, subj in results:
+        pct = calculate_percentage(res.marks_obtained, res.max_marks)
+        rows.append({
+            'subject_name': subj.name,
+            'exam_type': res.exam_type,
+            'marks_obtained': res.marks_obtained,
+            'max_marks': res.max_marks,
+            'percentage': pct,
+            'remarks': res.remarks
+        })
+        total_marks += (res.marks_obtained or 0)
+        total_max += (res.max_marks or 0)
+
+    overall_percentage = calculate_percentage(total_marks, total_max)
+    return rows, total_marks, total_max, overall_percentage, calculate_grade(overall_percentage)
+
+
 def generate_report_pdf(student, subject_rows, total_marks, total_max_marks, overall_percentage, overall_grade, attendance_percentage: float) -> BytesIO:
+    # Imported on first use: ReportLab is heavy and most workers never render a PDF
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import inch
+    from reportlab.lib import colors
+
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
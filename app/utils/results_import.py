@@ -0,0 +1,198 @@
+"""Bulk import of exam results from an uploaded CSV.
+
+The upload is parsed as a stream and every row is validated in one pass. Subjects,
+students and existing results are then resolved with one bulk query each, and
+the valid rows are written with chunked multi-row INSERT ... ON CONFLICT DO UPDATE
+statements against `unique_result_per_exam`, all in one transaction, so an upload
+is either written in full or not at all. A later row for the same student, subject
+and exam replaces an earlier one. Rows that fail are collected into a CSV error
+report kept under the instance folder.
+"""
+import csv
+import io
+import os
+import re
+import secrets
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import or_
+
+from .. import db
+from ..models.models import Result, Subject, User
+from .attendance import dialect_insert
+
+
+CHUNK_ROWS = 500
+REPORT_TTL_SECONDS = 24 * 60 * 60
+REPORT_ID = re.compile(r'[A-Za-z0-9_-]{16,64}')
+REQUIRED_COLUMNS = {'student_id', 'exam_type', 'marks_obtained', 'max_marks', 'remarks'}
+
+ImportSummary = namedtuple('ImportSummary', ['processed', 'inserted', 'updated', 'errors', 'report_id'])
+
+_ParsedRow = namedtuple('_ParsedRow', ['line', 'raw', 'student_id', 'subject_id', 'subject_name', 'exam_type',
+                                       'marks_obtained', 'max_marks', 'remarks'])
+
+
+class ImportFileError(ValueError):
+    """The upload cannot be read as a results CSV at all."""
+
+
+def _parse(stream):
+    """Yield a _ParsedRow or an (line, raw, error) tuple for each data row."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    try:
+        columns = set(reader.fieldnames or [])
+    except UnicodeDecodeError:
+        raise ImportFileError('Invalid file format. Please upload a UTF-8 CSV.')
+    if not REQUIRED_COLUMNS.issubset(columns) or not columns & {'subject', 'subject_id'}:
+        raise ImportFileError('Missing required columns.')
+
+    try:
+        for line, row in enumerate(reader, start=2):
+            try:
+                subject_id = (row.get('subject_id') or '').strip()
+                subject_name = (row.get('subject') or '').strip()
+                exam_type = (row.get('exam_type') or '').strip()
+                if not exam_type:
+                    raise ValueError('exam_type is required')
+                if not subject_id and not subject_name:
+                    raise ValueError('subject or subject_id is required')
+                yield _ParsedRow(
+                    line, row,
+                    int(row.get('student_id')),
+                    int(subject_id) if subject_id else None,
+                    subject_name,
+                    exam_type,
+                    float(row.get('marks_obtained')),
+                    float(row.get('max_marks')),
+                    row.get('remarks'),
+                )
+            except (TypeError, ValueError) as e:
+                yield (line, row, str(e))
+    except UnicodeDecodeError:
+        raise ImportFileError('Invalid file format. Please upload a UTF-8 CSV.')
+
+
+def import_results(stream, teacher_id: int, report_dir: str) -> ImportSummary:
+    """Validate and upsert every row of a results CSV for `teacher_id`'s subjects.
+
+    Raises ImportFileError if the header is unusable. Row-level problems never abort
+    the import; they are counted and written to a report under `report_dir`. A
+    database error rolls back every chunk and is re-raised.
+    """
+    parsed, errors = [], []
+    for item in _parse(stream):
+        if isinstance(item, _ParsedRow):
+            parsed.append(item)
+        else:
+            errors.append(item)
+    processed = len(parsed) + len(errors)
+
+    # Subjects named by id (any teacher, to tell "not yours" from "not found") or by name (own only)
+    ids = {p.subject_id for p in parsed if p.subject_id is not None}
+    names = {p.subject_name for p in parsed if p.subject_id is None}
+    subjects_by_id, subjects_by_name = {}, {}
+    if ids or names:
+        for subject in db.session.query(Subject.id, Subject.name, Subject.teacher_id).filter(or_(
+                Subject.id.in_(ids),
+                (Subject.teacher_id == teacher_id) & Subject.name.in_(names))):
+            subjects_by_id[subject.id] = subject
+            if subject.teacher_id == teacher_id:
+                subjects_by_name.setdefault(subject.name, subject)
+
+    # Chunked to stay under the bound-parameter limit of older SQLite builds
+    student_ids = sorted({p.student_id for p in parsed})
+    students = set()
+    for start in range(0, len(student_ids), CHUNK_ROWS):
+        students.update(sid for (sid,) in db.session.query(User.id).filter(
+            User.id.in_(student_ids[start:start + CHUNK_ROWS]), User.role == 'student'))
+
+    rows = {}
+    for p in parsed:
+        subject = subjects_by_id.get(p.subject_id) if p.subject_id is not None else subjects_by_name.get(p.subject_name)
+        if subject is None:
+            errors.append((p.line, p.raw, 'Subject not found.'))
+            continue
+        if subject.teacher_id != teacher_id:
+            errors.append((p.line, p.raw, 'You do not teach this subject.'))
+            continue
+        if p.student_id not in students:
+            errors.append((p.line, p.raw, 'Student not found.'))
+            continue
+        # Last one wins, as if the rows had been uploaded one after another
+        rows[(p.student_id, subject.id, p.exam_type)] = p
+
+    existing = set()
+    if rows:
+        existing = {tuple(r) for r in db.session.query(Result.student_id, Result.subject_id, Result.exam_type).filter(
+            Result.subject_id.in_({k[1] for k in rows}),
+            Result.exam_type.in_({k[2] for k in rows}))}
+
+    now = datetime.utcnow()
+    values = [{
+        'student_id': key[0],
+        'subject_id': key[1],
+        'exam_type': key[2],
+        'marks_obtained': p.marks_obtained,
+        'max_marks': p.max_marks,
+        'remarks': p.remarks,
+        'created_at': now,
+        'updated_at': now,
+    } for key, p in rows.items()]
+    table = Result.__table__
+    try:
+        for start in range(0, len(values), CHUNK_ROWS):
+            stmt = dialect_insert(table).values(values[start:start + CHUNK_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['student_id', 'subject_id', 'exam_type'],
+                set_={
+                    'marks_obtained': stmt.excluded.marks_obtained,
+                    'max_marks': stmt.excluded.max_marks,
+                    'remarks': stmt.excluded.remarks,
+                    'updated_at': stmt.excluded.updated_at,
+                },
+            )
+            db.session.execute(stmt)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Keys that already had a result count as updates, the rest were inserted
+    updated = len(existing & rows.keys())
+    report_id = _write_report(report_dir, sorted(errors, key=lambda e: e[0])) if errors else None
+    return ImportSummary(processed, len(rows) - updated, updated, len(errors), report_id)
+
+
+def _write_report(report_dir: str, errors) -> str:
+    os.makedirs(report_dir, exist_ok=True)
+    _prune(report_dir)
+    report_id = secrets.token_urlsafe(16)
+    columns = ['row', 'error'] + sorted({k for _, raw, _ in errors for k in raw if k is not None})
+    with open(report_path(report_dir, report_id), 'w', encoding='utf-8', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for line, raw, error in errors:
+            writer.writerow([line, error] + [raw.get(c, '') for c in columns[2:]])
+    return report_id
+
+
+def report_path(report_dir: str, report_id: str) -> str:
+    return os.path.join(report_dir, f'{report_id}.csv')
+
+
+def has_report(report_dir: str, report_id: str) -> bool:
+    return bool(REPORT_ID.fullmatch(report_id)) and os.path.exists(report_path(report_dir, report_id))
+
+
+def _prune(report_dir: str) -> None:
+    cutoff = time.time() - REPORT_TTL_SECONDS
+    for name in os.listdir(report_dir):
+        path = os.path.join(report_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,125 @@
+"""SQLite tuning for running the app on a SQLite file under several workers.
+
+With `DB_POOL_PROFILE=sqlite` every new connection switches the database to WAL
+and sets `busy_timeout`, `synchronous=NORMAL`, `cache_size` and `mmap_size`, so
+readers never block behind a writer.
+
+WAL still allows one writer at a time, and a deferred transaction that has read
+is upgraded on its first write; the upgrade fails at once with "database is
+locked" when another worker committed since that read, and the busy timeout does
+not help. So reads run outside a transaction, each on its own snapshot, and the
+first write of a session takes the writer lane (a lock plus an `flock` on a file
+next to the database, which queues writers from every worker process) and then
+starts a `BEGIN IMMEDIATE` transaction. The lane is taken when the session
+flushes or executes an INSERT, UPDATE or DELETE, and released as soon as that
+transaction commits or rolls back, so requests that only read never wait for it.
+"""
+import os
+import threading
+
+from sqlalchemy import event
+
+from .. import db
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development servers run a single process
+    fcntl = None
+
+
+class WriterLane:
+    """One writer at a time across the threads and processes sharing a database file.
+
+    Not reentrant, and any thread may release it: a session's transaction can end
+    on another thread than the one that wrote.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def acquire(self) -> None:
+        self._lock.acquire()
+        if fcntl is not None:
+            self._flock(fcntl.LOCK_EX)
+
+    def release(self) -> None:
+        if fcntl is not None:
+            self._flock(fcntl.LOCK_UN)
+        self._lock.release()
+
+    def _flock(self, operation):
+        # A forked worker needs its own open file, or it would share the parent's lock
+        if self._pid != os.getpid():
+            self._file = open(self.path, 'a')
+            self._pid = os.getpid()
+        fcntl.flock(self._file, operation)
+
+
+def _is_write(statement: str) -> bool:
+    return not statement.lstrip()[:7].upper().startswith(('SELECT', 'PRAGMA', 'EXPLAIN'))
+
+
+def init_app(app):
+    if app.config['DB_POOL_PROFILE'] != 'sqlite':
+        return None
+    with app.app_context():
+        engine = db.engine
+    lane = WriterLane(engine.url.database + '-writer.lock')
+    pragmas = (
+        f"PRAGMA busy_timeout = {app.config['SQLITE_BUSY_TIMEOUT_MS']}",
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        f"PRAGMA cache_size = -{app.config['SQLITE_CACHE_MB'] * 1024}",
+        f"PRAGMA mmap_size = {app.config['SQLITE_MMAP_MB'] * 1024 * 1024}",
+    )
+
+    @event.listens_for(engine, 'connect')
+    def _connect(dbapi_connection, connection_record):
+        # Transactions are begun below instead of by pysqlite
+        dbapi_connection.isolation_level = None
+        for pragma in pragmas:
+            dbapi_connection.execute(pragma)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        # Run on the driver connection so the BEGIN is not counted as a query
+        if not connection.info.get('immediate') and _is_write(statement):
+            connection.connection.driver_connection.execute('BEGIN IMMEDIATE')
+            connection.info['immediate'] = True
+
+    @event.listens_for(engine, 'commit')
+    @event.listens_for(engine, 'rollback')
+    def _end(connection):
+        connection.info.pop('immediate', None)
+
+    @event.listens_for(engine, 'checkin')
+    def _checkin(dbapi_connection, connection_record):
+        # The pool rolls back an unfinished transaction without a rollback event
+        connection_record.info.pop('immediate', None)
+
+    def _take_lane(session):
+        # The listeners are on the shared session class, so skip other applications' sessions
+        if 'writer_lane' not in session.info and session.get_bind() is engine:
+            lane.acquire()
+            session.info['writer_lane'] = lane
+
+    @event.listens_for(db.session, 'before_flush')
+    def _before_flush(session, flush_context, instances):
+        _take_lane(session)
+
+    @event.listens_for(db.session, 'do_orm_execute')
+    def _do_orm_execute(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            _take_lane(orm_execute_state.session)
+
+    @event.listens_for(db.session, 'after_transaction_end')
+    def _after_transaction_end(session, transaction):
+        if transaction.parent is None and session.info.get('writer_lane') is lane:
+            del session.info['writer_lane']
+            lane.release()
+
+    app.extensions['sqlite_writer_lane'] = lane
+    return lane
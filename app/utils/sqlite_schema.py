@@ -0,0 +1,48 @@
+"""Bring an existing SQLite database up to the models at startup.
+
+On SQLite the schema is kept by `db.create_all()`, which creates missing tables
+but never alters the ones that exist. A database created before a column or an
+index was added to a model then fails every query that loads it ("no such
+column: qr_code.rotation_seconds"). `add_missing` adds such columns, when they
+are nullable or carry a scalar default, and such indexes. Anything else, such
+as a new NOT NULL column or unique constraint, still needs a migration.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing(engine, metadata) -> list:
+    """Add the model columns and indexes missing from existing tables; return what was added."""
+    added = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    logger.warning('%s.%s is missing and NOT NULL; run the migrations to add it',
+                                   table.name, column.name)
+                    continue
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+                added.append(f'{table.name}.{column.name}')
+            # Read from sqlite_master: reflection leaves out expression indexes such as lower(email)
+            indexes = set(connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"
+            ), {'table': table.name}).scalars())
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    added.append(index.name)
+    if added:
+        logger.info('Added to the SQLite schema: %s', ', '.join(added))
+    return added
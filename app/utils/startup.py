@@ -0,0 +1,35 @@
+"""Wall-clock breakdown of application startup.
+
+`create_app` marks the end of each phase; the breakdown is logged at INFO level
+on `app.utils.startup` and kept in `app.extensions['startup']`, where the
+benchmark suite's startup scenario reads it. The first app created in a process
+also reports the time spent importing the `app` package and its dependencies.
+"""
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    def __init__(self, started: float = None):
+        self.started = self._last = time.perf_counter() if started is None else started
+        self.phases = []
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self) -> dict:
+        return {
+            'total_ms': round((self._last - self.started) * 1000, 2),
+            'phases_ms': {phase: round(seconds * 1000, 2) for phase, seconds in self.phases},
+        }
+
+    def log(self) -> dict:
+        report = self.report()
+        logger.info('Application started in %.0f ms (%s)', report['total_ms'],
+                    ', '.join(f'{phase} {ms:.0f}' for phase, ms in report['phases_ms'].items()))
+        return report
@@ -0,0 +1,86 @@
+"""Per-subject figures for the teacher dashboard, and its cached subject grid.
+
+For each of a teacher's subjects the dashboard shows the students enrolled, the
+sessions held, today's scans and the pending leave applications. All of them
+come from one query: counts grouped by subject (restricted to the teacher's
+subjects) outer-joined onto Subject together with the materialized session
+counter, so no Enrollment rows are loaded.
+
+The rendered subject cards and quick statistics are cached per application and
+teacher for `CACHE_TTL_SECONDS`. Writes that change a teacher's figures call `invalidate`;
+scans change them too often for that and show up when the entry expires, as do
+writes made in other worker processes.
+"""
+from collections import namedtuple
+from datetime import datetime, time
+
+from flask import render_template
+from markupsafe import Markup
+from sqlalchemy import func, select
+
+from .. import db
+from ..models.models import Attendance, Enrollment, LeaveApplication, Subject, SubjectSessionCount
+from .cache import TTLCache, app_cache
+
+
+CACHE_TTL_SECONDS = 15
+
+SubjectSummary = namedtuple('SubjectSummary', ['id', 'name', 'year', 'division', 'enrolled', 'sessions_held',
+                                               'attended_today', 'pending_leaves'])
+
+
+def _fragments(app=None) -> TTLCache:
+    return app_cache('teacher_dashboard', lambda: TTLCache(ttl=CACHE_TTL_SECONDS, maxsize=1024), app)
+
+
+def subject_summaries(teacher_id: int) -> list:
+    """The teacher's subjects with their counts, in creation order."""
+    teacher_subjects = select(Subject.id).where(Subject.teacher_id == teacher_id).correlate(None)
+    today = datetime.combine(datetime.utcnow().date(), time.min)
+
+    def counts(subject_id, *criteria):
+        return db.session.query(
+            subject_id.label('subject_id'), func.count().label('n')
+        ).filter(subject_id.in_(teacher_subjects), *criteria).group_by(subject_id).subquery()
+
+    enrolled = counts(Enrollment.subject_id)
+    attended_today = counts(Attendance.subject_id, Attendance.marked_at >= today)
+    pending = counts(LeaveApplication.subject_id, LeaveApplication.status == 'pending')
+
+    rows = db.session.query(
+        Subject.id, Subject.name, Subject.year, Subject.division,
+        func.coalesce(enrolled.c.n, 0),
+        func.coalesce(SubjectSessionCount.sessions_held, 0),
+        func.coalesce(attended_today.c.n, 0),
+        func.coalesce(pending.c.n, 0),
+    ).outerjoin(
+        enrolled, enrolled.c.subject_id == Subject.id
+    ).outerjoin(
+        SubjectSessionCount, SubjectSessionCount.subject_id == Subject.id
+    ).outerjoin(
+        attended_today, attended_today.c.subject_id == Subject.id
+    ).outerjoin(
+        pending, pending.c.subject_id == Subject.id
+    ).filter(
+        Subject.teacher_id == teacher_id
+    ).order_by(Subject.id.asc()).all()
+    return [SubjectSummary(*row) for row in rows]
+
+
+def subject_grid(teacher_id: int) -> Markup:
+    """The rendered subject cards and quick statistics, from the cache when fresh."""
+    fragments = _fragments()
+    cached = fragments.get(teacher_id)
+    if cached is not None:
+        return cached
+    fragment = Markup(render_template('teacher/dashboard_subjects.html', subjects=subject_summaries(teacher_id)))
+    fragments.set(teacher_id, fragment)
+    return fragment
+
+
+def invalidate(teacher_id: int) -> None:
+    _fragments().pop(teacher_id)
+
+
+def stats(app=None) -> dict:
+    return _fragments(app).stats()
@@ -0,0 +1,88 @@
+"""Portable day/week/month bucketing on raw timestamp columns.
+
+Bucket boundaries are computed in Python and turned into half-open range
+predicates (`start <= column < end`) plus a CASE expression that numbers the
+bucket, so the timestamp column is never wrapped in a function. That keeps the
+predicates index-friendly and avoids dialect-specific helpers such as PostgreSQL's
+`date_trunc`, which SQLite does not have.
+"""
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, case, func, literal, select, union_all
+
+
+Bucket = namedtuple('Bucket', ['label', 'start', 'end'])
+
+
+def _at_midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def day_range(day: date):
+    """Return the half-open [start, end) datetime range covering one calendar day."""
+    start = _at_midnight(day)
+    return start, start + timedelta(days=1)
+
+
+def day_buckets(today: date, count: int) -> list:
+    days = [today - timedelta(days=i) for i in range(count - 1, -1, -1)]
+    return [Bucket(d.strftime('%Y-%m-%d'), *day_range(d)) for d in days]
+
+
+def week_buckets(today: date, count: int) -> list:
+    """Monday-based weeks, the last one containing `today`."""
+    this_week = today - timedelta(days=today.weekday())
+    weeks = [this_week - timedelta(weeks=i) for i in range(count - 1, -1, -1)]
+    return [Bucket(w.strftime('%Y-%m-%d'), _at_midnight(w), _at_midnight(w + timedelta(days=7))) for w in weeks]
+
+
+def month_buckets(today: date, count: int) -> list:
+    """Calendar months, the last one containing `today`."""
+    months = []
+    y, m = today.year, today.month
+    for _ in range(count):
+        months.append((y, m))
+        m -= 1
+        if m == 0:
+            y, m = y - 1, 12
+    buckets = []
+    for y, m in reversed(months):
+        start = datetime(y, m, 1)
+        end = datetime(y + 1, 1, 1) if m == 12 else datetime(y, m + 1, 1)
+        buckets.append(Bucket(start.strftime('%Y-%m'), start, end))
+    return buckets
+
+
+def in_range(column, start: datetime, end: datetime):
+    return and_(column >= start, column < end)
+
+
+def bucket_index(column, buckets):
+    """CASE expression numbering the bucket a timestamp falls into (0-based).
+
+    Rows must already be restricted to [buckets[0].start, buckets[-1].end).
+    """
+    return case(*[(column < b.end, i) for i, b in enumerate(buckets[:-1])], else_=len(buckets) - 1)
+
+
+def bucket_counts(buckets, sessions, attendance):
+    """Build one UNION ALL query counting sessions and attendance per bucket and subject.
+
+    `sessions` and `attendance` are (timestamp_column, subject_column, id_column,
+    extra_filter) tuples. Result rows are (kind, bucket, subject_id, count) where
+    kind is 's' for sessions and 'a' for attendance.
+    """
+    lo, hi = buckets[0].start, buckets[-1].end
+    parts = []
+    for kind, (ts_col, subject_col, id_col, where) in (('s', sessions), ('a', attendance)):
+        inner = select(
+            bucket_index(ts_col, buckets).label('bucket'),
+            subject_col.label('subject_id'),
+            id_col.label('row_id'),
+        ).where(in_range(ts_col, lo, hi), where).subquery()
+        parts.append(
+            select(literal(kind).label('kind'), inner.c.bucket, inner.c.subject_id, func.count(inner.c.row_id))
+            .group_by(inner.c.bucket, inner.c.subject_id)
+        )
+    return union_all(*parts)
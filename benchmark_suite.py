@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Run the benchmarks in the `benchmarks` package.
+
+    python benchmark_suite.py [options]          the end-to-end scenario suite
+    python benchmark_suite.py <name> [options]   one focused benchmark, e.g. `qr` or `db_pool`
+    python benchmark_suite.py --list             the benchmarks available
+
+`python benchmark_suite.py <name> --help` lists a benchmark's options.
+"""
+
+import sys
+
+from benchmarks import main
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,56 @@
+"""Benchmarks and load tests, run through `benchmark_suite.py` at the repository root.
+
+`suite` is the end-to-end scenario suite; every other module is a focused
+benchmark of one subsystem with its own options:
+
+    python benchmark_suite.py [--scenario NAME ...]    the scenario suite
+    python benchmark_suite.py qr --runs 500            one focused benchmark
+    python benchmark_suite.py --list                   what is available
+
+Each module also runs on its own with `python -m benchmarks.<name>`.
+"""
+import argparse
+import importlib
+import os
+
+# Focused benchmarks by the name they are run under
+BENCHMARKS = (
+    'counters',
+    'db_pool',
+    'export',
+    'live_feed',
+    'metrics',
+    'partitions',
+    'qr',
+    'report_cards',
+    'results_import',
+    'sqlite_scans',
+    'teacher_dashboard',
+    'view_attendance',
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parser(module_file: str, doc: str) -> argparse.ArgumentParser:
+    """Argument parser for a benchmark module, named as benchmark_suite.py invokes it."""
+    name = os.path.splitext(os.path.basename(module_file))[0]
+    prog = 'benchmark_suite.py' if name == 'suite' else f'benchmark_suite.py {name}'
+    return argparse.ArgumentParser(prog=prog, description=doc.strip().splitlines()[0])
+
+
+def summaries() -> dict:
+    """{name: first docstring line} of every focused benchmark."""
+    return {name: importlib.import_module(f'{__name__}.{name}').__doc__.strip().splitlines()[0]
+            for name in BENCHMARKS}
+
+
+def main(argv) -> int:
+    if argv and argv[0] in BENCHMARKS:
+        return importlib.import_module(f'{__name__}.{argv[0]}').main(argv[1:])
+    from . import suite
+    if argv and argv[0] == '--list':
+        for name, summary in {'(default)': suite.__doc__.strip().splitlines()[0], **summaries()}.items():
+            print(f'{name:<18} {summary}')
+        return 0
+    return suite.main(argv)
@@ -0,0 +1,155 @@
+"""
+Benchmark attendance percentage lookups against growing attendance history.
+
+Seeds a scratch SQLite database with STUDENTS students enrolled in SUBJECTS
+subjects, then adds sessions (80% of the class present) until attendance reaches
+each requested size, one million rows by default. At each size it times one
+student's per-subject percentages, as the attendance page, chatbot and results
+views need them:
+
+    history     counting the student's qr_code and attendance rows per enrollment,
+                as those views did before the counters
+    counters    counters.student_subjects, reading the materialized counters
+
+and reports the median and p99 time and the SQL statements per lookup.
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import benchmarks
+
+STUDENTS = 500
+SUBJECTS = 8
+ATTENDANCE_RATE = 0.8
+INSERT_CHUNK = 50000
+
+
+def seed_people(app):
+    from app import db
+    from app.models.models import Enrollment, Subject, User
+
+    with app.app_context():
+        teacher = User(email='counter-teacher@example.com', name='Counter Teacher', role='teacher', password_hash='x')
+        db.session.add(teacher)
+        db.session.flush()
+        subjects = [Subject(name=f'Subject {n}', year=1, division='A', teacher_id=teacher.id) for n in range(SUBJECTS)]
+        db.session.add_all(subjects)
+        db.session.flush()
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'counter{i}@example.com', 'registration_number': f'C{i:05d}', 'name': f'Student {i}',
+             'password_hash': 'x', 'role': 'student', 'year': 1, 'division': 'A'} for i in range(STUDENTS)])
+        student_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == 'student')]
+        db.session.execute(Enrollment.__table__.insert(), [
+            {'student_id': sid, 'subject_id': s.id, 'roll_number': i + 1}
+            for s in subjects for i, sid in enumerate(student_ids)])
+        db.session.commit()
+        return student_ids, [s.id for s in subjects]
+
+
+def grow(app, student_ids, subject_ids, target, rng):
+    """Add sessions round-robin over the subjects until attendance holds `target` rows"""
+    from app import db
+    from app.models.models import Attendance, QRCode
+    from app.utils import counters
+
+    with app.app_context():
+        count = db.session.query(Attendance.id).count()
+        sessions = db.session.query(QRCode.id).count()
+        rows = []
+        while count + len(rows) < target:
+            subject_id = subject_ids[sessions % len(subject_ids)]
+            start = datetime(2020, 1, 1) + timedelta(hours=sessions)
+            session_row = QRCode(subject_id=subject_id, token=f'counter-{sessions}', created_at=start,
+                                 expires_at=start + timedelta(minutes=10), is_active=False,
+                                 class_start_time=start, class_end_time=start + timedelta(hours=1))
+            db.session.add(session_row)
+            db.session.flush()
+            sessions += 1
+            rows += [{'student_id': sid, 'subject_id': subject_id, 'qr_code_id': session_row.id, 'marked_at': start}
+                     for sid in student_ids if rng.random() < ATTENDANCE_RATE]
+            if len(rows) >= INSERT_CHUNK:
+                db.session.execute(Attendance.__table__.insert(), rows)
+                count += len(rows)
+                rows = []
+        if rows:
+            db.session.execute(Attendance.__table__.insert(), rows)
+            count += len(rows)
+        counters.rebuild()
+        db.session.commit()
+        return count
+
+
+def _history(student_id):
+    """Per-subject (held, attended) the way the views computed it before the counters"""
+    from app.models.models import Attendance, Enrollment, QRCode
+
+    result = []
+    for enrollment in Enrollment.query.filter_by(student_id=student_id).all():
+        held = len(QRCode.query.filter_by(subject_id=enrollment.subject_id).all())
+        attended = len(Attendance.query.filter_by(student_id=student_id, subject_id=enrollment.subject_id).all())
+        result.append((held, attended))
+    return result
+
+
+def _counters(student_id):
+    from app.utils import counters
+
+    return [(row.sessions_held, row.sessions_attended) for row in counters.student_subjects(student_id)]
+
+
+def run_benchmark(sizes, lookups, seed):
+    workdir = tempfile.mkdtemp(prefix='counters-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'counters.db')
+    os.environ['METRICS_ENABLED'] = 'false'
+    from app import create_app, db
+    from app.utils import query_stats
+
+    app = create_app()
+    rng = random.Random(seed)
+    student_ids, subject_ids = seed_people(app)
+    failures = 0
+    print("🔢 Attendance percentage lookups")
+    print("=" * 64)
+    print(f"{'rows':>9} {'variant':<9} {'median ms':>10} {'p99 ms':>9} {'statements':>11}")
+    for target in sizes:
+        print(f"⏳ Growing attendance to {target} rows", end='\r')
+        rows = grow(app, student_ids, subject_ids, target, rng)
+        sample = [rng.choice(student_ids) for _ in range(lookups)]
+        answers = {}
+        for name, lookup in (('history', _history), ('counters', _counters)):
+            timings = []
+            answers[name] = []
+            for student_id in sample:
+                with app.app_context():
+                    with query_stats.capture() as stats:
+                        started = time.perf_counter()
+                        answers[name].append(lookup(student_id))
+                        timings.append(time.perf_counter() - started)
+                    db.session.remove()
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            print(f"{rows:>9} {name:<9} {statistics.median(timings) * 1000:>10.2f} {p99 * 1000:>9.2f} "
+                  f"{stats.count:>11}")
+        if answers['history'] != answers['counters']:
+            failures += 1
+            print(f"❌ The counters disagree with the history at {rows} rows")
+    return 1 if failures else 0
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma-separated attendance row counts')
+    parser.add_argument('--lookups', type=int, default=50, help='students looked up at each size')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    return run_benchmark([int(n) for n in args.sizes.split(',')], args.lookups, args.seed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
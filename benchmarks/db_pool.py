@@ -0,0 +1,172 @@
+"""
+Load test the database connection pool at a multiple of the deployed concurrency.
+
+Sizes the pool for WORKERS worker processes of THREADS threads each under every
+profile given, then starts those worker processes with FACTOR times as many
+threads (4x by default). Each thread runs REQUESTS simulated requests that hold a
+connection for HOLD_MS, as a request does from its first query to teardown.
+Reports the peak connections opened against the profile's budget, checkout
+waits and pool timeouts; the run fails if any profile with a budget exceeds it
+or a checkout times out. Runs on a scratch SQLite database unless --database
+is given; on PostgreSQL the peak is also read from pg_stat_activity.
+"""
+
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import benchmarks
+
+
+def _environment(database_url, profile, workers, threads):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['DB_POOL_PROFILE'] = profile
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+    os.environ['WEB_THREADS'] = str(threads)
+    os.environ['DB_APPLICATION_NAME'] = f'pool-load-test-{profile}'
+    os.environ['METRICS_ENABLED'] = 'false'
+
+
+def worker(database_url, profile, workers, threads, load_threads, requests, hold_ms, start, results):
+    """One simulated gunicorn worker: `load_threads` threads sharing the app's pool"""
+    _environment(database_url, profile, workers, threads)
+    from sqlalchemy import exc, text
+    from app import create_app, db
+
+    app = create_app()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def serve():
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                with app.app_context():
+                    db.session.execute(text('SELECT 1'))
+                    time.sleep(hold_ms / 1000)
+                    db.session.remove()
+            except (exc.TimeoutError, exc.OperationalError) as e:
+                with lock:
+                    errors.append(type(e).__name__)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    pool_threads = [threading.Thread(target=serve) for _ in range(load_threads)]
+    start.wait()
+    for thread in pool_threads:
+        thread.start()
+    for thread in pool_threads:
+        thread.join()
+    results.put({'latencies': latencies, 'errors': errors, 'pool': app.extensions['db_pool'].stats()})
+
+
+def _server_connections(database_url, application_name, stop, peak):
+    """Poll pg_stat_activity for the test's connections until `stop` is set"""
+    from sqlalchemy import create_engine, text
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        while not stop.is_set():
+            count = connection.execute(
+                text('SELECT count(*) FROM pg_stat_activity WHERE application_name = :name'),
+                {'name': application_name}).scalar()
+            peak[0] = max(peak[0], count)
+            connection.rollback()
+            time.sleep(0.05)
+    engine.dispose()
+
+
+def run_profile(database_url, profile, workers, threads, factor, requests, hold_ms):
+    _environment(database_url, profile, workers, threads)
+    from app import create_app
+
+    # Create the schema once, before the workers start at the same moment
+    app = create_app()
+    plan = app.extensions['db_pool'].plan
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(database_url, profile, workers, threads, threads * factor,
+                                                      requests, hold_ms, start, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    server_peak = [0]
+    stop = threading.Event()
+    poller = None
+    if database_url.startswith('postgresql'):
+        poller = threading.Thread(target=_server_connections,
+                                  args=(database_url, f'pool-load-test-{profile}', stop, server_peak))
+        poller.start()
+
+    time.sleep(2)  # let every worker import the app before the burst
+    started = time.perf_counter()
+    start.set()
+    reports = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    stop.set()
+    if poller is not None:
+        poller.join()
+
+    latencies = sorted(latency for report in reports for latency in report['latencies'])
+    errors = [error for report in reports for error in report['errors']]
+    pools = [report['pool'] for report in reports]
+    peak = sum(pool['peak_checked_out'] for pool in pools)
+    checkouts = sum(pool['checkouts'] for pool in pools)
+    budget = plan['max_connections']
+    over_budget = budget is not None and max(peak, server_peak[0]) > budget
+    timeouts = sum(pool['timeouts'] for pool in pools)
+
+    print(f"\n🔌 Profile {profile}: {workers} workers x {threads * factor} threads "
+          f"({factor}x {threads}), pool {plan['pool_size']} + {plan['max_overflow']} per worker")
+    print("-" * 60)
+    print(f"requests:              {len(latencies)} ok, {len(errors)} failed in {elapsed:.1f}s")
+    print(f"peak connections:      {peak} checked out (sum of worker peaks)"
+          + (f", {server_peak[0]} in pg_stat_activity" if poller is not None else ""))
+    print(f"connection budget:     {budget if budget is not None else 'none (library defaults)'}")
+    print(f"checkout wait:         mean {sum(p['wait_seconds'] for p in pools) / max(checkouts, 1) * 1000:.1f} ms, "
+          f"max {max(p['max_wait_seconds'] for p in pools) * 1000:.1f} ms, {timeouts} timeouts "
+          f"(pool_timeout {plan['pool_timeout']}s)")
+    if latencies:
+        print(f"request p50 / p99:     {statistics.median(latencies) * 1000:.1f} / "
+              f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    exhausted = over_budget or timeouts or errors
+    print(("❌ pool exhausted" if exhausted else "✅ no pool exhaustion")
+          + (f": {peak} connections over the budget of {budget}" if over_budget else ""))
+    return not exhausted
+
+
+def run_load_test(database_url, profiles, workers, threads, factor, requests, hold_ms):
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='pool-load-test-'), 'pool.db')
+    print("📈 Connection pool load test")
+    print("=" * 60)
+    passed = [run_profile(database_url, profile, workers, threads, factor, requests, hold_ms)
+              for profile in profiles]
+    return 0 if all(passed) else 1
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--database', help='database URL (default: scratch SQLite)')
+    parser.add_argument('--profiles', default='small', help='comma-separated pool profiles to run')
+    parser.add_argument('--workers', type=int, default=4, help='deployed gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='deployed threads per worker')
+    parser.add_argument('--factor', type=int, default=4, help='load as a multiple of the deployed concurrency')
+    parser.add_argument('--requests', type=int, default=50, help='requests per thread')
+    parser.add_argument('--hold-ms', type=float, default=20.0, help='time each request holds its connection')
+    args = parser.parse_args(argv)
+    return run_load_test(args.database, args.profiles.split(','), args.workers, args.threads, args.factor,
+                         args.requests, args.hold_ms)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
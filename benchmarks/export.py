@@ -0,0 +1,135 @@
+"""
+Benchmark peak memory of attendance CSV exports.
+
+Seeds a scratch SQLite database with ROWS attendance records (1M by default) and
+exports all of them once through the streaming date-range export and once the
+old way (every row loaded, the CSV built in a StringIO and copied into a
+BytesIO). Each export runs in its own process so peak RSS is measured cleanly.
+"""
+
+import csv
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import benchmarks
+
+STUDENTS = 500
+
+
+def _app(db_path):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    from app import create_app
+    return create_app()
+
+
+def seed(db_path, rows):
+    """Create one subject with enough sessions x students to reach `rows` records"""
+    from app import db
+    from app.models.models import Attendance, Enrollment, QRCode, Subject, User
+
+    app = _app(db_path)
+    sessions = max(rows // STUDENTS, 1)
+    start = datetime.utcnow() - timedelta(days=sessions)
+    with app.app_context():
+        teacher = User(email='export-teacher@example.com', name='Export Teacher', role='teacher', password_hash='x')
+        db.session.add(teacher)
+        db.session.flush()
+        subject = Subject(name='Export', year=1, division='A', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.flush()
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'export{i}@example.com', 'registration_number': f'E{i}', 'name': f'Student {i}',
+             'password_hash': 'x', 'role': 'student', 'year': 1, 'division': 'A'} for i in range(STUDENTS)])
+        student_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == 'student')]
+        db.session.execute(Enrollment.__table__.insert(), [
+            {'student_id': sid, 'subject_id': subject.id, 'roll_number': i + 1} for i, sid in enumerate(student_ids)])
+        db.session.execute(QRCode.__table__.insert(), [
+            {'subject_id': subject.id, 'token': f'export-{n}', 'expires_at': start + timedelta(days=n),
+             'class_start_time': start + timedelta(days=n), 'class_end_time': start + timedelta(days=n, hours=1)}
+            for n in range(sessions)])
+        session_ids = [qid for (qid,) in db.session.query(QRCode.id).order_by(QRCode.id)]
+        for n, qid in enumerate(session_ids):
+            marked_at = start + timedelta(days=n, minutes=5)
+            db.session.execute(Attendance.__table__.insert(), [
+                {'student_id': sid, 'subject_id': subject.id, 'qr_code_id': qid, 'marked_at': marked_at,
+                 'ip_address': '127.0.0.1', 'device_info': 'benchmark'} for sid in student_ids])
+        db.session.commit()
+        return teacher.id, subject.id, start.date(), datetime.utcnow().date()
+
+
+def export(db_path, mode, teacher_id, subject_id, first, last):
+    """Run one export and return (bytes, seconds, peak RSS in MB)"""
+    app = _app(db_path)
+    started = time.perf_counter()
+    size = 0
+    if mode == 'stream':
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(teacher_id)
+        response = client.get(f'/teacher/subject/{subject_id}/export-range?from={first}&to={last}', buffered=False)
+        for chunk in response.response:
+            size += len(chunk)
+        response.close()
+    else:
+        from app import db
+        from app.models.models import Attendance, Enrollment, User
+        with app.app_context():
+            records = db.session.query(
+                User.name, User.registration_number, Enrollment.roll_number, Attendance.marked_at,
+                Attendance.ip_address
+            ).join(User, User.id == Attendance.student_id).outerjoin(
+                Enrollment, (Enrollment.student_id == Attendance.student_id) & (Enrollment.subject_id == subject_id)
+            ).filter(Attendance.subject_id == subject_id).order_by(Attendance.marked_at, Attendance.id).all()
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(['Roll Number', 'Name', 'Registration Number', 'Marked At', 'IP Address'])
+            for r in records:
+                writer.writerow([r.roll_number, r.name, r.registration_number, r.marked_at, r.ip_address])
+            size = len(io.BytesIO(output.getvalue().encode('utf-8')).getvalue())
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    return size, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_benchmark(rows):
+    """Seed `rows` records, then export them in child processes for each mode"""
+    workdir = tempfile.mkdtemp(prefix='export-bench-')
+    db_path = os.path.join(workdir, 'export.db')
+    print(f"⏳ Seeding {rows} attendance rows into {db_path}")
+    teacher_id, subject_id, first, last = seed(db_path, rows)
+
+    print("📊 Attendance CSV export")
+    print("=" * 60)
+    print(f"{'mode':<10} {'MB written':>12} {'seconds':>10} {'peak RSS MB':>14}")
+    for mode in ('stream', 'buffered'):
+        result = subprocess.run(
+            [sys.executable, '-m', __spec__.name, '--child', mode, db_path, str(teacher_id), str(subject_id),
+             first.isoformat(), last.isoformat()],
+            check=True, capture_output=True, text=True, cwd=benchmarks.ROOT
+        )
+        size, elapsed, peak = result.stdout.split()
+        print(f"{mode:<10} {int(size) / 1e6:>12.1f} {float(elapsed):>10.1f} {float(peak):>14.1f}")
+    return 0
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == '--child':
+        mode, db_path, teacher_id, subject_id, first, last = argv[1:7]
+        size, elapsed, peak = export(db_path, mode, int(teacher_id), int(subject_id), first, last)
+        print(size, elapsed, peak)
+        return 0
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+    return run_benchmark(args.rows)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Soak test for the live roll-call feed.
+
+Opens hundreds of concurrent roll-call streams on one session against a scratch
+SQLite database, then marks attendance two ways: scans published in-process (as
+mark_attendance does) and rows written straight to the database (as another
+worker process would). Reports delivery latency and the number of SELECTs run
+while streaming, which should track sync ticks rather than open screens.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import benchmarks
+
+
+def run_soak(clients, scans, sync_ms):
+    """Stream `scans` scans to `clients` screens and check every screen got all of them"""
+    workdir = tempfile.mkdtemp(prefix='live-feed-soak-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'soak.db')
+    os.environ['ATTENDANCE_LIVE_SYNC_MS'] = str(sync_ms)
+
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.models.models import Attendance, Enrollment, QRCode, Subject, User
+
+    app = create_app()
+    feed = app.extensions['attendance_live']
+    now = datetime.utcnow()
+
+    with app.app_context():
+        teacher = User(email='soak-teacher@example.com', name='Soak Teacher', role='teacher', password_hash='x')
+        db.session.add(teacher)
+        db.session.flush()
+        subject = Subject(name='Soak', year=1, division='A', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.flush()
+        students = [User(email=f'soak{i}@example.com', registration_number=f'S{i}', name=f'Student {i}',
+                         role='student', password_hash='x', year=1, division='A') for i in range(scans)]
+        db.session.add_all(students)
+        db.session.flush()
+        db.session.add_all([Enrollment(student_id=s.id, subject_id=subject.id, roll_number=i + 1)
+                            for i, s in enumerate(students)])
+        session_row = QRCode(subject_id=subject.id, token='soak', expires_at=now + timedelta(minutes=10),
+                             class_start_time=now, class_end_time=now + timedelta(hours=1))
+        db.session.add(session_row)
+        db.session.commit()
+        qr_code_id, expires_at, subject_id = session_row.id, session_row.expires_at, subject.id
+        student_rows = [(s.id, s.name, s.registration_number) for s in students]
+        engine = db.engine
+
+    # Reads only: the simulated other worker's INSERTs are not feed traffic
+    selects = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            selects.append(statement)
+
+    published_at = {}
+    received = [0] * clients
+    latencies = []
+    latency_lock = threading.Lock()
+    ready = threading.Barrier(clients + 1)
+
+    def screen(index):
+        with app.app_context():
+            channel = feed.open(qr_code_id, expires_at)
+        stream = feed.stream(channel)
+        next(stream)
+        ready.wait()
+        try:
+            for chunk in stream:
+                if not chunk.startswith('id: '):
+                    continue
+                student_id = int(chunk.split('"student_id": ', 1)[1].split(',', 1)[0])
+                with latency_lock:
+                    latencies.append(time.perf_counter() - published_at.get(student_id, time.perf_counter()))
+                received[index] += 1
+                if received[index] == scans:
+                    break
+        finally:
+            stream.close()
+
+    threads = [threading.Thread(target=screen, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+
+    started = time.perf_counter()
+    selects_before = len(selects)
+
+    class _Student:
+        def __init__(self, row):
+            self.id, self.name, self.registration_number = row
+
+    # Half the class scans on this worker, the other half on "another" worker
+    half = scans // 2
+    for row in student_rows[:half]:
+        published_at[row[0]] = time.perf_counter()
+        feed.publish(qr_code_id, _Student(row))
+    with app.app_context():
+        for row in student_rows[half:]:
+            published_at[row[0]] = time.perf_counter()
+            db.session.add(Attendance(student_id=row[0], subject_id=subject_id, qr_code_id=qr_code_id))
+        db.session.commit()
+
+    for thread in threads:
+        thread.join(timeout=30)
+    elapsed = time.perf_counter() - started
+    streaming_selects = len(selects) - selects_before
+
+    complete = sum(1 for count in received if count == scans)
+    print("📡 Live roll-call soak")
+    print("=" * 50)
+    print(f"screens:              {clients}")
+    print(f"scans per screen:     {scans} ({half} in-process, {scans - half} from the database)")
+    print(f"screens complete:     {complete}/{clients}")
+    print(f"elapsed:              {elapsed:.2f}s (sync every {sync_ms} ms)")
+    print(f"SELECT statements:    {streaming_selects} while streaming")
+    if latencies:
+        latencies.sort()
+        print(f"delivery p50 / p99:   {statistics.median(latencies) * 1000:.1f} / "
+              f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    return 0 if complete == clients else 1
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--scans', type=int, default=60)
+    parser.add_argument('--sync-ms', type=int, default=500)
+    args = parser.parse_args(argv)
+    return run_soak(args.clients, args.scans, args.sync_ms)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
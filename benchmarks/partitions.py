@@ -0,0 +1,150 @@
+"""
+Benchmark teacher analytics against growing attendance history.
+
+Seeds one to five academic years of synthetic sessions and attendance into two
+scratch schemas on the PostgreSQL database in DATABASE_URL, one with a plain
+attendance table and one partitioned by month, and times the analytics trend
+queries after each year is added. The scratch schemas are dropped afterwards.
+"""
+
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import benchmarks
+
+SCHEMAS = ('bench_plain', 'bench_partitioned')
+
+SEED_PEOPLE = [
+    """INSERT INTO "user" (email, registration_number, name, password_hash, role, created_at)
+       VALUES ('bench-teacher@example.com', 'BT1', 'Bench Teacher', 'x', 'teacher', now())""",
+    """INSERT INTO "user" (email, registration_number, name, password_hash, role, year, division, created_at)
+       SELECT 'bench' || g || '@example.com', 'BS' || g, 'Student ' || g, 'x', 'student', 1, 'A', now()
+       FROM generate_series(1, :students) g""",
+    """INSERT INTO subject (name, year, division, teacher_id, created_at)
+       SELECT 'Subject ' || g, 1, 'A', (SELECT id FROM "user" WHERE role = 'teacher'), now()
+       FROM generate_series(1, :subjects) g""",
+    """INSERT INTO enrollment (student_id, subject_id, roll_number, created_at)
+       SELECT u.id, s.id, row_number() OVER (PARTITION BY s.id ORDER BY u.id), now()
+       FROM "user" u CROSS JOIN subject s WHERE u.role = 'student'""",
+]
+
+# Four lectures a week per subject, ~80% of the class present
+SEED_YEAR = [
+    """INSERT INTO qr_code (subject_id, token, created_at, expires_at, is_active, class_start_time, class_end_time)
+       SELECT s.id, md5(s.id || '-' || d), start, start + interval '10 minutes', false, start, start + interval '1 hour'
+       FROM subject s
+       CROSS JOIN generate_series(CAST(:lo AS timestamp), CAST(:hi AS timestamp) - interval '1 day', interval '1 day') d
+       CROSS JOIN LATERAL (SELECT d + (8 + s.id % 8) * interval '1 hour' AS start) t
+       WHERE extract(isodow FROM d) <= 4""",
+    """INSERT INTO attendance (student_id, subject_id, qr_code_id, marked_at, ip_address, device_info)
+       SELECT e.student_id, q.subject_id, q.id, q.class_start_time + interval '5 minutes', '127.0.0.1', 'benchmark'
+       FROM qr_code q JOIN enrollment e ON e.subject_id = q.subject_id
+       WHERE q.class_start_time >= :lo AND q.class_start_time < :hi AND random() < 0.8""",
+]
+
+
+def _analytics_queries(subject_ids):
+    """The three trend queries the teacher analytics page runs"""
+    from app.models.models import Attendance, QRCode
+    from app.utils import timebuckets
+
+    today = datetime.utcnow().date()
+    queries = []
+    for buckets in (timebuckets.day_buckets(today, 30),
+                    timebuckets.week_buckets(today, 8),
+                    timebuckets.month_buckets(today, 12)):
+        queries.append(timebuckets.bucket_counts(
+            buckets,
+            sessions=(QRCode.class_start_time, QRCode.subject_id, QRCode.id, QRCode.subject_id.in_(subject_ids)),
+            attendance=(Attendance.marked_at, Attendance.subject_id, Attendance.id,
+                        Attendance.subject_id.in_(subject_ids)),
+        ))
+    return queries
+
+
+def _time_analytics(connection, repeats):
+    subject_ids = list(connection.execute(text('SELECT id FROM subject')).scalars())
+    queries = _analytics_queries(subject_ids)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for query in queries:
+            connection.execute(query).all()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run_benchmark(years, subjects, students, repeats):
+    """Time analytics for 1..years of history on plain and partitioned attendance"""
+    from app import create_app, db
+    from app.utils import partitions
+
+    app = create_app()
+    results = {}
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print("❌ This benchmark needs a PostgreSQL DATABASE_URL")
+            return 1
+
+        with db.engine.connect() as connection:
+            try:
+                for schema in SCHEMAS:
+                    connection.execute(text(f'DROP SCHEMA IF EXISTS {schema} CASCADE'))
+                    connection.execute(text(f'CREATE SCHEMA {schema}'))
+                    connection.execute(text(f'SET search_path TO {schema}'))
+                    db.metadata.create_all(connection)
+                    if schema == 'bench_partitioned':
+                        partitions.partition_attendance(connection)
+                    for statement in SEED_PEOPLE:
+                        connection.execute(text(statement), {'subjects': subjects, 'students': students})
+                    connection.commit()
+
+                now = datetime.utcnow()
+                for year in range(1, years + 1):
+                    hi = now - timedelta(days=365 * (year - 1))
+                    lo = now - timedelta(days=365 * year)
+                    if year == 1:
+                        hi += timedelta(days=1)
+                    for schema in SCHEMAS:
+                        connection.execute(text(f'SET search_path TO {schema}'))
+                        if schema == 'bench_partitioned':
+                            partitions.create_partitions(connection, lo, hi)
+                        for statement in SEED_YEAR:
+                            connection.execute(text(statement), {'lo': lo, 'hi': hi})
+                        connection.commit()
+                        connection.execute(text('ANALYZE'))
+                        rows = connection.execute(text('SELECT count(*) FROM attendance')).scalar()
+                        results[(schema, year)] = (rows, _time_analytics(connection, repeats))
+            finally:
+                connection.rollback()
+                for schema in SCHEMAS:
+                    connection.execute(text(f'DROP SCHEMA IF EXISTS {schema} CASCADE'))
+                connection.commit()
+
+    print("📊 Teacher analytics latency (median ms over %d runs)" % repeats)
+    print("=" * 60)
+    print(f"{'years':>5} {'rows':>10} {'plain':>12} {'partitioned':>14}")
+    for year in range(1, years + 1):
+        rows, plain = results[('bench_plain', year)]
+        _, partitioned = results[('bench_partitioned', year)]
+        print(f"{year:>5} {rows:>10} {plain:>12.1f} {partitioned:>14.1f}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--subjects', type=int, default=8)
+    parser.add_argument('--students', type=int, default=60)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args(argv)
+    return run_benchmark(args.years, args.subjects, args.students, args.repeats)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Benchmark QR session rendering.
+
+Compares the old path (JSON payload rendered to PNG and inlined as base64) with
+the compact payload rendered by each QR_IMAGE_FORMAT backend, reporting QR
+version, median render time and bytes sent to the browser.
+"""
+
+import base64
+import io
+import json
+import secrets
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import qrcode
+
+import benchmarks
+
+
+def _legacy(subject_id, token, expires_at, start, end):
+    """generate_qr before compact payloads: JSON, PNG, base64 inlined in the page"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(json.dumps({
+        'token': token,
+        'subject_id': subject_id,
+        'expires_at': expires_at.isoformat(),
+        'class_start_time': start.isoformat(),
+        'class_end_time': end.isoformat()
+    }))
+    qr.make(fit=True)
+    img_buffer = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(img_buffer, format='PNG')
+    return qr.version, len(base64.b64encode(img_buffer.getvalue()))
+
+
+def _compact(fmt):
+    from app.utils import qr_images
+
+    def render(subject_id, token, expires_at, start, end):
+        payload = qr_images.encode_payload(subject_id, token)
+        body = qr_images.render(payload, fmt)
+        # Version only; the image itself came from qr_images.render
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M)
+        qr.add_data(payload)
+        return qr.best_fit(), len(body)
+    return render
+
+
+def _measure(render, runs):
+    now = datetime.utcnow()
+    samples = []
+    for i in range(runs):
+        args = (i % 50 + 1, secrets.token_urlsafe(32), now + timedelta(seconds=30), now, now + timedelta(hours=1))
+        started = time.perf_counter()
+        version, size = render(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return version, statistics.median(samples), size
+
+
+def run_benchmark(runs):
+    """Render `runs` QR sessions with each path and print a comparison"""
+    paths = [
+        ('legacy json+png+base64', _legacy),
+        ('compact svg', _compact('svg')),
+        ('compact png', _compact('png')),
+    ]
+
+    print(f"📊 QR rendering (median over {runs} renders)")
+    print("=" * 60)
+    print(f"{'path':<24} {'version':>8} {'ms':>8} {'bytes':>10}")
+    for name, render in paths:
+        version, ms, size = _measure(render, runs)
+        print(f"{name:<24} {version:>8} {ms:>8.2f} {size:>10}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args(argv)
+    return run_benchmark(args.runs)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
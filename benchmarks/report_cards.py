@@ -0,0 +1,91 @@
+"""
+Benchmark batch report-card rendering.
+
+Seeds a scratch SQLite database with one division of STUDENTS students (2,000 by
+default), each enrolled in SUBJECTS subjects with three exam results per subject,
+loads the cohort with the batch job's bulk queries, then renders every card with
+1, 2, 4, ... processes up to the CPU count and reports cards per second.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import benchmarks
+
+SUBJECTS = 5
+EXAMS = ('Unit Test', 'Midterm', 'Final')
+
+
+def seed(app, students):
+    from app import db
+    from app.models.models import Enrollment, Result, Subject, User
+
+    with app.app_context():
+        teacher = User(email='cards-teacher@example.com', name='Cards Teacher', role='teacher', password_hash='x')
+        db.session.add(teacher)
+        db.session.flush()
+        subjects = [Subject(name=f'Subject {n}', year=1, division='A', teacher_id=teacher.id) for n in range(SUBJECTS)]
+        db.session.add_all(subjects)
+        db.session.flush()
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'cards{i}@example.com', 'registration_number': f'C{i:05d}', 'name': f'Student {i}',
+             'password_hash': 'x', 'role': 'student', 'year': 1, 'division': 'A'} for i in range(students)])
+        student_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == 'student')]
+        db.session.execute(Enrollment.__table__.insert(), [
+            {'student_id': sid, 'subject_id': s.id, 'roll_number': i + 1}
+            for i, sid in enumerate(student_ids) for s in subjects])
+        db.session.execute(Result.__table__.insert(), [
+            {'student_id': sid, 'subject_id': s.id, 'exam_type': exam, 'marks_obtained': 40 + (sid + n) % 60,
+             'max_marks': 100, 'remarks': 'Good progress' if n % 2 else None}
+            for sid in student_ids for s in subjects for n, exam in enumerate(EXAMS)])
+        db.session.commit()
+        return teacher.id
+
+
+def run_benchmark(students):
+    from sqlalchemy import event
+
+    workdir = tempfile.mkdtemp(prefix='report-cards-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'cards.db')
+    from app import create_app, db
+    from app.utils.report_cards import build_cards, cohort_students, render
+
+    app = create_app()
+    print(f"⏳ Seeding {students} students")
+    teacher_id = seed(app, students)
+
+    with app.app_context():
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        started = time.perf_counter()
+        cards = build_cards(cohort_students(teacher_id, 1, 'A'))
+        loaded = time.perf_counter() - started
+
+    print("📊 Batch report cards")
+    print("=" * 60)
+    print(f"cohort loaded in {loaded:.2f}s with {len(statements)} SQL statements")
+    print(f"{'processes':>10} {'seconds':>10} {'cards/sec':>12} {'speedup':>10}")
+    cpus = os.cpu_count() or 1
+    counts = sorted({1, cpus} | {2 ** n for n in range(1, cpus.bit_length()) if 2 ** n < cpus})
+    baseline = None
+    for workers in counts:
+        started = time.perf_counter()
+        rendered = sum(1 for _ in render(cards, workers))
+        elapsed = time.perf_counter() - started
+        rate = rendered / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>10} {elapsed:>10.2f} {rate:>12.1f} {rate / baseline:>9.1f}x")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--students', type=int, default=2000)
+    args = parser.parse_args(argv)
+    return run_benchmark(args.students)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Benchmark the results CSV upload.
+
+Builds a ROWS-line results CSV (50,000 by default) for one teacher's subjects and
+uploads it twice, first inserting every result and then updating all of them, on
+scratch SQLite databases: once through the upload route and once with the old
+per-row import (two lookups per row, one ORM object per result). Reports wall time
+and the number of SQL statements for each pass.
+"""
+
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+
+import benchmarks
+
+SUBJECTS = 5
+
+
+def _app(db_path):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    from app import create_app
+    return create_app()
+
+
+def seed(app, rows):
+    """Create a teacher, SUBJECTS subjects and enough students for `rows` results"""
+    from app import db
+    from app.models.models import Subject, User
+
+    students = max(rows // SUBJECTS, 1)
+    with app.app_context():
+        teacher = User(email='results-teacher@example.com', name='Results Teacher', role='teacher', password_hash='x')
+        db.session.add(teacher)
+        db.session.flush()
+        db.session.add_all([Subject(name=f'Subject {n}', year=1, division='A', teacher_id=teacher.id)
+                            for n in range(SUBJECTS)])
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'results{i}@example.com', 'registration_number': f'R{i}', 'name': f'Student {i}',
+             'password_hash': 'x', 'role': 'student', 'year': 1, 'division': 'A'} for i in range(students)])
+        db.session.commit()
+        student_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == 'student')]
+        return teacher.id, student_ids
+
+
+def build_csv(student_ids, rows, marks):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['student_id', 'subject', 'exam_type', 'marks_obtained', 'max_marks', 'remarks'])
+    for i in range(rows):
+        writer.writerow([student_ids[i // SUBJECTS % len(student_ids)], f'Subject {i % SUBJECTS}', 'Final',
+                         marks, 100, 'benchmark'])
+    return output.getvalue().encode('utf-8')
+
+
+def upload_route(app, teacher_id, data):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(teacher_id)
+    response = client.post('/teacher/results/upload', data={'file': (io.BytesIO(data), 'results.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302, response.status_code
+
+
+def upload_per_row(app, teacher_id, data):
+    """The import as it was: two lookups per row and a single commit at the end"""
+    from app import db
+    from app.models.models import Result, Subject
+
+    with app.app_context():
+        for row in csv.DictReader(io.StringIO(data.decode('utf-8'))):
+            subject = Subject.query.filter_by(name=row['subject'], teacher_id=teacher_id).first()
+            existing = Result.query.filter_by(student_id=int(row['student_id']), subject_id=subject.id,
+                                              exam_type=row['exam_type']).first()
+            if existing:
+                existing.marks_obtained = float(row['marks_obtained'])
+                existing.max_marks = float(row['max_marks'])
+                existing.remarks = row['remarks']
+            else:
+                db.session.add(Result(student_id=int(row['student_id']), subject_id=subject.id,
+                                      exam_type=row['exam_type'], marks_obtained=float(row['marks_obtained']),
+                                      max_marks=float(row['max_marks']), remarks=row['remarks']))
+        db.session.commit()
+
+
+def run_benchmark(rows):
+    from sqlalchemy import event
+
+    workdir = tempfile.mkdtemp(prefix='results-import-bench-')
+    print(f"📊 Results CSV upload, {rows} rows")
+    print("=" * 60)
+    print(f"{'import':<10} {'pass':<8} {'seconds':>10} {'statements':>12}")
+    for name, upload in (('bulk', upload_route), ('per-row', upload_per_row)):
+        app = _app(os.path.join(workdir, f'{name}.db'))
+        teacher_id, student_ids = seed(app, rows)
+        from app import db
+        with app.app_context():
+            engine = db.engine
+        statements = []
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        for label, marks in (('insert', 70), ('update', 80)):
+            data = build_csv(student_ids, rows, marks)
+            statements.clear()
+            started = time.perf_counter()
+            upload(app, teacher_id, data)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<10} {label:<8} {elapsed:>10.2f} {len(statements):>12}")
+        event.remove(engine, 'before_cursor_execute', count)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--rows', type=int, default=50_000)
+    args = parser.parse_args(argv)
+    return run_benchmark(args.rows)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
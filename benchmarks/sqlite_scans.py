@@ -0,0 +1,165 @@
+"""
+Benchmark a scan burst on SQLite with and without DB_POOL_PROFILE=sqlite.
+
+Seeds a scratch SQLite database per run with one live session and STUDENTS
+enrolled students (2,000 by default), then starts WORKERS processes (8 by
+default, like `gunicorn -w 8`) that each post their share of the scans to
+/student/mark-attendance through a test client, THREADS at a time. Runs once
+with the default rollback journal and once with the SQLite profile (WAL, tuned
+pragmas, single writer lane), and reports scans per second, the error rate and
+p50/p99 latency of each.
+"""
+
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import benchmarks
+
+
+def _environment(database_url, profile, workers, threads):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['DB_POOL_PROFILE'] = profile
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+    os.environ['WEB_THREADS'] = str(threads)
+    os.environ['METRICS_ENABLED'] = 'false'
+    os.environ['ATTENDANCE_INGEST_MODE'] = 'sync'
+
+
+def seed(app, students):
+    from app import db
+    from app.models.models import Enrollment, QRCode, Subject, User
+    from app.utils.qr_images import encode_payload
+
+    now = datetime.utcnow()
+    with app.app_context():
+        teacher = User(email='burst-teacher@example.com', name='Burst Teacher', role='teacher', password_hash='x')
+        db.session.add(teacher)
+        db.session.flush()
+        subject = Subject(name='Burst', year=1, division='A', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.flush()
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'burst{i}@example.com', 'registration_number': f'SB{i:05d}', 'name': f'Student {i}',
+             'password_hash': 'x', 'role': 'student', 'year': 1, 'division': 'A'} for i in range(students)])
+        student_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == 'student').order_by(User.id)]
+        db.session.execute(Enrollment.__table__.insert(), [
+            {'student_id': sid, 'subject_id': subject.id, 'roll_number': i + 1} for i, sid in enumerate(student_ids)])
+        session_row = QRCode(subject_id=subject.id, token='burst-token', expires_at=now + timedelta(hours=1),
+                             class_start_time=now, class_end_time=now + timedelta(hours=1))
+        db.session.add(session_row)
+        db.session.commit()
+        return student_ids, encode_payload(subject.id, session_row.token)
+
+
+def worker(database_url, profile, workers, threads, student_ids, payload, start, results):
+    """One simulated gunicorn worker posting scans for its students"""
+    _environment(database_url, profile, workers, threads)
+    from app import create_app
+
+    app = create_app()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def scan(ids):
+        client = app.test_client()
+        for student_id in ids:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(student_id)
+                sess['_fresh'] = True
+            started = time.perf_counter()
+            response = client.post('/student/mark-attendance', json={'qr_data': payload})
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    scanners = [threading.Thread(target=scan, args=(student_ids[n::threads],)) for n in range(threads)]
+    start.wait()
+    for thread in scanners:
+        thread.start()
+    for thread in scanners:
+        thread.join()
+    results.put({'latencies': latencies, 'statuses': statuses})
+
+
+def run_once(profile, workers, threads, students):
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='sqlite-scan-bench-'), 'burst.db')
+    _environment(database_url, profile, workers, threads)
+    from app import create_app, db
+    from app.models.models import Attendance
+
+    app = create_app()
+    student_ids, payload = seed(app, students)
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(database_url, profile, workers, threads,
+                                                      student_ids[n::workers], payload, start, results))
+                 for n in range(workers)]
+    for process in processes:
+        process.start()
+    time.sleep(3)  # let every worker import the app before the burst
+    started = time.perf_counter()
+    start.set()
+    reports = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    latencies = sorted(latency for report in reports for latency in report['latencies'])
+    statuses = {}
+    for report in reports:
+        for status, n in report['statuses'].items():
+            statuses[status] = statuses.get(status, 0) + n
+    with app.app_context():
+        recorded = db.session.query(Attendance).count()
+    return {
+        'elapsed': elapsed,
+        'ok': statuses.get(200, 0),
+        'failed': len(latencies) - statuses.get(200, 0),
+        'recorded': recorded,
+        'statuses': statuses,
+        'p50': statistics.median(latencies),
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def run_benchmark(workers, threads, students):
+    print(f"⏳ {students} scans from {workers} workers x {threads} threads")
+    runs = {
+        'rollback journal': run_once('dev', workers, threads, students),
+        'sqlite profile': run_once('sqlite', workers, threads, students),
+    }
+    print("📷 SQLite scan burst")
+    print("=" * 78)
+    print(f"{'mode':<18} {'scans/s':>9} {'errors':>8} {'error rate':>11} {'recorded':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+    for mode, run in runs.items():
+        total = run['ok'] + run['failed']
+        print(f"{mode:<18} {run['ok'] / run['elapsed']:>9.1f} {run['failed']:>8} "
+              f"{run['failed'] / total * 100:>10.2f}% {run['recorded']:>9} "
+              f"{run['p50'] * 1000:>8.1f} {run['p99'] * 1000:>8.1f}")
+    for mode, run in runs.items():
+        if run['failed']:
+            print(f"{mode} responses by status: {dict(sorted(run['statuses'].items()))}")
+    return 0 if runs['sqlite profile']['failed'] == 0 else 1
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=1, help='threads per worker (gunicorn --threads)')
+    parser.add_argument('--students', type=int, default=2000)
+    args = parser.parse_args(argv)
+    return run_benchmark(args.workers, args.threads, args.students)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,568 @@
+"""
+Load-test and benchmark suite for the attendance lifecycle.
+
+Generates a synthetic campus (teachers, subjects, students, enrollments, past
+sessions, attendance and results) in a scratch database, then runs scenario
+workloads through create_app() with the test client:
+
+    scan_burst     every student of a division scans one live session at once
+    scan_paths     SCAN_PATHS_SCANS scans released at once, on the original scan path and
+                   then on ATTENDANCE_FAST_PATH
+    scan_ingest    the scan burst committed per request, then through the write-behind
+                   queue; queue throughput counts until every scan is in the database
+    dashboards     teacher and student dashboards and attendance pages
+    analytics      the analytics page and per-subject attendance views
+    exports        attendance and defaulter CSV exports
+    results_upload a results CSV covering one teacher's students
+    report_cards   report cards for every division, rendered in-process
+    startup        worker boots in fresh interpreters without create_all; fails if
+                   a boot runs SQL or imports qrcode, PIL or ReportLab
+
+Each scenario reports throughput, p50/p95/p99 latency, SQL statements per
+request and errors; comparison scenarios report one row per variant. Results are written as JSON (with the git commit) so runs
+can be compared:
+
+    python benchmark_suite.py --output before.json
+    python benchmark_suite.py --output after.json --compare before.json
+
+SQLite is used by default. `--database postgresql://localhost/attendance_bench`
+runs against PostgreSQL; because every table is dropped and recreated, a
+non-SQLite database is only used with `--reset`.
+"""
+
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import benchmarks
+
+SCALES = {
+    # teachers, subjects per teacher, divisions, students per division, past sessions per subject
+    'small': (4, 3, 4, 60, 20),
+    'medium': (20, 4, 10, 80, 60),
+    'large': (50, 4, 20, 120, 120),
+}
+ATTENDANCE_RATE = 0.8
+EXAMS = ('Midterm', 'Final')
+INSERT_CHUNK = 5000
+SCENARIOS = ('scan_burst', 'scan_paths', 'scan_ingest', 'dashboards', 'analytics', 'exports', 'results_upload', 'report_cards', 'startup')
+STARTUP_BOOTS = 10
+# Scans in flight at once in the scan_paths comparison
+SCAN_PATHS_SCANS = 500
+# Loaded on first use only; a worker boot must not import them
+HEAVY_MODULES = ('qrcode', 'PIL', 'reportlab')
+
+
+# ---------------------------------------------------------------------- data
+
+
+def _insert(table, rows):
+    from app import db
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(table.insert(), rows[start:start + INSERT_CHUNK])
+
+
+def generate(teachers, subjects_per_teacher, divisions, students_per_division, sessions, seed=42):
+    """Fill the database with a synthetic campus. Returns a dict of the ids scenarios need."""
+    from app import db
+    from app.models.models import Attendance, Enrollment, QRCode, Result, Subject, User
+    from app.utils import counters
+
+    rng = random.Random(seed)
+    division_keys = [(1 + d // 4, chr(ord('A') + d % 4)) for d in range(divisions)]
+
+    _insert(User.__table__, [
+        {'email': f'teacher{t}@bench.example', 'name': f'Teacher {t}', 'password_hash': 'x', 'role': 'teacher'}
+        for t in range(teachers)])
+    _insert(User.__table__, [
+        {'email': f'student{d}-{i}@bench.example', 'registration_number': f'B{d:02d}{i:04d}',
+         'name': f'Student {d}-{i}', 'password_hash': 'x', 'role': 'student', 'year': year, 'division': division}
+        for d, (year, division) in enumerate(division_keys) for i in range(students_per_division)])
+    teacher_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == 'teacher').order_by(User.id)]
+    students_by_division = {key: [] for key in division_keys}
+    for uid, year, division in db.session.query(User.id, User.year, User.division).filter(User.role == 'student'):
+        students_by_division[(year, division)].append(uid)
+
+    _insert(Subject.__table__, [
+        {'name': f'Subject {t}-{k}', 'year': division_keys[(t * subjects_per_teacher + k) % divisions][0],
+         'division': division_keys[(t * subjects_per_teacher + k) % divisions][1], 'teacher_id': teacher_id}
+        for t, teacher_id in enumerate(teacher_ids) for k in range(subjects_per_teacher)])
+    subjects = db.session.query(Subject.id, Subject.teacher_id, Subject.year, Subject.division).all()
+
+    enrollments, results = [], []
+    for subject in subjects:
+        for roll, student_id in enumerate(students_by_division[(subject.year, subject.division)], 1):
+            enrollments.append({'student_id': student_id, 'subject_id': subject.id, 'roll_number': roll})
+            for exam in EXAMS:
+                results.append({'student_id': student_id, 'subject_id': subject.id, 'exam_type': exam,
+                                'marks_obtained': rng.randint(30, 100), 'max_marks': 100})
+    _insert(Enrollment.__table__, enrollments)
+    _insert(Result.__table__, results)
+
+    # One past session per subject per day, most recent yesterday
+    now = datetime.utcnow()
+    session_rows = []
+    for subject in subjects:
+        for n in range(sessions):
+            start = now - timedelta(days=n + 1)
+            session_rows.append({'subject_id': subject.id, 'token': f'bench-{subject.id}-{n}', 'created_at': start,
+                                 'expires_at': start + timedelta(minutes=5), 'is_active': True,
+                                 'class_start_time': start, 'class_end_time': start + timedelta(hours=1)})
+    _insert(QRCode.__table__, session_rows)
+    attendance = []
+    subject_division = {s.id: (s.year, s.division) for s in subjects}
+    for qr_id, subject_id, created_at in db.session.query(QRCode.id, QRCode.subject_id, QRCode.created_at).all():
+        for student_id in students_by_division[subject_division[subject_id]]:
+            if rng.random() < ATTENDANCE_RATE:
+                attendance.append({'student_id': student_id, 'subject_id': subject_id, 'qr_code_id': qr_id,
+                                   'marked_at': created_at + timedelta(minutes=rng.randint(0, 4)),
+                                   'ip_address': '10.0.0.1', 'device_info': 'benchmark'})
+        if len(attendance) >= INSERT_CHUNK * 10:
+            _insert(Attendance.__table__, attendance)
+            attendance = []
+    _insert(Attendance.__table__, attendance)
+    db.session.commit()
+    counters.rebuild()
+
+    return {
+        'teachers': teacher_ids,
+        'subjects': [tuple(s) for s in subjects],
+        'students_by_division': {f'{y}-{d}': ids for (y, d), ids in students_by_division.items()},
+        'rows': {'students': sum(map(len, students_by_division.values())), 'subjects': len(subjects),
+                 'enrollments': len(enrollments), 'sessions': len(subjects) * sessions,
+                 'attendance': db.session.query(Attendance.id).count(), 'results': len(results)},
+    }
+
+
+# ----------------------------------------------------------------- measuring
+
+
+class Recorder:
+    """Latency, statement count and outcome of every request in one scenario."""
+
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.errors = 0
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def call(self, fn):
+        from app.utils import query_stats
+        with query_stats.capture() as stats:
+            started = time.perf_counter()
+            try:
+                ok = fn()
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.queries.append(stats.count)
+            if not ok:
+                self.errors += 1
+
+    def summary(self) -> dict:
+        wall = (self.finished or time.perf_counter()) - self.started
+        latencies = sorted(self.latencies)
+        n = len(latencies)
+
+        def pct(p):
+            return round(latencies[min(n - 1, max(0, int(round(p / 100 * n)) - 1))] * 1000, 2) if n else None
+
+        return {
+            'requests': n,
+            'errors': self.errors,
+            'seconds': round(wall, 3),
+            'throughput_rps': round(n / wall, 2) if wall > 0 else None,
+            'p50_ms': pct(50),
+            'p95_ms': pct(95),
+            'p99_ms': pct(99),
+            'queries_mean': round(sum(self.queries) / n, 2) if n else None,
+            'queries_max': max(self.queries) if n else None,
+        }
+
+
+class StartupRecorder(Recorder):
+    """Boot times, plus what each boot reported about itself."""
+
+    def __init__(self):
+        super().__init__()
+        self.boots = []
+
+    def summary(self) -> dict:
+        summary = super().summary()
+        if self.boots:
+            boots = self.boots
+            summary['queries_mean'] = round(sum(b['statements'] for b in boots) / len(boots), 2)
+            summary['queries_max'] = max(b['statements'] for b in boots)
+            summary['rss_mb'] = round(sorted(b['rss_kb'] for b in boots)[len(boots) // 2] / 1024, 1)
+            summary['phases_ms'] = {phase: round(sorted(b['phases_ms'].get(phase, 0) for b in boots)[len(boots) // 2], 2)
+                                    for phase in boots[0]['phases_ms']}
+            summary['heavy_modules'] = sorted({m for b in boots for m in b['heavy']})
+        return summary
+
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+def _ok(response):
+    status = response.status_code
+    response.get_data()
+    response.close()
+    return status < 400
+
+
+# ----------------------------------------------------------------- scenarios
+
+
+def _live_sessions(app, data, tag):
+    """Open one live session per division; return a (student_id, payload) scan per enrolled student"""
+    from app import db
+    from app.models.models import QRCode
+    from app.utils import counters, qr_images, qr_tokens
+
+    now = datetime.utcnow()
+    targets = []
+    with app.app_context():
+        seen = set()
+        for subject_id, _, year, division in data['subjects']:
+            if (year, division) in seen:
+                continue
+            seen.add((year, division))
+            qr_code = QRCode(subject_id=subject_id, token=f'{tag}-{subject_id}-{int(now.timestamp())}',
+                             expires_at=now + timedelta(minutes=30), class_start_time=now,
+                             class_end_time=now + timedelta(hours=1))
+            db.session.add(qr_code)
+            counters.record_session(subject_id)
+            db.session.commit()
+            qr_tokens.remember(qr_code)
+            payload = qr_images.encode_payload(subject_id, qr_code.token)
+            targets += [(student_id, payload) for student_id in data['students_by_division'][f'{year}-{division}']]
+    return targets
+
+
+def _burst(app, targets, concurrency):
+    """POST every scan of `targets` from `concurrency` threads; the recorder is left running"""
+    recorder = Recorder()
+    work = list(targets)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not work:
+                    return
+                student_id, payload = work.pop()
+            client = _client(app, student_id)
+            recorder.call(lambda: _ok(client.post('/student/mark-attendance', json={'qr_data': payload})))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder
+
+
+def _recorded(app, tag):
+    """Attendance rows of the sessions opened under `tag`"""
+    from app import db
+    from app.models.models import Attendance, QRCode
+
+    with app.app_context():
+        count = db.session.query(Attendance.id).join(QRCode, QRCode.id == Attendance.qr_code_id).filter(
+            QRCode.token.like(f'{tag}-%')).count()
+        db.session.remove()
+    return count
+
+
+def scan_burst(app, data, concurrency):
+    """One live session per division; every enrolled student scans it from `concurrency` threads"""
+    recorder = _burst(app, _live_sessions(app, data, 'burst'), concurrency)
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+def scan_paths(app, data, concurrency):
+    """SCAN_PATHS_SCANS threads scan at the same moment, first on the original path, then the fast one"""
+    results = {}
+    fast_path = app.config.get('ATTENDANCE_FAST_PATH')
+    try:
+        for name, fast in (('paths:old', False), ('paths:fast', True)):
+            app.config['ATTENDANCE_FAST_PATH'] = fast
+            targets = []
+            while len(targets) < SCAN_PATHS_SCANS:
+                targets += _live_sessions(app, data, f'{name.replace(":", "-")}{len(targets)}')
+            targets = targets[:SCAN_PATHS_SCANS]
+            recorder = Recorder()
+            # The clock starts when every client is ready
+            barrier = threading.Barrier(len(targets), action=lambda: setattr(recorder, 'started', time.perf_counter()))
+
+            def scan(student_id, payload):
+                client = _client(app, student_id)
+                # Both paths start from a cached user, as in a session of scans
+                client.get('/student/mark-attendance/status/0')
+                barrier.wait()
+                recorder.call(lambda: _ok(client.post('/student/mark-attendance', json={'qr_data': payload})))
+
+            threads = [threading.Thread(target=scan, args=target) for target in targets]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            recorder.finished = time.perf_counter()
+            results[name] = recorder
+    finally:
+        app.config['ATTENDANCE_FAST_PATH'] = fast_path
+    return results
+
+
+def scan_ingest(app, data, concurrency):
+    """The scan burst committed per request, then acknowledged by the write-behind queue"""
+    from app.utils import ingest
+
+    results = {}
+    for mode in ('sync', 'queue'):
+        targets = _live_sessions(app, data, f'ingest-{mode}')
+        queue = None
+        if mode == 'queue':
+            app.config['ATTENDANCE_INGEST_MODE'] = 'queue'
+            queue = ingest.init_app(app)
+        try:
+            recorder = _burst(app, targets, concurrency)
+            if queue is not None:
+                # Drains the queue, so the wall time covers every scan reaching the database
+                queue.stop(timeout=600)
+        finally:
+            if queue is not None:
+                app.extensions.pop('attendance_ingest')
+                app.config['ATTENDANCE_INGEST_MODE'] = 'sync'
+        recorder.finished = time.perf_counter()
+        recorder.errors += len(targets) - _recorded(app, f'ingest-{mode}')
+        results[f'ingest:{mode}'] = recorder
+    return results
+
+
+def _sequential(app, requests):
+    recorder = Recorder()
+    for user_id, method, url, kwargs in requests:
+        client = _client(app, user_id)
+        recorder.call(lambda: _ok(client.open(url, method=method, **kwargs)))
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+def dashboards(app, data, concurrency):
+    requests = [(t, 'GET', '/teacher/dashboard', {}) for t in data['teachers']]
+    for ids in data['students_by_division'].values():
+        for student_id in ids[:20]:
+            requests += [(student_id, 'GET', '/student/dashboard', {}),
+                         (student_id, 'GET', '/student/attendance', {})]
+    return _sequential(app, requests)
+
+
+def analytics(app, data, concurrency):
+    requests = [(t, 'GET', '/teacher/analytics', {}) for t in data['teachers']]
+    requests += [(teacher_id, 'GET', f'/teacher/subject/{subject_id}/attendance', {})
+                 for subject_id, teacher_id, _, _ in data['subjects']]
+    return _sequential(app, requests)
+
+
+def exports(app, data, concurrency):
+    requests = [(teacher_id, 'GET', f'/teacher/subject/{subject_id}/export', {})
+                for subject_id, teacher_id, _, _ in data['subjects']]
+    requests += [(t, 'GET', '/teacher/analytics/defaulters.csv', {}) for t in data['teachers']]
+    return _sequential(app, requests)
+
+
+def results_upload(app, data, concurrency):
+    """Each teacher uploads one CSV re-grading every student in their subjects"""
+    requests = []
+    for teacher_id in data['teachers']:
+        output = io.StringIO()
+        output.write('student_id,subject_id,exam_type,marks_obtained,max_marks,remarks\n')
+        for subject_id, owner, year, division in data['subjects']:
+            if owner == teacher_id:
+                for student_id in data['students_by_division'][f'{year}-{division}']:
+                    output.write(f'{student_id},{subject_id},Final,75,100,benchmark\n')
+        body = output.getvalue().encode()
+        requests.append((teacher_id, 'POST', '/teacher/results/upload', {
+            'data': {'file': (io.BytesIO(body), 'results.csv')}, 'content_type': 'multipart/form-data'}))
+    return _sequential(app, requests)
+
+
+def report_cards(app, data, concurrency):
+    """Report cards for each division, one request per division (loading plus rendering)"""
+    from app import db
+    from app.utils.report_cards import build_cards, cohort_students, render
+
+    divisions = {}
+    for _, teacher_id, year, division in data['subjects']:
+        divisions.setdefault((year, division), teacher_id)
+    recorder = Recorder()
+    for (year, division), teacher_id in divisions.items():
+        def run():
+            with app.app_context():
+                cards = build_cards(cohort_students(teacher_id, year, division))
+                db.session.remove()
+            return sum(1 for _ in render(cards, workers=1)) == len(cards)
+        recorder.call(run)
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+_STARTUP_CHILD = '''
+import json, resource, sys, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+from app import create_app
+app = create_app()
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    'phases_ms': app.extensions['startup']['phases_ms'],
+    'statements': len(statements),
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy': [name for name in %r if name in sys.modules],
+}))
+''' % (HEAVY_MODULES,)
+
+
+def startup(app, data, concurrency):
+    """Boot the app in a fresh interpreter STARTUP_BOOTS times, as a gunicorn worker does"""
+    recorder = StartupRecorder()
+    env = dict(os.environ, DB_CREATE_ALL='false', METRICS_ENABLED='false')
+    root = benchmarks.ROOT
+
+    def boot():
+        result = subprocess.run([sys.executable, '-c', _STARTUP_CHILD], env=env, cwd=root,
+                                capture_output=True, text=True, check=True)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        recorder.boots.append(report)
+        return report['statements'] == 0 and not report['heavy']
+
+    for _ in range(STARTUP_BOOTS):
+        recorder.call(boot)
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+# ---------------------------------------------------------------------- main
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=benchmarks.ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict) -> None:
+    print()
+    print(f"📈 Compared with {baseline['meta'].get('commit')} ({baseline['meta'].get('database')})")
+    print(f"{'scenario':<16} {'rps':>18} {'p95 ms':>20} {'queries/req':>18}")
+    for name, now in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+
+        def cell(key):
+            a, b = before.get(key), now.get(key)
+            if a in (None, 0) or b is None:
+                return f'{b}'
+            return f'{b} ({(b / a - 1) * 100:+.0f}%)'
+
+        print(f"{name:<16} {cell('throughput_rps'):>18} {cell('p95_ms'):>20} {cell('queries_mean'):>18}")
+        if 'rss_mb' in now:
+            print(f"{'':<16} RSS per worker {cell('rss_mb')} MB")
+
+
+def run_suite(database, scale, scenarios, concurrency, output, baseline):
+    workdir = tempfile.mkdtemp(prefix='benchmark-suite-')
+    os.environ['DATABASE_URL'] = database or 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('ATTENDANCE_INGEST_SPOOL_DIR', os.path.join(workdir, 'spool'))
+    os.environ.setdefault('METRICS_DIR', os.path.join(workdir, 'metrics'))
+    os.environ.setdefault('PDF_CACHE_DIR', os.path.join(workdir, 'pdf-cache'))
+
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print(f"⏳ Generating '{scale}' dataset on {db.engine.dialect.name}")
+        started = time.perf_counter()
+        data = generate(*SCALES[scale])
+        print(f"   {data['rows']} in {time.perf_counter() - started:.1f}s")
+        dialect = db.engine.dialect.name
+
+    functions = {'scan_burst': scan_burst, 'scan_paths': scan_paths, 'scan_ingest': scan_ingest, 'dashboards': dashboards, 'analytics': analytics,
+                 'exports': exports, 'results_upload': results_upload, 'report_cards': report_cards,
+                 'startup': startup}
+    report = {
+        'meta': {'commit': _commit(), 'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+                 'database': dialect, 'scale': scale, 'concurrency': concurrency, 'rows': data['rows'],
+                 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'scenarios': {},
+    }
+    print(f"{'scenario':<16} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'queries':>8}")
+    for scenario in scenarios:
+        recorders = functions[scenario](app, data, concurrency)
+        if not isinstance(recorders, dict):
+            recorders = {scenario: recorders}
+        for name, recorder in recorders.items():
+            summary = recorder.summary()
+            report['scenarios'][name] = summary
+            print(f"{name:<16} {summary['requests']:>9} {summary['errors']:>7} {summary['throughput_rps']:>9} "
+                  f"{summary['p50_ms']:>9} {summary['p95_ms']:>9} {summary['p99_ms']:>9} {summary['queries_mean']:>8}")
+            if 'phases_ms' in summary:
+                print(f"{'':<16} RSS {summary['rss_mb']} MB, median ms by phase {summary['phases_ms']}"
+                      + (f", imported {', '.join(summary['heavy_modules'])}" if summary['heavy_modules'] else ''))
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Wrote {output}")
+    if baseline:
+        with open(baseline, encoding='utf-8') as fh:
+            compare(json.load(fh), report)
+    return 1 if any(s['errors'] for s in report['scenarios'].values()) else 0
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--database', help='SQLAlchemy URL (default: a scratch SQLite file)')
+    parser.add_argument('--reset', action='store_true', help='allow dropping all tables of a non-SQLite --database')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+                        help='run only this scenario (repeatable)')
+    parser.add_argument('--concurrency', type=int, default=8, help='threads for the scan burst')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args(argv)
+    if args.database and not args.database.startswith('sqlite') and not args.reset:
+        parser.error('--database drops and recreates every table; pass --reset to confirm')
+    return run_suite(args.database, args.scale, args.scenarios or list(SCENARIOS), args.concurrency,
+                     args.output, args.compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
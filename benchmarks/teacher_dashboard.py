@@ -0,0 +1,137 @@
+"""
+Benchmark the teacher dashboard on large rosters.
+
+For each roster size, seeds a scratch SQLite database with a teacher of SUBJECTS
+subjects (10 by default) that every student of the roster is enrolled in, with
+past sessions, today's scans and pending leave applications. Then times:
+
+    old load    the previous view's data load, touching subject.enrollments
+    query       the grouped query behind the dashboard
+    page cold   GET /teacher/dashboard with the subject grid cache emptied
+    page warm   GET /teacher/dashboard served from the subject grid cache
+
+and reports the median time, SQL statements and rows loaded for each.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+import benchmarks
+
+SUBJECTS = 10
+SESSIONS = 30
+
+
+def seed(app, roster, index):
+    from app import db
+    from app.models.models import Attendance, Enrollment, LeaveApplication, QRCode, Subject, User
+    from app.utils import counters
+
+    now = datetime.utcnow()
+    with app.app_context():
+        teacher = User(email=f'dash-teacher{index}@example.com', name='Dashboard Teacher', role='teacher',
+                       password_hash='x')
+        db.session.add(teacher)
+        db.session.flush()
+        subjects = [Subject(name=f'Subject {n}', year=1, division=f'R{index}', teacher_id=teacher.id)
+                    for n in range(SUBJECTS)]
+        db.session.add_all(subjects)
+        db.session.flush()
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'dash{index}-{i}@example.com', 'registration_number': f'D{index}-{i:05d}',
+             'name': f'Student {i}', 'password_hash': 'x', 'role': 'student', 'year': 1, 'division': f'R{index}'}
+            for i in range(roster)])
+        student_ids = [uid for (uid,) in db.session.query(User.id).filter(User.division == f'R{index}')]
+        db.session.execute(Enrollment.__table__.insert(), [
+            {'student_id': sid, 'subject_id': s.id, 'roll_number': i + 1}
+            for s in subjects for i, sid in enumerate(student_ids)])
+        for subject in subjects:
+            counters.record_session(subject.id, count=SESSIONS)
+            session_row = QRCode(subject_id=subject.id, token=f'dash-{subject.id}', expires_at=now + timedelta(hours=1),
+                                 class_start_time=now, class_end_time=now + timedelta(hours=1))
+            db.session.add(session_row)
+            db.session.flush()
+            db.session.execute(Attendance.__table__.insert(), [
+                {'student_id': sid, 'subject_id': subject.id, 'qr_code_id': session_row.id, 'marked_at': now}
+                for sid in student_ids[:int(roster * 0.8)]])
+            db.session.execute(LeaveApplication.__table__.insert(), [
+                {'student_id': sid, 'subject_id': subject.id, 'leave_type': 'sick', 'start_date': now.date(),
+                 'end_date': now.date(), 'reason': 'Unwell', 'status': 'pending', 'submitted_at': now}
+                for sid in student_ids[:roster // 50]])
+        db.session.commit()
+        return teacher.id
+
+
+def _median_ms(timings):
+    return statistics.median(timings) * 1000
+
+
+def run_benchmark(rosters, rounds):
+    workdir = tempfile.mkdtemp(prefix='dashboard-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'dashboard.db')
+    os.environ['METRICS_ENABLED'] = 'false'
+    from app import create_app, db
+    from app.models.models import Subject
+    from app.utils import query_stats, teacher_dashboard
+
+    app = create_app()
+    print("🧑‍🏫 Teacher dashboard")
+    print("=" * 72)
+    print(f"{'roster':>7} {'variant':<10} {'median ms':>10} {'statements':>11} {'rows':>9}")
+    for index, roster in enumerate(rosters):
+        print(f"⏳ Seeding {SUBJECTS} subjects x {roster} students", end='\r')
+        teacher_id = seed(app, roster, index)
+
+        def old_load():
+            subjects = Subject.query.filter_by(teacher_id=teacher_id).all()
+            return len(subjects) + sum(len(subject.enrollments) for subject in subjects)
+
+        def query():
+            return len(teacher_dashboard.subject_summaries(teacher_id))
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(teacher_id)
+            sess['_fresh'] = True
+
+        def page(cold):
+            def get():
+                if cold:
+                    with app.app_context():
+                        teacher_dashboard.invalidate(teacher_id)
+                assert client.get('/teacher/dashboard').status_code == 200
+                return None
+            return get
+
+        page(True)()  # warm the identity cache and template compilation
+        for name, run, in_app in (('old load', old_load, True), ('query', query, True),
+                                  ('page cold', page(True), False), ('page warm', page(False), False)):
+            timings = []
+            for _ in range(rounds):
+                with app.app_context() if in_app else nullcontext():
+                    with query_stats.capture() as stats:
+                        started = time.perf_counter()
+                        rows = run()
+                        timings.append(time.perf_counter() - started)
+                    if in_app:
+                        db.session.remove()
+            print(f"{roster:>7} {name:<10} {_median_ms(timings):>10.2f} {stats.count:>11} "
+                  f"{rows if rows is not None else '-':>9}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--rosters', default='200,1000,5000', help='comma-separated students per subject')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args(argv)
+    return run_benchmark([int(n) for n in args.rosters.split(',')], args.rounds)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
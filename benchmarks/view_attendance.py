@@ -0,0 +1,135 @@
+"""
+Benchmark the student attendance page on a long session history.
+
+Seeds a scratch SQLite database with one student enrolled in SUBJECTS subjects
+(8 by default) that have 10,000 sessions between them, 80% of them attended, in a
+class of CLASSMATES. Then times:
+
+    old load    the previous view's data load: two queries and an any() scan of
+                the attendance records per session, for every enrollment
+    page        GET /student/attendance: the set-based query plus rendering
+
+and reports the median time, SQL statements and sessions listed for each. The
+page is timed with rendering, so it is the upper bound of the new data load.
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import benchmarks
+
+SUBJECTS = 8
+CLASSMATES = 30
+ATTENDANCE_RATE = 0.8
+
+
+def seed(app, sessions, rng):
+    from app import db
+    from app.models.models import Attendance, Enrollment, QRCode, Subject, User
+    from app.utils import counters
+
+    with app.app_context():
+        teacher = User(email='history-teacher@example.com', name='History Teacher', role='teacher', password_hash='x')
+        db.session.add(teacher)
+        db.session.flush()
+        subjects = [Subject(name=f'Subject {n}', year=1, division='A', teacher_id=teacher.id) for n in range(SUBJECTS)]
+        db.session.add_all(subjects)
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'history{i}@example.com', 'registration_number': f'H{i:03d}', 'name': f'Student {i}',
+             'password_hash': 'x', 'role': 'student', 'year': 1, 'division': 'A'} for i in range(CLASSMATES)])
+        db.session.flush()
+        student_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == 'student').order_by(User.id)]
+        db.session.execute(Enrollment.__table__.insert(), [
+            {'student_id': sid, 'subject_id': s.id, 'roll_number': i + 1}
+            for s in subjects for i, sid in enumerate(student_ids)])
+        start = datetime(2020, 1, 1)
+        db.session.execute(QRCode.__table__.insert(), [
+            {'subject_id': subjects[n % SUBJECTS].id, 'token': f'history-{n}',
+             'created_at': start + timedelta(hours=n), 'expires_at': start + timedelta(hours=n, minutes=10),
+             'is_active': False, 'class_start_time': start + timedelta(hours=n),
+             'class_end_time': start + timedelta(hours=n + 1)} for n in range(sessions)])
+        db.session.execute(Attendance.__table__.insert(), [
+            {'student_id': sid, 'subject_id': subject_id, 'qr_code_id': qr_code_id, 'marked_at': created_at}
+            for qr_code_id, subject_id, created_at in db.session.query(QRCode.id, QRCode.subject_id, QRCode.created_at)
+            for sid in student_ids if rng.random() < ATTENDANCE_RATE])
+        counters.rebuild()
+        db.session.commit()
+        return student_ids[0]
+
+
+def old_load(student_id):
+    """The data load of view_attendance before it moved to one set-based query"""
+    from app.models.models import Attendance, Enrollment, QRCode, Subject
+
+    attendance_data = []
+    for enrollment in Enrollment.query.filter_by(student_id=student_id).all():
+        qr_codes = QRCode.query.filter_by(subject_id=enrollment.subject_id).all()
+        attendance_records = Attendance.query.filter_by(student_id=student_id, subject_id=enrollment.subject_id).all()
+        class_sessions = []
+        for qr_code in qr_codes:
+            attended = any(record.qr_code_id == qr_code.id for record in attendance_records)
+            class_sessions.append({
+                'date': qr_code.created_at.strftime('%Y-%m-%d'),
+                'start_time': qr_code.class_start_time.strftime('%H:%M') if qr_code.class_start_time else 'N/A',
+                'end_time': qr_code.class_end_time.strftime('%H:%M') if qr_code.class_end_time else 'N/A',
+                'attended': attended,
+                'status': 'Present' if attended else 'Absent',
+            })
+        attendance_data.append({'subject': Subject.query.get(enrollment.subject_id), 'class_sessions': class_sessions})
+    return sum(len(entry['class_sessions']) for entry in attendance_data)
+
+
+def run_benchmark(sessions, rounds, seed_value):
+    workdir = tempfile.mkdtemp(prefix='view-attendance-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'history.db')
+    os.environ['METRICS_ENABLED'] = 'false'
+    from app import create_app, db
+    from app.utils import query_stats
+
+    app = create_app()
+    print(f"⏳ Seeding {sessions} sessions over {SUBJECTS} subjects", end='\r')
+    student_id = seed(app, sessions, random.Random(seed_value))
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(student_id)
+        sess['_fresh'] = True
+    client.get('/student/attendance')  # warm the identity cache and template compilation
+
+    def page():
+        response = client.get('/student/attendance')
+        assert response.status_code == 200
+        return response.data.count(b'</i>Present') + response.data.count(b'</i>Absent')
+
+    print("📅 Student attendance page")
+    print("=" * 60)
+    print(f"{'sessions':>9} {'variant':<9} {'median ms':>10} {'statements':>11} {'rows':>7}")
+    for name, run in (('old load', lambda: old_load(student_id)), ('page', page)):
+        timings = []
+        for _ in range(rounds):
+            with app.app_context():
+                with query_stats.capture() as stats:
+                    started = time.perf_counter()
+                    rows = run()
+                    timings.append(time.perf_counter() - started)
+                db.session.remove()
+        print(f"{sessions:>9} {name:<9} {statistics.median(timings) * 1000:>10.1f} {stats.count:>11} {rows:>7}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = benchmarks.parser(__file__, __doc__)
+    parser.add_argument('--sessions', type=int, default=10000, help='sessions across all subjects')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    return run_benchmark(args.sessions, args.rounds, args.seed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
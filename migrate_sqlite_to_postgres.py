@@ -35,6 +35,9 @@ def migrate_data():
         app = create_app()
         
         with app.app_context():
+            # create_app no longer creates tables on PostgreSQL
+            db.create_all()
+            
             # Migrate Users
             print("\n👥 Migrating Users...")
             sqlite_cursor.execute("SELECT * FROM user")
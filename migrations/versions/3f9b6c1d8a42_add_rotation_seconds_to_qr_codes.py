@@ -0,0 +1,26 @@
+"""Add rotation seconds to QR codes
+
+Revision ID: 3f9b6c1d8a42
+Revises: d7a4e2b91c05
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9b6c1d8a42'
+down_revision = 'd7a4e2b91c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('qr_code', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rotation_seconds', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('qr_code', schema=None) as batch_op:
+        batch_op.drop_column('rotation_seconds')
@@ -0,0 +1,48 @@
+"""Add materialized attendance counters
+
+Revision ID: 5b2f0c7d9e14
+Revises: 99907490a460
+Create Date: 2026-10-17 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2f0c7d9e14'
+down_revision = '99907490a460'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('subject_session_count',
+        sa.Column('subject_id', sa.Integer(), nullable=False),
+        sa.Column('sessions_held', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['subject_id'], ['subject.id'], ),
+        sa.PrimaryKeyConstraint('subject_id')
+    )
+    op.create_table('student_attendance_count',
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('subject_id', sa.Integer(), nullable=False),
+        sa.Column('sessions_attended', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['student_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['subject_id'], ['subject.id'], ),
+        sa.PrimaryKeyConstraint('student_id', 'subject_id')
+    )
+
+    # Backfill from existing history
+    op.execute(
+        'INSERT INTO subject_session_count (subject_id, sessions_held) '
+        'SELECT subject_id, COUNT(id) FROM qr_code GROUP BY subject_id'
+    )
+    op.execute(
+        'INSERT INTO student_attendance_count (student_id, subject_id, sessions_attended) '
+        'SELECT student_id, subject_id, COUNT(id) FROM attendance GROUP BY student_id, subject_id'
+    )
+
+
+def downgrade():
+    op.drop_table('student_attendance_count')
+    op.drop_table('subject_session_count')
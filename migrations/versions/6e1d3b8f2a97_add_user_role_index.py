@@ -0,0 +1,25 @@
+"""Add an index on user.role
+
+Revision ID: 6e1d3b8f2a97
+Revises: 3f9b6c1d8a42
+Create Date: 2026-10-17 21:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e1d3b8f2a97'
+down_revision = '3f9b6c1d8a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The results pages list every student
+    op.create_index('ix_user_role', 'user', ['role'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_role', table_name='user')
@@ -0,0 +1,48 @@
+"""Add indexes for hot query shapes
+
+Revision ID: 8c3e1a6f4b27
+Revises: 5b2f0c7d9e14
+Create Date: 2026-10-17 17:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3e1a6f4b27'
+down_revision = '5b2f0c7d9e14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Login looks users up by lower(email)
+    op.create_index('ix_user_email_lower', 'user', [sa.text('lower(email)')], unique=False)
+    # Teacher dashboards/exports and student subject browsing
+    op.create_index('ix_subject_teacher_id', 'subject', ['teacher_id'], unique=False)
+    op.create_index('ix_subject_year_division', 'subject', ['year', 'division'], unique=False)
+    # Roll lists: enrollments of a subject in roll-number order
+    op.create_index('ix_enrollment_subject_roll', 'enrollment', ['subject_id', 'roll_number'], unique=False)
+    # Sessions of a subject and analytics range scans on class_start_time
+    op.create_index('ix_qr_code_subject_start', 'qr_code', ['subject_id', 'class_start_time'], unique=False)
+    # Per-day attendance and analytics range scans on marked_at; per-session roll call
+    op.create_index('ix_attendance_subject_marked', 'attendance', ['subject_id', 'marked_at'], unique=False)
+    op.create_index('ix_attendance_qr_code', 'attendance', ['qr_code_id'], unique=False)
+    # Leave lists are filtered by subject or student and ordered by submitted_at
+    op.create_index('ix_leave_application_subject_submitted', 'leave_application', ['subject_id', 'submitted_at'], unique=False)
+    op.create_index('ix_leave_application_student', 'leave_application', ['student_id', 'submitted_at'], unique=False)
+    op.create_index('ix_result_subject', 'result', ['subject_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_result_subject', table_name='result')
+    op.drop_index('ix_leave_application_student', table_name='leave_application')
+    op.drop_index('ix_leave_application_subject_submitted', table_name='leave_application')
+    op.drop_index('ix_attendance_qr_code', table_name='attendance')
+    op.drop_index('ix_attendance_subject_marked', table_name='attendance')
+    op.drop_index('ix_qr_code_subject_start', table_name='qr_code')
+    op.drop_index('ix_enrollment_subject_roll', table_name='enrollment')
+    op.drop_index('ix_subject_year_division', table_name='subject')
+    op.drop_index('ix_subject_teacher_id', table_name='subject')
+    op.drop_index('ix_user_email_lower', table_name='user')
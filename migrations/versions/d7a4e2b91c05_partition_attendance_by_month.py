@@ -0,0 +1,33 @@
+"""Partition attendance by month (opt-in, PostgreSQL)
+
+Revision ID: d7a4e2b91c05
+Revises: 8c3e1a6f4b27
+Create Date: 2026-10-17 18:10:00.000000
+
+"""
+from alembic import op
+
+from app.utils import partitions
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a4e2b91c05'
+down_revision = '8c3e1a6f4b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only applies with ATTENDANCE_PARTITIONING on PostgreSQL; a no-op everywhere else
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not partitions.requested():
+        return
+    if not partitions.is_partitioned(bind):
+        partitions.partition_attendance(bind)
+
+
+def downgrade():
+    # Detached partitions are not folded back in
+    bind = op.get_bind()
+    if partitions.is_partitioned(bind):
+        partitions.unpartition_attendance(bind)
@@ -0,0 +1,97 @@
+"""Shared fixtures: the app.testing plugin and a small seeded campus."""
+import os
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+pytest_plugins = ['app.testing']
+
+STUDENTS = 30
+SUBJECTS = 3
+SESSIONS = 5
+POSTGRES_SCHEMA = 'pytest_scratch'
+
+
+@pytest.fixture
+def postgres_app(tmp_path, monkeypatch):
+    """Like `app`, on a scratch schema of the TEST_POSTGRES_URL database; skipped without it."""
+    url = os.environ.get('TEST_POSTGRES_URL')
+    if not url:
+        pytest.skip('TEST_POSTGRES_URL is not set')
+    admin = create_engine(url)
+    with admin.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA IF EXISTS {POSTGRES_SCHEMA} CASCADE'))
+        connection.execute(text(f'CREATE SCHEMA {POSTGRES_SCHEMA}'))
+    scratch = make_url(url).update_query_dict({'options': f'-csearch_path={POSTGRES_SCHEMA}'})
+    monkeypatch.setenv('DATABASE_URL', scratch.render_as_string(hide_password=False))
+    monkeypatch.setenv('ATTENDANCE_INGEST_SPOOL_DIR', str(tmp_path / 'spool'))
+    from app import create_app, db
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    with admin.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA {POSTGRES_SCHEMA} CASCADE'))
+    admin.dispose()
+
+
+@pytest.fixture
+def campus(app):
+    """One teacher with SUBJECTS subjects, each taken by STUDENTS students of 1-A.
+
+    Every subject has SESSIONS past sessions and one live one; students with an even
+    index attended the past sessions. Each student has two results per subject and
+    the first two students a pending leave application each.
+    """
+    from app import db
+    from app.models.models import Attendance, Enrollment, LeaveApplication, QRCode, Result, Subject, User
+    from app.utils import counters
+
+    now = datetime.utcnow()
+    with app.app_context():
+        teacher = User(email='teacher@example.com', name='Campus Teacher', role='teacher', password_hash='x')
+        students = [User(email=f'student{i}@example.com', registration_number=f'S{i:03d}', name=f'Student {i}',
+                         role='student', password_hash='x', year=1, division='A') for i in range(STUDENTS)]
+        db.session.add_all([teacher] + students)
+        db.session.flush()
+        subjects = [Subject(name=f'Subject {n}', year=1, division='A', teacher_id=teacher.id)
+                    for n in range(SUBJECTS)]
+        db.session.add_all(subjects)
+        db.session.flush()
+        for subject in subjects:
+            db.session.add_all([Enrollment(student_id=s.id, subject_id=subject.id, roll_number=i + 1)
+                                for i, s in enumerate(students)])
+            db.session.add_all([Result(student_id=s.id, subject_id=subject.id, exam_type=exam,
+                                       marks_obtained=40 + i, max_marks=100)
+                                for i, s in enumerate(students) for exam in ('Midterm', 'Final')])
+            for n in range(SESSIONS):
+                start = now - timedelta(days=n + 1)
+                session = QRCode(subject_id=subject.id, token=f'past-{subject.id}-{n}', created_at=start,
+                                 expires_at=start + timedelta(minutes=5), class_start_time=start,
+                                 class_end_time=start + timedelta(hours=1))
+                db.session.add(session)
+                db.session.flush()
+                db.session.add_all([Attendance(student_id=s.id, subject_id=subject.id, qr_code_id=session.id,
+                                               marked_at=start) for s in students[::2]])
+        live = [QRCode(subject_id=subject.id, token=f'live-{subject.id}', expires_at=now + timedelta(minutes=30),
+                       class_start_time=now, class_end_time=now + timedelta(hours=1)) for subject in subjects]
+        db.session.add_all(live)
+        db.session.add_all([LeaveApplication(student_id=s.id, subject_id=subjects[0].id, leave_type='sick',
+                                             start_date=date.today(), end_date=date.today(), reason='Unwell')
+                            for s in students[:2]])
+        db.session.commit()
+        counters.rebuild()
+        return SimpleNamespace(
+            teacher_id=teacher.id,
+            student_ids=[s.id for s in students],
+            subject_ids=[s.id for s in subjects],
+            live_session_ids=[q.id for q in live],
+            live_tokens=[q.token for q in live],
+        )
@@ -0,0 +1,54 @@
+"""Each application keeps its own caches, so one test's data never reaches the next."""
+import pytest
+
+from app import db
+from app.models.models import Enrollment, Subject, User
+
+
+@pytest.mark.parametrize('subject_name', ['Physics', 'Chemistry'])
+def test_cached_pages_belong_to_their_app(app, client, login, subject_name):
+    with app.app_context():
+        teacher = User(name='Teacher', email='teacher@example.com', role='teacher')
+        teacher.set_password('secret')
+        student = User(name='Student', email='student@example.com', role='student',
+                       registration_number='S1', year=1, division='A')
+        student.set_password('secret')
+        db.session.add_all([teacher, student])
+        db.session.flush()
+        subject = Subject(name=subject_name, year=1, division='A', teacher_id=teacher.id)
+        db.session.add(subject)
+        db.session.flush()
+        db.session.add(Enrollment(student_id=student.id, subject_id=subject.id, roll_number=1))
+        db.session.commit()
+        teacher_id, student_id = teacher.id, student.id
+
+    login(teacher_id)
+    dashboard = client.get('/teacher/dashboard').get_data(as_text=True)
+    login(student_id)
+    reply = client.post('/student/chatbot', json={'message': 'which subjects am i enrolled in'}).get_json()
+
+    other = 'Chemistry' if subject_name == 'Physics' else 'Physics'
+    assert subject_name in dashboard and other not in dashboard
+    assert subject_name in reply['response'] and other not in reply['response']
+
+
+def test_logged_in_users_belong_to_their_app(tmp_path, monkeypatch):
+    from app import create_app
+    from app.utils import identity
+
+    apps = []
+    for name in ('First', 'Second'):
+        monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path / f'{name}.db'))
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(name=name, email=f'{name}@example.com', role='student', password_hash='x'))
+            db.session.commit()
+        apps.append(app)
+
+    for app, name in zip(apps, ('First', 'Second')):
+        with app.app_context():
+            assert identity.load(1).name == name
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
@@ -0,0 +1,45 @@
+"""SQL statements the student chatbot runs per intent.
+
+None for the static intents, one (the snapshot query) for the first attendance
+or subject question, and none for repeats while the snapshot is fresh. Every
+case warms the logged-in user first, so only the chatbot's own statements count.
+"""
+import pytest
+
+from app.utils import chatbot
+
+
+@pytest.fixture
+def ask(client, login, campus):
+    login(campus.student_ids[0])
+    client.post('/student/chatbot', json={'message': 'hi'})
+
+    def ask(message):
+        response = client.post('/student/chatbot', json={'message': message})
+        assert response.status_code == 200
+        return response.get_json()['response']
+    return ask
+
+
+@pytest.mark.parametrize('message, intent, budget', [
+    ('hi', 'greeting', 0),
+    ('what are the fees', 'fees', 0),
+    ('show my timetable', 'schedule', 0),
+    ('help', 'help', 0),
+    ('my profile', 'profile', 0),
+    ('gibberish', None, 0),
+    ('what is my attendance', 'attendance', 1),
+    ('which subjects am i enrolled in', 'subjects', 1),
+])
+def test_intent_query_budget(ask, max_queries, message, intent, budget):
+    assert chatbot.match(message) == intent
+    with max_queries(budget):
+        ask(message)
+
+
+def test_repeat_questions_use_the_snapshot(ask, max_queries):
+    ask('what is my attendance')
+    with max_queries(0):
+        attendance = ask('attendance again')
+        subjects = ask('which subjects am i enrolled in')
+    assert 'Subject 0' in attendance and 'Subject 2' in subjects
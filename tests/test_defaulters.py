@@ -0,0 +1,72 @@
+"""Defaulter lists: the last 30 days only; scans shorten their life, new sessions drop them."""
+from datetime import datetime, timedelta
+
+from app.utils import defaulters
+from app.utils.qr_images import encode_payload
+
+
+def _scan(client, login, campus, student):
+    login(campus.student_ids[student])
+    payload = encode_payload(campus.subject_ids[0], campus.live_tokens[0])
+    assert client.post('/student/mark-attendance', json={'qr_data': payload}).status_code == 200
+
+
+def _defaulter_ids(app, campus):
+    with app.app_context():
+        return [d.student_id for d in defaulters.defaulters_for_teacher(campus.teacher_id)]
+
+
+def test_scans_do_not_recompute_the_list_each_time(app, client, login, campus, max_queries):
+    before = _defaulter_ids(app, campus)
+    for student in (1, 3, 5):
+        _scan(client, login, campus, student)
+    with app.app_context(), max_queries(0):
+        cached = [d.student_id for d in defaulters.defaulters_for_teacher(campus.teacher_id)]
+    assert cached == before
+
+
+def test_scans_show_up_once_the_list_goes_stale(app, client, login, campus, monkeypatch):
+    monkeypatch.setattr(defaulters, 'SCAN_STALENESS_SECONDS', 0)
+    _defaulter_ids(app, campus)
+    with app.app_context():
+        before = {d.student_id: d.attended for d in defaulters.defaulters_for_teacher(campus.teacher_id)}
+    _scan(client, login, campus, 1)
+    with app.app_context():
+        after = {d.student_id: d.attended for d in defaulters.defaulters_for_teacher(campus.teacher_id)}
+    assert after[campus.student_ids[1]] == before[campus.student_ids[1]] + 1
+
+
+def test_new_sessions_drop_the_list(app, client, login, campus):
+    _defaulter_ids(app, campus)
+    login(campus.teacher_id)
+    day = datetime.utcnow().date() - timedelta(days=2)
+    response = client.post(f'/teacher/subject/{campus.subject_ids[0]}/generate-qr', data={
+        'class_start_time': f'{day}T09:00', 'class_end_time': f'{day}T10:00',
+        'expiry_value': '60', 'expiry_unit': 'seconds'})
+    assert response.status_code == 200
+    with app.app_context():
+        totals = {d.total for d in defaulters.defaulters_for_teacher(campus.teacher_id)}
+    # Every odd student missed all sessions of all three subjects, now one more
+    assert totals == {3 * 6 + 1}
+
+
+def test_only_sessions_of_the_window_count(app, campus):
+    from app import db
+    from app.models.models import Attendance, QRCode
+    from app.utils import counters
+
+    subject = campus.subject_ids[0]
+    old = datetime.utcnow() - timedelta(days=defaulters.WINDOW_DAYS + 1)
+    with app.app_context():
+        # Held before the window, and one never given a class time; odd students missed both
+        for token, start in (('old', old), ('untimed', None)):
+            session = QRCode(subject_id=subject, token=token, created_at=old, expires_at=old + timedelta(minutes=5),
+                             class_start_time=start)
+            db.session.add(session)
+            db.session.flush()
+            db.session.add_all([Attendance(student_id=sid, subject_id=subject, qr_code_id=session.id, marked_at=old)
+                                for sid in campus.student_ids[::2]])
+        db.session.commit()
+        counters.rebuild()
+        found = {(d.attended, d.total) for d in defaulters.compute_defaulters(campus.teacher_id)[1]}
+    assert found == {(0, 3 * 6)}
@@ -0,0 +1,168 @@
+"""The write-behind attendance queue: acknowledgements, spool recovery and flushing."""
+import json
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.models import Attendance, User
+from app.utils import ingest
+from app.utils.qr_images import encode_payload
+
+
+@pytest.fixture
+def queue(app):
+    app.config['ATTENDANCE_INGEST_MODE'] = 'queue'
+    queue = ingest.init_app(app)
+    yield queue
+    queue.stop()
+
+
+def _scan(client, campus, subject=0):
+    payload = encode_payload(campus.subject_ids[subject], campus.live_tokens[subject])
+    return client.post('/student/mark-attendance', json={'qr_data': payload})
+
+
+def _marked(app, student_id, qr_code_id):
+    with app.app_context():
+        return Attendance.query.filter_by(student_id=student_id, qr_code_id=qr_code_id).count()
+
+
+def test_queued_scan_is_recorded(app, client, login, campus, queue):
+    login(campus.student_ids[0])
+    response = _scan(client, campus)
+    assert response.status_code == 202
+    queue.stop()
+    assert _marked(app, campus.student_ids[0], campus.live_session_ids[0]) == 1
+    assert client.get(response.get_json()['status_url']).get_json()['status'] == 'recorded'
+
+
+def test_duplicate_scans_are_refused(app, client, login, campus, queue):
+    login(campus.student_ids[0])
+    assert _scan(client, campus).status_code == 202
+    # Still waiting in the queue
+    assert _scan(client, campus).get_json() == {'error': 'Attendance already marked'}
+    queue.stop()
+    # Already in the database
+    assert _scan(client, campus).get_json() == {'error': 'Attendance already marked'}
+
+
+def test_unenrolled_scan_is_refused(app, client, login, campus, queue):
+    with app.app_context():
+        outsider = User(email='outsider@example.com', registration_number='X1', name='Outsider',
+                        role='student', password_hash='x', year=1, division='A')
+        db.session.add(outsider)
+        db.session.commit()
+        outsider_id = outsider.id
+    login(outsider_id)
+    response = _scan(client, campus)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'You are not enrolled in this subject'}
+
+
+def _write_spool(app, name, campus, student_indexes, extra_lines=(), marked_at=None):
+    spool_dir = app.config['ATTENDANCE_INGEST_SPOOL_DIR']
+    os.makedirs(spool_dir, exist_ok=True)
+    with open(os.path.join(spool_dir, name), 'w', encoding='utf-8') as fh:
+        for i in student_indexes:
+            fh.write(json.dumps({
+                'student_id': campus.student_ids[i], 'subject_id': campus.subject_ids[0],
+                'qr_code_id': campus.live_session_ids[0],
+                'marked_at': (marked_at or {}).get(i, datetime.utcnow().isoformat()),
+                'ip_address': None, 'device_info': '',
+            }) + '\n')
+        for entry in extra_lines:
+            fh.write(json.dumps(entry) + '\n')
+
+
+def test_spools_of_dead_workers_are_replayed_on_start(app, campus):
+    # One left under this process's own pid, as after pid reuse, and one of another worker
+    _write_spool(app, f'spool-{os.getpid()}.jsonl', campus, [1, 3])
+    _write_spool(app, f'spool-{os.getpid() + 1}-0123.jsonl', campus, [5])
+    app.config['ATTENDANCE_INGEST_MODE'] = 'queue'
+    queue = ingest.init_app(app)
+    queue.stop()
+    for i in (1, 3, 5):
+        assert _marked(app, campus.student_ids[i], campus.live_session_ids[0]) == 1
+    assert os.listdir(app.config['ATTENDANCE_INGEST_SPOOL_DIR']) == [os.path.basename(queue._spool_path)]
+
+
+def test_spool_of_a_live_worker_is_left_alone(app, campus):
+    name = f'spool-{os.getpid() + 1}-0123.jsonl'
+    _write_spool(app, name, campus, [1])
+    path = os.path.join(app.config['ATTENDANCE_INGEST_SPOOL_DIR'], name)
+    # The worker that owns a spool holds its lock
+    with ingest._open_locked(path, 'a'):
+        app.config['ATTENDANCE_INGEST_MODE'] = 'queue'
+        queue = ingest.init_app(app)
+        queue.stop()
+    assert os.path.exists(path)
+    assert _marked(app, campus.student_ids[1], campus.live_session_ids[0]) == 0
+
+
+class _Feed:
+    def __init__(self):
+        self.published = []
+
+    def publish_scans(self, scans):
+        self.published.extend((s['student_id'], s['qr_code_id']) for s in scans)
+
+
+def test_only_inserted_rows_are_published(app, campus, queue):
+    feed = app.extensions['attendance_live'] = _Feed()
+    session_id = campus.live_session_ids[0]
+    # Student 0 is already marked; student 2 is new
+    with app.app_context():
+        db.session.add(Attendance(student_id=campus.student_ids[0], subject_id=campus.subject_ids[0],
+                                  qr_code_id=session_id))
+        db.session.commit()
+    for i in (0, 2):
+        queue.submit(campus.student_ids[i], campus.subject_ids[0], session_id)
+    queue.stop()
+    assert feed.published == [(campus.student_ids[2], session_id)]
+
+
+def test_committed_scans_are_not_replayed(app, campus):
+    _write_spool(app, f'spool-{os.getpid() + 1}-0123.jsonl', campus, [1, 3, 5], [{'committed': 2}])
+    app.config['ATTENDANCE_INGEST_MODE'] = 'queue'
+    queue = ingest.init_app(app)
+    queue.stop()
+    assert [_marked(app, campus.student_ids[i], campus.live_session_ids[0]) for i in (1, 3, 5)] == [0, 0, 1]
+
+
+def test_a_scan_that_keeps_failing_is_dead_lettered(app, campus, monkeypatch):
+    monkeypatch.setattr(ingest, 'MAX_FLUSH_ATTEMPTS', 2)
+    _write_spool(app, f'spool-{os.getpid() + 1}-0123.jsonl', campus, [1, 3], marked_at={1: 'not a time'})
+    app.config.update(ATTENDANCE_INGEST_MODE='queue', ATTENDANCE_INGEST_FLUSH_MS=10)
+    queue = ingest.init_app(app)
+    session_id = campus.live_session_ids[0]
+    deadline = time.monotonic() + 5
+    while queue.status(campus.student_ids[1], session_id) == ingest.QUEUED and time.monotonic() < deadline:
+        time.sleep(0.01)
+    queue.stop()
+
+    assert queue.status(campus.student_ids[1], session_id) == ingest.REJECTED
+    assert queue.status(campus.student_ids[3], session_id) == ingest.RECORDED
+    assert _marked(app, campus.student_ids[3], session_id) == 1
+    with open(os.path.join(app.config['ATTENDANCE_INGEST_SPOOL_DIR'], ingest.DEAD_LETTER)) as fh:
+        assert [json.loads(line)['student_id'] for line in fh] == [campus.student_ids[1]]
+
+
+def test_a_flushed_batch_is_marked_committed_not_rewritten(app, campus, monkeypatch):
+    app.config.update(ATTENDANCE_INGEST_MODE='queue', ATTENDANCE_INGEST_FLUSH_MS=60000)
+    queue = ingest.init_app(app)
+    for i in (1, 3, 5):
+        queue.submit(campus.student_ids[i], campus.subject_ids[0], campus.live_session_ids[0])
+    inode = os.stat(queue._spool_path).st_ino
+    # As the worker does once the first two are in the database
+    batch = list(queue._queue)[:2]
+    queue._done(batch, {(s['student_id'], s['qr_code_id']): ingest.RECORDED for s in batch})
+
+    assert os.stat(queue._spool_path).st_ino == inode
+    with open(queue._spool_path, encoding='utf-8') as fh:
+        lines = fh.readlines()
+    assert json.loads(lines[-1]) == {'committed': 2}
+    assert [s['student_id'] for s in ingest._unfinished(lines)] == [campus.student_ids[5]]
+    queue.stop()
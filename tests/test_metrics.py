@@ -0,0 +1,57 @@
+"""/metrics is closed unless a token is configured; worker snapshots survive pid reuse."""
+import os
+
+import pytest
+
+
+@pytest.fixture
+def student(client, login, campus):
+    login(campus.student_ids[0])
+    return client
+
+
+def test_closed_without_a_token(app, student):
+    app.config['METRICS_TOKEN'] = None
+    assert student.get('/metrics').status_code == 404
+
+
+def test_token_required(app, student):
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert student.get('/metrics').status_code == 401
+    assert student.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = student.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert b'http_requests_total' in response.data
+
+
+def test_db_pool_closed_without_a_token(app, student):
+    app.config['METRICS_TOKEN'] = None
+    assert student.get('/metrics/db-pool').status_code == 404
+
+
+def test_db_pool_token_required(app, student):
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert student.get('/metrics/db-pool').status_code == 401
+    response = student.get('/metrics/db-pool', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert 'plan' in response.get_json()
+
+
+def test_snapshots_are_archived_only_once_their_worker_is_gone(app, tmp_path):
+    from app.utils.metrics import RequestMetrics
+
+    alive = RequestMetrics(app, str(tmp_path))
+    alive.start('student')
+    alive.finish('student', 'student.dashboard', 'GET', 200, 0.01, 0.0)
+    alive.done('student')
+    # A second worker with the same pid, as after the OS reuses it
+    scraper = RequestMetrics(app, str(tmp_path))
+    line = 'http_requests_total{endpoint="student.dashboard",method="GET",status="200"} 1'
+    alive._flush()
+    assert line in scraper.render()
+    assert os.path.exists(alive._path)
+
+    alive._lock_file.close()
+    assert line in scraper.render()
+    assert not os.path.exists(alive._path)
+    assert line in scraper.render()
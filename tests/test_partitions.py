@@ -0,0 +1,153 @@
+"""Monthly partitioning of attendance on PostgreSQL.
+
+Runs in a scratch schema of the database TEST_POSTGRES_URL points at, and is
+skipped without it. Covers the partitioning migration in both directions and the
+writes that rely on ON CONFLICT DO NOTHING once the unique constraint has moved
+into the dedupe trigger.
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm.exc import FlushError
+
+from app.utils import partitions
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture
+def app(postgres_app):
+    return postgres_app
+
+
+def _add_old_session(campus, months_ago):
+    """A past session of the first subject that every student attended."""
+    from app import db
+    from app.models.models import Attendance, QRCode
+
+    start = datetime.utcnow() - timedelta(days=31 * months_ago)
+    session = QRCode(subject_id=campus.subject_ids[0], token=f'old-{months_ago}', created_at=start,
+                     expires_at=start + timedelta(minutes=5), class_start_time=start,
+                     class_end_time=start + timedelta(hours=1))
+    db.session.add(session)
+    db.session.flush()
+    session_id = session.id
+    db.session.add_all([Attendance(student_id=sid, subject_id=campus.subject_ids[0], qr_code_id=session_id,
+                                   marked_at=start) for sid in campus.student_ids])
+    db.session.commit()
+    return session_id
+
+
+def _partition(app):
+    from app import db
+
+    with app.app_context(), db.engine.begin() as connection:
+        partitions.partition_attendance(connection)
+
+
+def _attendance_schema(connection):
+    return connection.execute(text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass('attendance') ORDER BY conname"
+    )).all() + connection.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() "
+        "AND tablename = 'attendance' ORDER BY indexname"
+    )).all()
+
+
+def test_migration_round_trip(app, campus, monkeypatch):
+    from flask_migrate import downgrade, stamp, upgrade
+
+    from app import db
+
+    monkeypatch.setenv('ATTENDANCE_PARTITIONING', 'true')
+    with app.app_context():
+        _add_old_session(campus, 14)
+        with db.engine.connect() as connection:
+            rows = connection.execute(text('SELECT count(*) FROM attendance')).scalar()
+            schema = _attendance_schema(connection)
+        stamp(MIGRATIONS, '8c3e1a6f4b27')
+
+        upgrade(MIGRATIONS, 'd7a4e2b91c05')
+        with db.engine.connect() as connection:
+            assert partitions.is_partitioned(connection)
+            assert connection.execute(text('SELECT count(*) FROM attendance')).scalar() == rows
+            assert connection.execute(text('SELECT count(*) FROM attendance_mark')).scalar() == rows
+            assert len(partitions.list_partitions(connection)) >= 15
+
+        downgrade(MIGRATIONS, '8c3e1a6f4b27')
+        with db.engine.connect() as connection:
+            assert not partitions.is_partitioned(connection)
+            assert connection.execute(text('SELECT count(*) FROM attendance')).scalar() == rows
+            assert _attendance_schema(connection) == schema
+
+
+def test_migration_is_opt_in(app, campus, monkeypatch):
+    from flask_migrate import stamp, upgrade
+
+    from app import db
+
+    monkeypatch.delenv('ATTENDANCE_PARTITIONING', raising=False)
+    with app.app_context():
+        stamp(MIGRATIONS, '8c3e1a6f4b27')
+        upgrade(MIGRATIONS, 'd7a4e2b91c05')
+        with db.engine.connect() as connection:
+            assert not partitions.is_partitioned(connection)
+
+
+def test_inserts_skip_duplicate_scans(app, campus):
+    from app import db
+    from app.models.models import Attendance, StudentAttendanceCount
+    from app.utils import counters
+    from app.utils.attendance import insert_attendance, insert_attendance_batch
+
+    _partition(app)
+    student, other = campus.student_ids[1], campus.student_ids[3]
+    subject, session = campus.subject_ids[0], campus.live_session_ids[0]
+    with app.app_context():
+        assert insert_attendance(student, subject, session)
+        assert not insert_attendance(student, subject, session)
+        inserted = insert_attendance_batch([
+            {'student_id': sid, 'subject_id': subject, 'qr_code_id': session}
+            for sid in (student, other, other)])
+        assert inserted == [(other, subject, session)]
+        counters.record_attendance([(student, subject), (other, subject)])
+        db.session.commit()
+
+        attended = dict(db.session.query(StudentAttendanceCount.student_id, StudentAttendanceCount.sessions_attended)
+                        .filter_by(subject_id=subject).filter(StudentAttendanceCount.student_id.in_([student, other])))
+        assert attended == {student: 1, other: 1}
+        assert Attendance.query.filter_by(qr_code_id=session).count() == 2
+
+        # The ORM insert of the sync scan path sees the skipped row as a missing primary key
+        db.session.add(Attendance(student_id=student, subject_id=subject, qr_code_id=session))
+        with pytest.raises(FlushError):
+            db.session.commit()
+        db.session.rollback()
+        assert Attendance.query.filter_by(qr_code_id=session).count() == 2
+
+
+def test_detach_releases_old_months(app, campus):
+    from app import db
+    from app.models.models import Attendance
+    from app.utils.attendance import insert_attendance
+
+    with app.app_context():
+        old_session = _add_old_session(campus, 30)
+    _partition(app)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            cutoff = partitions.add_months(partitions.month_start(datetime.utcnow()), -24)
+            detached = partitions.detach_partitions(connection, cutoff)
+            assert detached
+            assert not any(month < cutoff for _, month in partitions.list_partitions(connection))
+        assert Attendance.query.filter_by(qr_code_id=old_session).count() == 0
+        assert db.session.execute(text(f'SELECT count(*) FROM {detached[0]}')).scalar() == len(campus.student_ids)
+
+        created = partitions.create_partitions(db.session.connection(), datetime.utcnow(),
+                                               partitions.add_months(datetime.utcnow(), 6))
+        assert len(created) == 3
+        assert insert_attendance(campus.student_ids[0], campus.subject_ids[0], old_session)
+        db.session.commit()
@@ -0,0 +1,25 @@
+"""The PDF cache bound holds across the workers sharing its directory."""
+import os
+
+from app.utils.pdf_cache import SIZE_FILE, PdfCache
+
+
+def _on_disk(directory):
+    return sum(e.stat().st_size for e in os.scandir(directory) if e.name.endswith('.pdf'))
+
+
+def test_workers_share_one_size_bound(tmp_path):
+    # One cache object per worker process, all on the same directory
+    workers = [PdfCache(str(tmp_path), max_bytes=10 * 1024) for _ in range(3)]
+    for n in range(30):
+        workers[n % 3].put(f'key-{n}', b'x' * 1024)
+        assert _on_disk(tmp_path) <= 10 * 1024
+    assert sum(w.stats()['evictions'] for w in workers) > 0
+    assert int((tmp_path / SIZE_FILE).read_text()) == _on_disk(tmp_path)
+
+
+def test_rewriting_a_key_does_not_count_it_twice(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=10 * 1024)
+    for _ in range(3):
+        cache.put('same', b'x' * 1024)
+    assert int((tmp_path / SIZE_FILE).read_text()) == 1024
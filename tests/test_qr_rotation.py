@@ -0,0 +1,58 @@
+"""Scans of rotating session QR codes."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models.models import QRCode
+from app.utils import qr_rotation
+
+
+@pytest.fixture
+def rotating(app, campus):
+    """A rotating session of subject 0, running until its class ends in an hour."""
+    now = datetime.utcnow()
+    with app.app_context():
+        qr_code = QRCode(subject_id=campus.subject_ids[0], token='rotating', expires_at=now + timedelta(hours=1),
+                         class_start_time=now, class_end_time=now + timedelta(hours=1), rotation_seconds=30)
+        db.session.add(qr_code)
+        db.session.commit()
+        return qr_code.id
+
+
+def _scan(app, client, login, campus, qr_code_id, student=0):
+    with app.app_context():
+        payload = qr_rotation.issue(db.session.get(QRCode, qr_code_id))
+    login(campus.student_ids[student])
+    return client.post('/student/mark-attendance', json={'qr_data': payload})
+
+
+def _update(app, qr_code_id, **values):
+    with app.app_context():
+        db.session.query(QRCode).filter_by(id=qr_code_id).update(values)
+        db.session.commit()
+
+
+def test_scan_reports_the_class_timings(app, client, login, campus, rotating):
+    response = _scan(app, client, login, campus, rotating)
+    assert response.status_code == 200
+    assert response.get_json()['class_start_time'] != 'N/A'
+    assert response.get_json()['class_end_time'] != 'N/A'
+
+
+def test_session_is_read_once(app, client, login, campus, rotating, max_queries):
+    _scan(app, client, login, campus, rotating, student=0)
+    with app.app_context():
+        payload = qr_rotation.issue(db.session.get(QRCode, rotating))
+        with max_queries(0):
+            assert qr_rotation.verify(payload) is not None
+
+
+def test_ended_session_is_expired(app, client, login, campus, rotating):
+    _update(app, rotating, expires_at=datetime.utcnow() - timedelta(minutes=1))
+    assert _scan(app, client, login, campus, rotating).get_json() == {'error': 'QR code has expired'}
+
+
+def test_deactivated_session_is_invalid(app, client, login, campus, rotating):
+    _update(app, rotating, is_active=False)
+    assert _scan(app, client, login, campus, rotating).get_json() == {'error': 'Invalid QR code'}
@@ -0,0 +1,94 @@
+"""The hot routes are served by indexes.
+
+Each hot route is requested on the seeded campus, every SELECT it issues is
+captured with its parameters through `query_stats`, and each one goes through
+EXPLAIN; a full table scan fails the test. The statements are whatever the ORM
+code sends, so new queries are covered as soon as a route runs them. SQLite
+always runs; set TEST_POSTGRES_URL to check PostgreSQL too (in a scratch schema).
+"""
+import re
+
+import pytest
+
+from app.utils import query_stats
+from app.utils.qr_images import encode_payload
+
+# (role, method, path, JSON body); paths are formatted with the campus ids
+HOT_ROUTES = [
+    ('teacher', 'GET', '/teacher/dashboard', None),
+    ('teacher', 'GET', '/teacher/subject/{subject_id}/attendance', None),
+    ('teacher', 'GET', '/teacher/subject/{subject_id}/export', None),
+    ('teacher', 'GET', '/teacher/analytics', None),
+    ('teacher', 'GET', '/teacher/analytics/defaulters.csv', None),
+    ('teacher', 'GET', '/teacher/leave-applications', None),
+    ('teacher', 'GET', '/teacher/leave-applications/{subject_id}', None),
+    ('teacher', 'GET', '/teacher/results', None),
+    ('teacher', 'GET', '/teacher/subject/{subject_id}/generate-qr', None),
+    ('student', 'GET', '/student/dashboard', None),
+    ('student', 'GET', '/student/subjects', None),
+    ('student', 'GET', '/student/attendance', None),
+    ('student', 'GET', '/student/results', None),
+    ('student', 'GET', '/student/view-leave-applications', None),
+    ('student', 'POST', '/student/chatbot', {'message': 'what is my attendance'}),
+    ('student', 'POST', '/student/chatbot', {'message': 'which subjects am i enrolled in'}),
+    ('student', 'POST', '/student/mark-attendance', {'qr_data': '{payload}'}),
+]
+
+TABLES = {'user', 'subject', 'enrollment', 'qr_code', 'attendance', 'leave_application', 'result',
+          'student_attendance_count', 'subject_session_count'}
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def app(request, app):
+    """The plugin's SQLite app, or the PostgreSQL one when TEST_POSTGRES_URL is set."""
+    if request.param == 'postgresql':
+        return request.getfixturevalue('postgres_app')
+    return app
+
+
+def _sqlite_full_scans(connection, statement, parameters):
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        # "SCAN t [USING ... INDEX]" walks the whole table or index; "SEARCH t" seeks
+        match = re.match(r'SCAN (?:TABLE )?"?(\w+)"?', detail)
+        if match and match.group(1) in TABLES:
+            scans.append(detail)
+    return scans
+
+
+def _postgres_full_scans(connection, statement, parameters):
+    # Campus tables are small enough that the planner would rightly prefer a
+    # sequential scan; disable it so only a missing index shows one
+    connection.exec_driver_sql('SET enable_seqscan = off')
+    rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters).fetchall()
+    return [row[0].strip() for row in rows if 'Seq Scan on' in row[0]]
+
+
+def _selects(client, campus, login, route):
+    role, method, path, body = route
+    login(campus.teacher_id if role == 'teacher' else campus.student_ids[0])
+    path = path.format(subject_id=campus.subject_ids[0])
+    if body and body.get('qr_data') == '{payload}':
+        body = {'qr_data': encode_payload(campus.subject_ids[0], campus.live_tokens[0])}
+    with query_stats.capture(keep_statements=True) as stats:
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+    assert response.status_code == 200
+    return [(statement, parameters) for statement, parameters in stats.statements
+            if statement.lstrip().upper().startswith(('SELECT', 'WITH'))]
+
+
+@pytest.mark.parametrize('route', HOT_ROUTES, ids=[f'{r[1]} {r[2]} {(r[3] or {}).get("message", "")}'.strip()
+                                                  for r in HOT_ROUTES])
+def test_hot_route_uses_indexes(app, client, campus, login, route):
+    from app import db
+
+    selects = _selects(client, campus, login, route)
+    assert selects
+    with app.app_context(), db.engine.connect() as connection:
+        full_scans = _postgres_full_scans if connection.dialect.name == 'postgresql' else _sqlite_full_scans
+        scans = {statement: found for statement, parameters in selects
+                 if (found := full_scans(connection, statement, parameters))}
+    assert scans == {}
@@ -0,0 +1,54 @@
+"""Results CSV imports: one transaction per upload, last row wins for an exam."""
+import io
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.utils import results_import
+
+HEADER = 'student_id,subject_id,exam_type,marks_obtained,max_marks,remarks\n'
+
+
+def _import(app, campus, tmp_path, lines):
+    stream = io.BytesIO((HEADER + ''.join(line + '\n' for line in lines)).encode())
+    with app.app_context():
+        return results_import.import_results(stream, campus.teacher_id, str(tmp_path))
+
+
+def _marks(app, student_id, subject_id, exam_type):
+    from app.models.models import Result
+
+    with app.app_context():
+        return [r.marks_obtained for r in Result.query.filter_by(
+            student_id=student_id, subject_id=subject_id, exam_type=exam_type)]
+
+
+def test_later_rows_replace_earlier_ones_for_the_same_exam(app, campus, tmp_path):
+    student, subject = campus.student_ids[0], campus.subject_ids[0]
+    summary = _import(app, campus, tmp_path, [
+        f'{student},{subject},Quiz,5,10,first',
+        f'{student},{subject},Quiz,7,10,second',
+        f'{student},{subject},Final,90,100,',
+    ])
+    assert summary == results_import.ImportSummary(3, 1, 1, 0, None)
+    assert _marks(app, student, subject, 'Quiz') == [7]
+    assert _marks(app, student, subject, 'Final') == [90]
+
+
+def test_a_failing_chunk_rolls_back_the_whole_upload(app, campus, tmp_path, monkeypatch):
+    monkeypatch.setattr(results_import, 'CHUNK_ROWS', 2)
+    upserts = []
+    real_insert = results_import.dialect_insert
+
+    def failing_insert(table):
+        upserts.append(table)
+        if len(upserts) == 2:
+            raise OperationalError('INSERT', {}, Exception('disk I/O error'))
+        return real_insert(table)
+
+    monkeypatch.setattr(results_import, 'dialect_insert', failing_insert)
+    subject = campus.subject_ids[0]
+    with pytest.raises(OperationalError):
+        _import(app, campus, tmp_path, [f'{student},{subject},Quiz,5,10,' for student in campus.student_ids[:4]])
+    for student in campus.student_ids[:4]:
+        assert _marks(app, student, subject, 'Quiz') == []
@@ -0,0 +1,60 @@
+"""The SQLite profile's writer lane: only writes take it, and only until they commit."""
+import threading
+
+import pytest
+
+from app.utils.qr_images import encode_payload
+
+
+@pytest.fixture(autouse=True)
+def sqlite_profile(monkeypatch):
+    monkeypatch.setenv('DB_POOL_PROFILE', 'sqlite')
+
+
+@pytest.fixture
+def lane(app):
+    return app.extensions['sqlite_writer_lane']
+
+
+def _in_thread(fn, timeout=5.0):
+    """Run `fn` on another thread; return its result, or fail if it does not finish in time."""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', fn()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'blocked on the writer lane'
+    return result['value']
+
+
+def test_reads_do_not_wait_for_the_lane(client, login, campus, lane):
+    login(campus.student_ids[0])
+    lane.acquire()
+    try:
+        # A POST that only reads, and pages that only read
+        assert _in_thread(lambda: client.post('/student/chatbot', json={'message': 'attendance'}).status_code) == 200
+        assert _in_thread(lambda: client.get('/student/attendance').status_code) == 200
+    finally:
+        lane.release()
+
+
+def test_a_write_holds_the_lane_until_it_commits(client, login, campus, lane):
+    login(campus.student_ids[0])
+    payload = encode_payload(campus.subject_ids[0], campus.live_tokens[0])
+    lane.acquire()
+    scan = threading.Thread(target=lambda: client.post('/student/mark-attendance', json={'qr_data': payload}))
+    scan.start()
+    scan.join(0.2)
+    assert scan.is_alive()
+    lane.release()
+    scan.join(5)
+    assert not scan.is_alive()
+    # Released after the commit, so it can be taken again at once
+    _in_thread(lane.acquire)
+    lane.release()
+
+
+def test_any_thread_may_release_the_lane(lane):
+    _in_thread(lane.acquire)
+    lane.release()
+    _in_thread(lane.acquire)
+    lane.release()
@@ -0,0 +1,32 @@
+"""Existing SQLite databases gain the columns and indexes the models added since."""
+import sqlite3
+
+from app.utils import sqlite_schema
+
+
+def test_a_database_from_before_session_rotation_still_loads_sessions(app, campus, tmp_path, monkeypatch):
+    from app import create_app, db
+    from app.models.models import QRCode
+
+    path = str(tmp_path / 'test.db')
+    with app.app_context():
+        db.engine.dispose()
+    with sqlite3.connect(path) as connection:
+        connection.execute('DROP INDEX ix_qr_code_subject_start')
+        connection.execute('ALTER TABLE qr_code DROP COLUMN rotation_seconds')
+
+    upgraded = create_app()
+    with upgraded.app_context():
+        assert QRCode.query.filter_by(token=campus.live_tokens[0]).one().rotation_seconds is None
+        assert sqlite_schema.add_missing(db.engine, db.metadata) == []
+        db.engine.dispose()
+    with sqlite3.connect(path) as connection:
+        assert connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'ix_qr_code_subject_start'").fetchone()
+
+
+def test_a_current_database_is_left_alone(app):
+    from app import db
+
+    with app.app_context():
+        assert sqlite_schema.add_missing(db.engine, db.metadata) == []
@@ -0,0 +1,49 @@
+"""SQL statement budgets for the student blueprint.
+
+Budgets are fixed counts on the seeded campus (3 subjects with 5 past sessions
+each), so a route that starts querying per enrollment or session goes over them.
+Each budget includes the statement that loads the logged-in user.
+"""
+import pytest
+
+from app.utils.qr_images import encode_payload
+
+
+@pytest.fixture
+def student(campus, login):
+    login(campus.student_ids[0])
+    return campus
+
+
+@pytest.mark.parametrize('path, budget', [
+    ('/student/dashboard', 2),
+    ('/student/subjects', 3),
+    ('/student/attendance', 3),
+    ('/student/results', 3),
+    ('/student/leave-application', 2),
+    ('/student/view-leave-applications', 3),
+])
+def test_page_query_budget(client, student, max_queries, path, budget):
+    with max_queries(budget):
+        response = client.get(path)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('fast_path, budget', [(False, 6), (True, 4)])
+def test_mark_attendance_query_budget(app, client, student, max_queries, fast_path, budget):
+    app.config['ATTENDANCE_FAST_PATH'] = fast_path
+    payload = encode_payload(student.subject_ids[0], student.live_tokens[0])
+    with max_queries(budget):
+        response = client.post('/student/mark-attendance', json={'qr_data': payload})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['class_start_time'] != 'N/A'
+
+    again = client.post('/student/mark-attendance', json={'qr_data': payload})
+    assert again.status_code == 400
+    assert again.get_json()['error'] == 'Attendance already marked'
+
+
+def test_attendance_page_counts_sessions(client, student):
+    response = client.get('/student/attendance')
+    # Student 0 attended the 5 past sessions of each subject but not the live one
+    assert response.data.count(b'<strong>83.33%</strong>') == 3
@@ -0,0 +1,66 @@
+"""SQL statement budgets for the teacher blueprint.
+
+Budgets are fixed counts on the seeded campus (30 students, 3 subjects, 5 past
+sessions each), so a route that starts querying per student, session or subject
+goes over them. Each budget includes the statement that loads the logged-in user.
+"""
+import json
+import re
+
+import pytest
+
+
+@pytest.fixture
+def teacher(campus, login):
+    login(campus.teacher_id)
+    return campus
+
+
+@pytest.mark.parametrize('path, budget', [
+    ('/teacher/dashboard', 2),
+    ('/teacher/subject/{subject_id}/attendance', 4),
+    ('/teacher/subject/{subject_id}/export', 3),
+    ('/teacher/subject/{subject_id}/generate-qr', 2),
+    ('/teacher/leave-applications', 3),
+    ('/teacher/leave-applications/{subject_id}', 4),
+    ('/teacher/analytics', 9),
+    ('/teacher/analytics/defaulters.csv', 4),
+    ('/teacher/results', 3),
+    ('/teacher/results/manual', 3),
+])
+def test_page_query_budget(client, teacher, max_queries, path, budget):
+    with max_queries(budget):
+        response = client.get(path.format(subject_id=teacher.subject_ids[0]))
+        # Streamed responses run their queries while the body is read
+        response.get_data()
+    assert response.status_code == 200
+
+
+def test_dashboard_grid_is_cached(client, teacher, max_queries):
+    client.get('/teacher/dashboard')
+    with max_queries(0):
+        response = client.get('/teacher/dashboard')
+    assert b'Subject 2' in response.data
+
+
+def test_analytics_then_defaulter_export_share_one_computation(client, teacher, max_queries):
+    client.get('/teacher/analytics')
+    with max_queries(0):
+        response = client.get('/teacher/analytics/defaulters.csv')
+        body = response.get_data(as_text=True)
+    # Odd-indexed students missed every session
+    assert 'S001' in body and 'S000' not in body
+
+
+def test_analytics_series_stay_at_the_class_rate(app, client, teacher):
+    from app import db
+    from app.models.models import QRCode
+
+    # Without the live sessions every past session had half the class present
+    with app.app_context():
+        QRCode.query.filter(QRCode.id.in_(teacher.live_session_ids)).delete()
+        db.session.commit()
+    page = client.get('/teacher/analytics').get_data(as_text=True)
+    for series in ('dailyValues', 'weeklyValues', 'monthlyValues'):
+        values = json.loads(re.search(rf'const {series} = (\[.*?\]);', page).group(1))
+        assert {v for v in values if v} == {50.0}, series